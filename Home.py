@@ -2,11 +2,14 @@ import streamlit as st
 import os
 import re
 import hashlib
+from core.memory import render_memory_panel, session_budget
+from core.styles import inject_css
 
 st.set_page_config(page_title="The Stellar Organism", page_icon="🧬", layout="wide")
+session_budget() # Compacts the state of the dApp pages while the visitor browses the store
 
 # Hide default sidebar navigation & apply Custom App Card CSS
-st.markdown("""
+inject_css("""
     <style>
         /* Hide the default sidebar */
         [data-testid="stSidebarNav"] {display: none;}
@@ -72,7 +75,7 @@ st.markdown("""
             margin-bottom: 10px;
         }
     </style>
-""", unsafe_allow_html=True)
+""")
 
 st.title("🧬 The Stellar Organism")
 st.markdown("### *A self-evolving library of autonomous dApps living on the Stellar Network.*")
@@ -131,3 +134,5 @@ else:
                             st.markdown('<div class="app-subtitle">Stellar dApp</div>', unsafe_allow_html=True)
                 
             st.write("") # Vertical spacer between rows
+
+render_memory_panel() # Admin view of session-state memory by page, with ?debug=memory
@@ -0,0 +1,6 @@
+"""Shared plumbing for the Stellar Organism's pages.
+
+The apps in ``pages/`` are written by the Organism and each one used to talk
+to Horizon, friendbot and Freighter on its own. The modules in this package
+are the hand-maintained layer those pages now share.
+"""
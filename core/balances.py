@@ -0,0 +1,190 @@
+"""Batched account/balance reads.
+
+Pages that show several accounts at once (a funder plus every project
+account, say) used to load them one after another. ``fetch_balances`` takes
+the whole set, drops duplicates, and loads them concurrently through the
+shared, pooled ``HorizonClient``. Concurrent callers asking for the same
+account share a single in-flight request, so a dashboard costs about one
+round trip no matter how many accounts it lists.
+
+Balance widgets used to refresh only when the whole page reran, so users
+clicked around (and redrew every CSS block, sidebar and expander) just to
+see a payment land. ``live_account`` renders an account inside an
+``st.fragment`` that re-reads it every ``BALANCE_REFRESH_INTERVAL`` seconds
+without re-executing the rest of the page; ``balance_metrics`` is the
+common case, a row of ``st.metric``::
+
+    balance_metrics(public_key, [
+        ("XLM Balance", "XLM", "{:,.2f} XLM"),
+        ("GEM Balance", GEM_ASSET, "{:,.0f} GEM"),
+        ("Data Entries", lambda account: len(account["data"]), "{}"),
+    ])
+
+Reads go through ``fetch_accounts``, so sessions watching the same account
+share requests and the warm cache, which forgets account state whenever a
+transaction is submitted.
+"""
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from stellar_sdk.exceptions import NotFoundError
+
+from core.governor import LOW, priority
+from core.horizon import get_server
+
+MAX_WORKERS = 16
+REFRESH_INTERVAL = float(os.getenv("BALANCE_REFRESH_INTERVAL", "15"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="horizon-balances")
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _script_run_ctx():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def _attached(fn, ctx):
+    """Run ``fn`` on a pool thread as if it were the caller's script thread,
+    so metrics and the governor priority still see the calling session."""
+    context = contextvars.copy_context()
+
+    def run():
+        thread = threading.current_thread()
+        if ctx is not None:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+
+            add_script_run_ctx(thread, ctx)
+        try:
+            return context.run(fn)
+        finally:
+            if ctx is not None:
+                add_script_run_ctx(thread, None)
+
+    return run
+
+
+def _load(account_id):
+    try:
+        return get_server().accounts().account_id(account_id).call()
+    except NotFoundError:
+        return None
+
+
+def _submit(account_id, ctx):
+    """Return the in-flight future for ``account_id``, starting one if needed."""
+    with _inflight_lock:
+        future = _inflight.get(account_id)
+        if future is not None:
+            return future
+        future = _executor.submit(_attached(lambda: _load(account_id), ctx))
+        _inflight[account_id] = future
+
+    def done(_):
+        with _inflight_lock:
+            if _inflight.get(account_id) is future:
+                del _inflight[account_id]
+
+    future.add_done_callback(done)
+    return future
+
+
+def fetch_accounts(account_ids):
+    """``{account_id: Horizon account record, or None if it does not exist}``.
+
+    Other errors (connection problems, an open circuit breaker with no
+    snapshot) are raised, like a single ``load_account`` would.
+    """
+    ctx = _script_run_ctx()
+    unique = [a for a in dict.fromkeys(account_ids) if a]
+    futures = {account_id: _submit(account_id, ctx) for account_id in unique}
+    return {account_id: future.result() for account_id, future in futures.items()}
+
+
+def summarize_balances(account):
+    """``{"XLM": 10.5, "FRAGA": 3.0, ...}`` from a Horizon account record."""
+    if account is None:
+        return {}
+    return {
+        ("XLM" if balance["asset_type"] == "native" else balance.get("asset_code", balance["asset_type"])): float(balance["balance"])
+        for balance in account.get("balances", [])
+    }
+
+
+def fetch_balances(account_ids):
+    """``{account_id: {"XLM": ..., CODE: ...}}``; missing accounts map to ``{}``."""
+    return {account_id: summarize_balances(account) for account_id, account in fetch_accounts(account_ids).items()}
+
+
+def asset_balance(account, asset="XLM"):
+    """The balance of ``asset`` in a Horizon account record, or ``None`` without a trustline.
+
+    ``asset`` is ``"XLM"``, an asset code (any issuer) or a ``stellar_sdk.Asset``.
+    """
+    if account is None:
+        return None
+    if isinstance(asset, str):
+        code, issuer = asset, None
+    else:
+        code, issuer = ("XLM", None) if asset.is_native() else (asset.code, asset.issuer)
+    for balance in account.get("balances", []):
+        if balance["asset_type"] == "native":
+            if code == "XLM" and issuer is None:
+                return float(balance["balance"])
+        elif balance.get("asset_code") == code and issuer in (None, balance.get("asset_issuer")):
+            return float(balance["balance"])
+    return None
+
+
+def live_account(account_id, render, interval=REFRESH_INTERVAL):
+    """Call ``render(account)`` in a fragment that refreshes itself every ``interval`` seconds.
+
+    ``account`` is the Horizon account record, or ``None`` if the account
+    does not exist. A refresh reruns only the fragment, not the page. The
+    reads are low priority, so the governor sheds them first; until the
+    next one gets through, the last record this session saw is shown.
+    """
+    import streamlit as st
+
+    last_key = f"_live_account_{account_id}"
+
+    @st.fragment(run_every=interval)
+    def _live_account():
+        try:
+            with priority(LOW):
+                account = fetch_accounts([account_id])[account_id]
+        except Exception as e:
+            if last_key not in st.session_state:
+                st.caption(f"⚠️ Could not load `{account_id[:8]}...`: {e}")
+                return
+            account = st.session_state[last_key]
+        st.session_state[last_key] = account
+        render(account)
+
+    _live_account()
+
+
+def balance_metrics(account_id, metrics, interval=REFRESH_INTERVAL, missing="Account not found on the network."):
+    """A self-refreshing row of ``st.metric`` for ``account_id``.
+
+    ``metrics`` holds ``(label, value, fmt)``: ``value`` is an asset (as for
+    ``asset_balance``) or a function of the account record, and ``fmt``
+    formats the number. A missing trustline shows as 0.
+    """
+    import streamlit as st
+
+    def render(account):
+        if account is None:
+            st.warning(missing)
+            return
+        for column, (label, value, fmt) in zip(st.columns(len(metrics)), metrics):
+            number = value(account) if callable(value) else asset_balance(account, value)
+            column.metric(label, fmt.format(number or 0))
+
+    live_account(account_id, render, interval)
@@ -0,0 +1,199 @@
+"""Coalesce issuer payouts from every session into shared transactions.
+
+An issuer payout used to be a whole transaction carrying one operation.
+``OperationBatcher`` collects the payouts and mints queued by all sessions
+for ``window`` seconds (about one ledger), or until a transaction is full,
+and sends them as one multi-operation transaction through the channel pool
+(``core.channels``). Each caller gets back the result of its own operation::
+
+    result = payout(ISSUER_KEYPAIR, stellar_sdk.Payment(destination=pk, asset=GEM, amount="1"))
+    result["hash"]
+
+``payout`` blocks for the window and the submit, several seconds. Pages
+queue the payout instead and show its outcome on a later rerun, the way
+``core.submission`` tickets work::
+
+    st.session_state.payout_ticket = payout_async(ISSUER_KEYPAIR, payment)
+    ...
+    outcome = payout_result(st.session_state.payout_ticket)
+    if outcome is not None and outcome["status"] == PENDING:
+        watch_payout(st.session_state.payout_ticket)   # reruns the page once it lands
+
+If the transaction fails because some operations failed, those callers get
+an ``OperationFailedError`` carrying their operation's result code. The
+other operations are retried once in a new transaction without the failed
+ones. If only the channel's top-up failed, the whole batch is retried once
+without it. ``BATCH_WINDOW`` overrides the window.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from stellar_sdk.exceptions import BadRequestError
+
+from core.channels import channels
+from core.submission import ERROR, PENDING, POLL_INTERVAL, SUCCESS
+
+WINDOW = float(os.getenv("BATCH_WINDOW", "5.0"))
+# Stellar's limit is 100; one slot stays free for a channel top-up.
+MAX_OPS = 99
+RESULT_TIMEOUT = 60.0
+MAX_TICKETS = 1024
+
+
+class OperationFailedError(Exception):
+    """This caller's operation failed; ``code`` is Horizon's result code for it."""
+
+    def __init__(self, code, extras=None):
+        super().__init__(code)
+        self.code = code
+        self.extras = extras
+
+
+class _Pending:
+    def __init__(self, operation):
+        self.operation = operation
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+
+class OperationBatcher:
+    def __init__(self, pool=channels, window=WINDOW, max_ops=MAX_OPS, base_fee=None):
+        self.pool = pool
+        self.window = window
+        self.max_ops = max_ops
+        self.base_fee = base_fee
+        self._queues = {}  # issuer public key → (keypair, [pending])
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def enqueue(self, issuer_keypair, operation):
+        """Queue one operation signed by ``issuer_keypair``; returns a ``Future``."""
+        pending = _Pending(operation)
+        with self._cond:
+            _, queue = self._queues.setdefault(issuer_keypair.public_key, (issuer_keypair, []))
+            queue.append(pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="horizon-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return pending.future
+
+    def _due(self):
+        """Pop every batch that is full or has waited ``window``; else return the next deadline."""
+        now = time.monotonic()
+        due, deadline = [], None
+        for issuer, (keypair, queue) in list(self._queues.items()):
+            while len(queue) >= self.max_ops:
+                due.append((keypair, queue[: self.max_ops]))
+                del queue[: self.max_ops]
+            if not queue:
+                del self._queues[issuer]
+                continue
+            ready_at = queue[0].queued_at + self.window
+            if ready_at <= now:
+                due.append((keypair, list(queue)))
+                del self._queues[issuer]
+            else:
+                deadline = ready_at if deadline is None else min(deadline, ready_at)
+        return due, deadline
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due, deadline = self._due()
+                while not due:
+                    self._cond.wait(None if deadline is None else deadline - time.monotonic())
+                    due, deadline = self._due()
+            for keypair, batch in due:
+                threading.Thread(target=self._send, args=(keypair, batch), name="horizon-batch", daemon=True).start()
+
+    def _send(self, keypair, batch, retry=True, top_up=True):
+        try:
+            response = self.pool.submit(keypair, [p.operation for p in batch], base_fee=self.base_fee, top_up=top_up)
+        except BadRequestError as e:
+            codes = (e.extras or {}).get("result_codes", {})
+            op_codes = codes.get("operations") or []
+            failed = [i for i, code in enumerate(op_codes[: len(batch)]) if code != "op_success"]
+            # Operations past the batch are the channel's top-up.
+            top_up_failed = [code for code in op_codes[len(batch):] if code != "op_success"]
+            if top_up_failed:
+                print(f"⚠️ Channel top-up failed: {top_up_failed[0]}")
+            if not retry or not (failed or top_up_failed) or len(failed) == len(batch):
+                for i, p in enumerate(batch):
+                    code = op_codes[i] if i in failed else codes.get("transaction", "tx_failed")
+                    p.future.set_exception(OperationFailedError(code, e.extras))
+                return
+            for i in failed:
+                batch[i].future.set_exception(OperationFailedError(op_codes[i], e.extras))
+            self._send(keypair, [p for i, p in enumerate(batch) if i not in failed], retry=False, top_up=not top_up_failed)
+            return
+        except Exception as e:
+            for p in batch:
+                p.future.set_exception(e)
+            return
+        for index, p in enumerate(batch):
+            p.future.set_result({
+                "hash": response.get("hash"),
+                "ledger": response.get("ledger"),
+                "operation_index": index,
+                "batch_size": len(batch),
+            })
+
+
+batcher = OperationBatcher()
+
+
+def payout(issuer_keypair, operation, timeout=RESULT_TIMEOUT):
+    """Queue ``operation`` for the next batched issuer transaction and wait for its result."""
+    return batcher.enqueue(issuer_keypair, operation).result(timeout=timeout)
+
+
+_tickets = OrderedDict()  # ticket → Future, process-wide like submission outcomes
+_tickets_lock = threading.Lock()
+
+
+def payout_async(issuer_keypair, operation):
+    """Queue ``operation`` like ``payout`` without waiting; returns a ticket."""
+    ticket = uuid.uuid4().hex
+    future = batcher.enqueue(issuer_keypair, operation)
+    with _tickets_lock:
+        _tickets[ticket] = future
+        while len(_tickets) > MAX_TICKETS:
+            _tickets.popitem(last=False)
+    return ticket
+
+
+def payout_result(ticket):
+    """``{"status": PENDING | SUCCESS | ERROR, ...}`` for ``ticket``, or ``None`` if unknown.
+
+    Success carries ``payout``'s result (``hash``...); an error carries
+    ``error`` and, for a failed operation, its result ``code``.
+    """
+    with _tickets_lock:
+        future = _tickets.get(ticket)
+    if future is None:
+        return None
+    if not future.done():
+        return {"status": PENDING}
+    error = future.exception()
+    if error is None:
+        return {"status": SUCCESS, **future.result()}
+    return {"status": ERROR, "error": str(error) or type(error).__name__, "code": getattr(error, "code", None)}
+
+
+def watch_payout(ticket, interval=POLL_INTERVAL, message="⏳ Payout queued, waiting for the ledger..."):
+    """Show ``message`` while ``ticket`` is pending and rerun the page once it settles."""
+    import streamlit as st
+
+    @st.fragment(run_every=interval)
+    def _watch():
+        outcome = payout_result(ticket)
+        if outcome is None or outcome["status"] != PENDING:
+            st.rerun()
+        st.info(message)
+
+    _watch()
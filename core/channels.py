@@ -0,0 +1,203 @@
+"""Channel accounts for issuer-signed payouts.
+
+Every issuer payout used to be sourced from the issuer itself, so all of
+them shared one sequence number and concurrent users queued up behind it
+(or collided with ``tx_bad_seq``). A channel is a funded account the app
+owns that stands in as the *transaction* source while the issuer stays the
+*operation* source. Each channel has its own sequence number, so the number
+of payouts in flight grows with the pool::
+
+    pay_from_issuer(ISSUER_KEYPAIR, [stellar_sdk.Payment(destination=pk, asset=GEM, amount="1")])
+
+Channels are created on demand (friendbot first, then a ``CreateAccount``
+from the issuer), leased to one payout at a time and returned to the pool
+afterwards. Their fees are tracked locally from ``fee_charged``. When a
+channel runs low, the issuer tops it up with an extra payment inside the
+next payout it signs anyway.
+
+``CHANNEL_POOL_SIZE`` sets the number of channels (default 4).
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+import stellar_sdk
+from stellar_sdk import Asset, Keypair, MuxedAccount, Network, TransactionBuilder
+from stellar_sdk.exceptions import BadRequestError, ConnectionError
+
+from core.fees import fees
+from core.horizon import fund_with_friendbot, get_server
+from core.sequences import sequences, submit_transaction
+
+POOL_SIZE = int(os.getenv("CHANNEL_POOL_SIZE", "4"))
+STARTING_BALANCE = Decimal("20")
+MIN_BALANCE = Decimal("5")
+TOP_UP = Decimal("20")
+LEASE_TIMEOUT = 30.0
+BASE_FEE = 100
+TX_TIMEOUT = 100
+STROOP = Decimal("0.0000001")
+
+
+class ChannelsExhaustedError(RuntimeError):
+    """Every channel stayed leased for ``LEASE_TIMEOUT`` seconds."""
+
+
+class Channel:
+    def __init__(self, keypair, balance):
+        self.keypair = keypair
+        self.balance = Decimal(balance)  # XLM, tracked locally after creation
+
+    @property
+    def public_key(self):
+        return self.keypair.public_key
+
+
+class ChannelPool:
+    def __init__(
+        self,
+        size=POOL_SIZE,
+        network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE,
+        min_balance=MIN_BALANCE,
+        top_up=TOP_UP,
+        lease_timeout=LEASE_TIMEOUT,
+        submit=submit_transaction,
+    ):
+        self.size = size
+        self.network_passphrase = network_passphrase
+        self.min_balance = Decimal(min_balance)
+        self.top_up = Decimal(top_up)
+        self.lease_timeout = lease_timeout
+        self.submit_fn = submit
+        self.channels = []
+        self._idle = queue.SimpleQueue()
+        self._lock = threading.Lock()
+
+    # --- POOL ---
+    def _native_balance(self, account_id):
+        record = get_server().accounts().account_id(account_id).call()
+        return next((b["balance"] for b in record["balances"] if b["asset_type"] == "native"), "0")
+
+    def _create(self, funder):
+        keypair = Keypair.random()
+        if fund_with_friendbot(keypair.public_key):
+            return Channel(keypair, self._native_balance(keypair.public_key))
+        if funder is None:
+            raise ChannelsExhaustedError("friendbot refused to fund a new channel and no funder was given")
+        tx = (
+            TransactionBuilder(sequences.account(funder.public_key), self.network_passphrase, BASE_FEE)
+            .append_create_account_op(keypair.public_key, str(STARTING_BALANCE))
+            .set_timeout(TX_TIMEOUT)
+            .build()
+        )
+        tx.sign(funder)
+        self.submit_fn(tx)
+        return Channel(keypair, STARTING_BALANCE)
+
+    def _checkout(self, funder):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = len(self.channels) < self.size
+            if grow:
+                # Hold the slot while funding, outside the lock.
+                self.channels.append(None)
+        if grow:
+            try:
+                channel = self._create(funder)
+            except BaseException:
+                with self._lock:
+                    self.channels.remove(None)
+                raise
+            with self._lock:
+                self.channels[self.channels.index(None)] = channel
+            return channel
+        try:
+            return self._idle.get(timeout=self.lease_timeout)
+        except queue.Empty:
+            raise ChannelsExhaustedError(f"all {self.size} channels busy for {self.lease_timeout}s") from None
+
+    @contextmanager
+    def lease(self, funder=None):
+        """Borrow a channel for one transaction. ``funder`` creates it if friendbot can't."""
+        channel = self._checkout(funder)
+        try:
+            yield channel
+        finally:
+            self._idle.put(channel)
+
+    # --- PAYOUTS ---
+    def build(self, channel, issuer_keypair, operations, base_fee=None, memo=None, top_up=True):
+        """A transaction from ``channel`` carrying ``operations`` on behalf of the issuer,
+        signed by both. Adds a top-up payment (the last operation) when the channel
+        is running low, unless ``top_up`` is false.
+        ``base_fee`` defaults to the current ``core.fees`` estimate."""
+        issuer = MuxedAccount.from_account(issuer_keypair.public_key)
+        operations = list(operations)
+        if top_up and channel.balance < self.min_balance:
+            operations.append(stellar_sdk.Payment(destination=channel.public_key, asset=Asset.native(), amount=str(self.top_up)))
+        builder = TransactionBuilder(sequences.account(channel.public_key), self.network_passphrase, base_fee or fees.base_fee())
+        for op in operations:
+            if op.source is None:
+                op.source = issuer
+            builder.append_operation(op)
+        if memo is not None:
+            builder.add_memo(memo)
+        tx = builder.set_timeout(TX_TIMEOUT).build()
+        tx.sign(channel.keypair)
+        tx.sign(issuer_keypair)
+        return tx
+
+    def _settle(self, channel, tx, response):
+        fee = response.get("fee_charged") if isinstance(response, dict) else None
+        channel.balance -= Decimal(fee) * STROOP if fee is not None else Decimal(tx.transaction.fee) * STROOP
+        for op in tx.transaction.operations:
+            if isinstance(op, stellar_sdk.Payment) and op.destination.account_id == channel.public_key:
+                channel.balance += Decimal(op.amount)
+
+    def submit(self, issuer_keypair, operations, base_fee=None, memo=None, submit=None, top_up=True):
+        """Send ``operations`` (issuer as source) through a leased channel.
+
+        ``submit`` defaults to ``core.sequences.submit_transaction``; pages
+        that render their own result can pass their submit helper instead.
+        Returns whatever ``submit`` returns.
+        """
+        submit = submit or self.submit_fn
+        with self.lease(funder=issuer_keypair) as channel:
+            tx = self.build(channel, issuer_keypair, operations, base_fee=base_fee, memo=memo, top_up=top_up)
+            try:
+                response = submit(tx)
+            except BadRequestError as e:
+                extras = e.extras or {}
+                if extras.get("result_codes", {}).get("transaction") in ("tx_failed", "tx_fee_bump_inner_failed"):
+                    channel.balance -= Decimal(tx.transaction.fee) * STROOP
+                raise
+            except ConnectionError:
+                # Unknown whether it landed; reload the sequence next time.
+                sequences.forget(channel.public_key)
+                raise
+            if response:
+                self._settle(channel, tx, response)
+            return response
+
+    def status(self):
+        with self._lock:
+            channels = [c for c in self.channels if c is not None]
+            return {
+                "size": self.size,
+                "created": len(channels),
+                "idle": self._idle.qsize(),
+                "balances": {c.public_key: str(c.balance) for c in channels},
+            }
+
+
+channels = ChannelPool()
+
+
+def pay_from_issuer(issuer_keypair, operations, base_fee=None, memo=None, submit=None):
+    """Submit issuer-signed ``operations`` through the shared channel pool."""
+    return channels.submit(issuer_keypair, operations, base_fee=base_fee, memo=memo, submit=submit)
@@ -0,0 +1,168 @@
+"""A pool of pre-funded demo accounts.
+
+In demo mode (no ``ISSUER_KEY`` secret), pages used to generate a fresh
+keypair per session and call friendbot while rendering, sometimes sleeping
+afterwards. Friendbot is slow and rate-limited, so a burst of visitors
+stalled on it. ``DemoAccountPool`` keeps ``DEMO_POOL_SIZE`` funded accounts
+per role (only ``ISSUER`` by default, the role every page leases) in a small
+SQLite store next to the Horizon warm cache. A session leases one at once,
+and a background thread funds replacements::
+
+    if "demo_key" not in st.session_state:
+        st.session_state.demo_key = lease_demo_secret()
+
+Accounts are stored per Horizon URL, so the stand-in and testnet never share
+them. They are dropped after ``DEMO_POOL_MAX_AGE`` seconds, since testnet is
+reset every few months. When the pool is empty, the lease still returns a
+key straight away and funds it in the background. ``DEMO_POOL=off``
+disables the store, so every lease takes that path.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from stellar_sdk import Keypair
+
+from core import horizon
+
+ISSUER, USER = "issuer", "user"
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "demo_accounts.sqlite3")
+POOL_SIZE = int(os.getenv("DEMO_POOL_SIZE", "4"))
+MAX_AGE = float(os.getenv("DEMO_POOL_MAX_AGE", str(7 * 86400)))
+RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 120.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    secret TEXT PRIMARY KEY,
+    network TEXT NOT NULL,
+    role TEXT NOT NULL,
+    funded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS accounts_ready ON accounts (network, role, funded_at);
+"""
+
+
+class DemoAccountPool:
+    def __init__(self, path=DEFAULT_PATH, size=POOL_SIZE, roles=(ISSUER,), max_age=MAX_AGE, fund=None, clock=time.time):
+        self.path = path
+        self.size = size
+        self.roles = roles
+        self.max_age = max_age
+        self.fund = fund or horizon.fund_with_friendbot
+        self.clock = clock
+        self._local = threading.local()
+        self._refilling = threading.Event()
+        if path is not None:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Shared by every Streamlit process on the host.
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def network():
+        return horizon.HORIZON_URL
+
+    def lease(self, role=ISSUER):
+        """A funded keypair for ``role``, removed from the pool; never waits on friendbot."""
+        secret = self._take(role) if self.path is not None else None
+        self.refill()
+        if secret is not None:
+            return Keypair.from_secret(secret)
+        keypair = Keypair.random()
+        threading.Thread(target=self.fund, args=(keypair.public_key,), name="demo-fund", daemon=True).start()
+        return keypair
+
+    def _take(self, role):
+        db = self._db()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM accounts WHERE funded_at < ?", (self.clock() - self.max_age,))
+                row = db.execute(
+                    "SELECT secret FROM accounts WHERE network = ? AND role = ? ORDER BY funded_at LIMIT 1",
+                    (self.network(), role),
+                ).fetchone()
+                if row is not None:
+                    db.execute("DELETE FROM accounts WHERE secret = ?", row)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        except sqlite3.Error:
+            return None
+        return row[0] if row is not None else None
+
+    def ready(self, role):
+        if self.path is None:
+            return 0
+        (count,) = self._db().execute(
+            "SELECT COUNT(*) FROM accounts WHERE network = ? AND role = ? AND funded_at >= ?",
+            (self.network(), role, self.clock() - self.max_age),
+        ).fetchone()
+        return count
+
+    def refill(self):
+        """Top every role up to ``size`` in a background thread (one at a time)."""
+        if self.path is None or self._refilling.is_set():
+            return
+        self._refilling.set()
+        threading.Thread(target=self._refill, name="demo-refill", daemon=True).start()
+
+    def _refill(self):
+        delay = RETRY_DELAY
+        network = self.network()
+        try:
+            while True:
+                short = [role for role in self.roles if self.ready(role) < self.size]
+                if not short:
+                    return
+                keypair = Keypair.random()
+                try:
+                    funded = self.fund(keypair.public_key)
+                except Exception:
+                    funded = False
+                if not funded:
+                    # Friendbot is rate limiting or down; back off instead of hammering it.
+                    time.sleep(delay)
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+                    continue
+                delay = RETRY_DELAY
+                self._db().execute(
+                    "INSERT INTO accounts VALUES (?, ?, ?, ?)", (keypair.secret, network, short[0], self.clock())
+                )
+        except sqlite3.Error:
+            pass
+        finally:
+            self._refilling.clear()
+
+    def status(self):
+        return {"size": self.size, "ready": {role: self.ready(role) for role in self.roles}, "refilling": self._refilling.is_set()}
+
+
+def open_default():
+    if os.getenv("DEMO_POOL", "on").lower() in ("0", "off", "false", "no"):
+        return DemoAccountPool(path=None)
+    try:
+        return DemoAccountPool(os.getenv("DEMO_POOL_PATH", DEFAULT_PATH))
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Demo account pool disabled: {e}")
+        return DemoAccountPool(path=None)
+
+
+demo_accounts = open_default()
+
+
+def lease_demo_secret(role=ISSUER):
+    """The secret of a funded demo account for this session."""
+    return demo_accounts.lease(role).secret
@@ -0,0 +1,130 @@
+"""Parse each signed envelope once, and check its signatures before sending it.
+
+A signed XDR coming back from Freighter used to be decoded several times
+per rerun: the page parsed it, the submission layer parsed it again to hash
+it, and the sequence manager decoded it once more to find its source.
+``parse`` keeps the decoded envelope, its hash, its source and sequence, and
+the signature checks already done in a small process-wide LRU keyed by the
+XDR, so every consumer shares the work::
+
+    parsed = parse(signed_xdr)
+    parsed.hash_hex, parsed.source, parsed.envelope.transaction.operations
+    check_signatures(signed_xdr, signer=public_key)  # raises InvalidSignatureError
+
+The parsed envelope is shared: read it, don't sign or modify it.
+"""
+import threading
+from collections import OrderedDict
+
+from stellar_sdk import FeeBumpTransactionEnvelope, Keypair, Network, TransactionBuilder
+from stellar_sdk.exceptions import BadSignatureError
+
+MAX_ENTRIES = 256
+
+
+class InvalidSignatureError(ValueError):
+    """The envelope is unsigned, or a signature does not verify; Horizon would
+    answer ``tx_bad_auth``."""
+
+
+class ParsedEnvelope:
+    def __init__(self, envelope_xdr, network_passphrase):
+        self.xdr = envelope_xdr
+        self.envelope = TransactionBuilder.from_xdr(envelope_xdr, network_passphrase)
+        self.hash = self.envelope.hash()
+        self.hash_hex = self.hash.hex()
+        if isinstance(self.envelope, FeeBumpTransactionEnvelope):
+            self.inner = self.envelope.transaction.inner_transaction_envelope
+            self.fee_source = self.envelope.transaction.fee_source.account_id
+        else:
+            self.inner = self.envelope
+            self.fee_source = None
+        self.source = self.inner.transaction.source.account_id
+        self.sequence = self.inner.transaction.sequence
+        # The source, then every other account whose operations it carries.
+        self.accounts = [self.source]
+        for op in self.inner.transaction.operations:
+            if op.source is not None and op.source.account_id not in self.accounts:
+                self.accounts.append(op.source.account_id)
+        self._verified = {}  # (signer, inner?) → bool
+        self._lock = threading.Lock()
+
+    def signed_by(self, public_key, inner=False):
+        """True if one of the (inner) envelope's signatures is ``public_key``'s."""
+        key = (public_key, inner)
+        with self._lock:
+            if key in self._verified:
+                return self._verified[key]
+        envelope = self.inner if inner else self.envelope
+        keypair = Keypair.from_public_key(public_key)
+        hint = keypair.signature_hint()
+        tx_hash = envelope.hash()
+        verified = False
+        for decorated in envelope.signatures:
+            if decorated.signature_hint != hint:
+                continue
+            try:
+                keypair.verify(tx_hash, decorated.signature)
+                verified = True
+                break
+            except BadSignatureError:
+                continue
+        with self._lock:
+            self._verified[key] = verified
+        return verified
+
+    def has_bad_signature(self, public_key, inner=False):
+        """True if a signature carries ``public_key``'s hint but none of them verify."""
+        envelope = self.inner if inner else self.envelope
+        hint = Keypair.from_public_key(public_key).signature_hint()
+        if not any(d.signature_hint == hint for d in envelope.signatures):
+            return False
+        return not self.signed_by(public_key, inner)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def parse(envelope_xdr, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+    """The shared ``ParsedEnvelope`` for ``envelope_xdr``."""
+    key = (envelope_xdr, network_passphrase)
+    with _cache_lock:
+        parsed = _cache.get(key)
+        if parsed is not None:
+            _cache.move_to_end(key)
+            return parsed
+    parsed = ParsedEnvelope(envelope_xdr, network_passphrase)
+    with _cache_lock:
+        _cache[key] = parsed
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return parsed
+
+
+def check_signatures(envelope_xdr, signer=None, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+    """Reject envelopes Horizon would refuse for their signatures.
+
+    Raises ``InvalidSignatureError`` if an envelope has no signatures, if a
+    signature made with the key of the source (or of an operation source)
+    does not verify, or if ``signer`` (a public key, or several) is given and
+    did not sign. Accounts with extra signers still pass, because only keys
+    known here are checked.
+    """
+    parsed = parse(envelope_xdr, network_passphrase)
+    inner = parsed.fee_source is not None
+    checks = [(account_id, inner) for account_id in parsed.accounts]
+    if parsed.fee_source is not None:
+        checks.append((parsed.fee_source, False))
+    for account_id, inner in checks:
+        envelope = parsed.inner if inner else parsed.envelope
+        if not envelope.signatures:
+            raise InvalidSignatureError(f"transaction {parsed.hash_hex} is not signed")
+        # A key that signed under another account's hint is not checked: it
+        # may be one of that account's extra signers.
+        if parsed.has_bad_signature(account_id, inner):
+            raise InvalidSignatureError(f"signature by {account_id} does not verify for {parsed.hash_hex}")
+    for key in [signer] if isinstance(signer, str) else signer or ():
+        if not (parsed.signed_by(key) or parsed.signed_by(key, inner=True)):
+            raise InvalidSignatureError(f"transaction {parsed.hash_hex} is not signed by {key}")
+    return parsed
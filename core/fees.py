@@ -0,0 +1,115 @@
+"""Fee estimation from Horizon's ``fee_stats``, and fee bumps for stuck transactions.
+
+Pages used to build every transaction with ``base_fee=100``. That is the
+network minimum, so under surge pricing those transactions sat in the queue
+until they timed out and users clicked again. ``FeeEstimator`` samples
+``/fee_stats`` at most every ``FEE_SAMPLE_INTERVAL`` seconds and answers
+with a per-operation fee for a fee class::
+
+    TransactionBuilder(source, NETWORK_PASSPHRASE, base_fee())          # STANDARD
+    TransactionBuilder(source, NETWORK_PASSPHRASE, base_fee(ECONOMY))
+
+A transaction that is still pending after ``FEE_BUMP_AFTER`` seconds can be
+wrapped in a fee-bump envelope paid by a sponsor account, so the user does
+not have to sign again. ``core.submission`` does that for queued submissions
+when ``FEE_SPONSOR_SECRET`` is set. Fees never go above ``MAX_BASE_FEE``
+stroops per operation.
+"""
+import math
+import os
+import threading
+import time
+
+from stellar_sdk import Keypair, Network, TransactionBuilder
+from stellar_sdk.exceptions import BadResponseError, ConnectionError
+
+from core.envelopes import parse
+from core.horizon import get_server
+
+ECONOMY, STANDARD, PRIORITY = "economy", "standard", "priority"
+# fee class → percentile of the recent ``max_fee`` bids
+PERCENTILES = {ECONOMY: "p20", STANDARD: "p60", PRIORITY: "p90"}
+
+MIN_BASE_FEE = 100
+MAX_BASE_FEE = int(os.getenv("MAX_BASE_FEE", "10000"))
+SAMPLE_INTERVAL = float(os.getenv("FEE_SAMPLE_INTERVAL", "10"))
+BUMP_AFTER = float(os.getenv("FEE_BUMP_AFTER", "15"))
+# stellar-core only replaces a queued transaction with a fee bump bidding at
+# least this many times its per-operation fee.
+BUMP_FACTOR = 10
+
+
+class FeeEstimator:
+    def __init__(self, sample_interval=SAMPLE_INTERVAL, max_fee=MAX_BASE_FEE, percentiles=None, clock=time.monotonic):
+        self.sample_interval = sample_interval
+        self.max_fee = max_fee
+        self.percentiles = PERCENTILES if percentiles is None else percentiles
+        self.clock = clock
+        self._stats = None
+        self._sampled_at = None
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """The latest ``fee_stats`` record, or ``None`` if Horizon never answered."""
+        with self._lock:
+            if self._sampled_at is not None and self.clock() - self._sampled_at < self.sample_interval:
+                return self._stats
+            # Set first so concurrent callers use the old sample instead of piling up.
+            self._sampled_at = self.clock()
+        try:
+            stats = get_server().fee_stats().call()
+        except (ConnectionError, BadResponseError):
+            return self._stats
+        with self._lock:
+            self._stats = stats
+        return stats
+
+    def base_fee(self, fee_class=STANDARD):
+        """Per-operation fee, in stroops, for ``fee_class``."""
+        stats = self.sample()
+        if stats is None:
+            return MIN_BASE_FEE
+        floor = int(stats.get("last_ledger_base_fee") or MIN_BASE_FEE)
+        bid = int(stats["max_fee"].get(self.percentiles[fee_class]) or floor)
+        return min(max(bid, floor, MIN_BASE_FEE), self.max_fee)
+
+    def bump_fee(self, inner_base_fee):
+        """Per-operation fee for a fee bump over ``inner_base_fee``, or ``None`` if
+        ``BUMP_FACTOR`` times it is above ``max_fee``."""
+        minimum = inner_base_fee * BUMP_FACTOR
+        if minimum > self.max_fee:
+            return None
+        return min(max(self.base_fee(PRIORITY), minimum), self.max_fee)
+
+
+fees = FeeEstimator()
+
+
+def base_fee(fee_class=STANDARD):
+    """The estimated per-operation fee for new transactions."""
+    return fees.base_fee(fee_class)
+
+
+def fee_sponsor():
+    """The account that pays for fee bumps (``FEE_SPONSOR_SECRET``), or ``None``."""
+    secret = os.getenv("FEE_SPONSOR_SECRET")
+    return Keypair.from_secret(secret) if secret else None
+
+
+def fee_bump(envelope_xdr, sponsor, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE, estimator=fees):
+    """Wrap a signed envelope in a fee bump paid and signed by ``sponsor``.
+
+    Returns the fee-bump envelope, or ``None`` when ``envelope_xdr`` is already
+    a fee bump or ``BUMP_FACTOR`` times its fee is above ``MAX_BASE_FEE``.
+    """
+    parsed = parse(envelope_xdr, network_passphrase)
+    if parsed.fee_source is not None:
+        return None
+    inner = parsed.envelope
+    inner_base_fee = math.ceil(inner.transaction.fee / len(inner.transaction.operations))
+    fee = estimator.bump_fee(inner_base_fee)
+    if fee is None:
+        return None
+    envelope = TransactionBuilder.build_fee_bump_transaction(sponsor.public_key, fee, inner, network_passphrase)
+    envelope.sign(sponsor)
+    return envelope
@@ -0,0 +1,77 @@
+"""Plan a multi-step page flow as one atomic transaction.
+
+Flows like "trust the asset, receive some from the issuer, record data"
+used to take one Freighter round trip per step: a signature, a page reload
+through query params and a Horizon submit each. A ``FlowPlan`` collects
+every operation the user will need and builds them into one transaction.
+Operations that run from an app-held account (the issuer) carry that
+account as their source, and the app signs the envelope with its key
+before the user signs it in Freighter::
+
+    plan = FlowPlan(user_public_key)
+    if not has_trustline:
+        plan.trust(GEM, "1000000000")
+    plan.add(stellar_sdk.Payment(destination=user_public_key, asset=GEM, amount="1"), "Receive 1 GEM", signer=ISSUER_KEYPAIR)
+    xdr = plan.to_xdr()  # one signature, one submit
+
+Stellar applies all the operations or none, so a half-finished flow cannot
+be left behind.
+"""
+from stellar_sdk import ChangeTrust, MuxedAccount, Network, TransactionBuilder
+
+from core.fees import fees
+from core.sequences import load_source_account
+
+MAX_OPERATIONS = 100
+TX_TIMEOUT = 300
+
+
+class FlowPlan:
+    def __init__(self, source_public_key, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+        self.source_public_key = source_public_key
+        self.network_passphrase = network_passphrase
+        self.steps = []  # (label, operation)
+        self.signers = {}  # public key → app-held keypair that co-signs
+
+    def add(self, operation, label=None, signer=None):
+        """Append ``operation``. With ``signer`` it runs from that account, which co-signs."""
+        if len(self.steps) >= MAX_OPERATIONS:
+            raise ValueError(f"a transaction holds at most {MAX_OPERATIONS} operations")
+        if signer is not None:
+            if operation.source is None:
+                operation.source = MuxedAccount.from_account(signer.public_key)
+            self.signers[signer.public_key] = signer
+        self.steps.append((label or type(operation).__name__, operation))
+        return self
+
+    def trust(self, asset, limit=None):
+        return self.add(ChangeTrust(asset=asset, limit=limit), f"Trust {asset.code}")
+
+    @property
+    def labels(self):
+        return [label for label, _ in self.steps]
+
+    def __len__(self):
+        return len(self.steps)
+
+    def build(self, base_fee=None, timeout=TX_TIMEOUT, reserve=True):
+        """The transaction, already signed by every co-signer; the user signs last.
+
+        ``reserve=False`` builds on the source's current sequence without
+        reserving it, for envelopes signed through a redirect (see
+        ``core.sequences.SequenceManager.account``).
+        """
+        if not self.steps:
+            raise ValueError("the flow has no operations")
+        builder = TransactionBuilder(
+            load_source_account(self.source_public_key, reserve=reserve), self.network_passphrase, base_fee or fees.base_fee()
+        )
+        for _, operation in self.steps:
+            builder.append_operation(operation)
+        envelope = builder.set_timeout(timeout).build()
+        for signer in self.signers.values():
+            envelope.sign(signer)
+        return envelope
+
+    def to_xdr(self, base_fee=None, timeout=TX_TIMEOUT, reserve=True):
+        return self.build(base_fee=base_fee, timeout=timeout, reserve=reserve).to_xdr()
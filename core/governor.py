@@ -0,0 +1,192 @@
+"""Process-wide Horizon rate-limit governor and circuit breaker.
+
+Every session of every page shares one Horizon budget. The governor reads
+Horizon's ``X-Ratelimit-*`` headers and, as the budget runs out, sheds
+low-priority reads first, then makes normal reads wait for the window to
+reset, and always lets transaction submissions through. Repeated 429s,
+5xx responses or connection errors trip the circuit breaker; while it is
+open, reads are answered from the last good snapshot (see
+``core.horizon.HorizonClient``) instead of each page showing its own error.
+
+Mark a read as low priority where it is only a refresh::
+
+    with priority(LOW):
+        account = get_server().accounts().account_id(pk).call()
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from stellar_sdk.exceptions import ConnectionError
+
+# --- PRIORITIES ---
+LOW = 0  # balance refreshes and other reads that can be skipped
+NORMAL = 1  # reads the page needs to render
+SUBMIT = 2  # transaction submissions, never shed
+
+_priority = contextvars.ContextVar("horizon_priority", default=None)
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed Horizon calls at ``level``."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority(method):
+    level = _priority.get()
+    if level is None:
+        return SUBMIT if method == "POST" else NORMAL
+    return level
+
+
+class HorizonUnavailableError(ConnectionError):
+    """Horizon is considered unhealthy and the call was not sent."""
+
+
+class RateLimitedError(HorizonUnavailableError):
+    """The shared rate-limit budget cannot cover this call right now."""
+
+
+# --- CIRCUIT BREAKER ---
+class CircuitBreaker:
+    """Closed → open after ``failure_threshold`` consecutive failures,
+    half-open after ``cooldown`` seconds, closed again on the first success."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, cooldown=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out. Half-open lets exactly one probe through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def abandon(self):
+        """The admitted probe never went out; let the next caller probe instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+# --- GOVERNOR ---
+class HorizonGovernor:
+    """Tracks the shared rate-limit budget and decides who may spend it.
+
+    ``reserve`` requests are kept back for submissions; ``low_reserve`` is the
+    point below which low-priority reads are shed outright. Normal reads wait
+    up to ``max_wait`` seconds for the window to reset before giving up.
+    Submissions are never held back. Without an ``X-Ratelimit-Reset`` header
+    the window is assumed to reset ``default_reset`` seconds after the budget
+    ran out.
+    """
+
+    def __init__(self, reserve=20, low_reserve=100, max_wait=2.0, default_reset=60.0, breaker=None, clock=time.monotonic):
+        self.reserve = reserve
+        self.low_reserve = low_reserve
+        self.max_wait = max_wait
+        self.default_reset = default_reset
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.clock = clock
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.shed = 0
+        self._cond = threading.Condition()
+
+    def _floor(self, level):
+        return {LOW: self.low_reserve, NORMAL: self.reserve}.get(level, 0)
+
+    def acquire(self, level):
+        """Block, shed or admit one call at ``level``."""
+        if level < SUBMIT and not self.breaker.allow():
+            raise HorizonUnavailableError("Horizon circuit breaker is open")
+        with self._cond:
+            while True:
+                now = self.clock()
+                if self.remaining is None or (self.reset_at is not None and now >= self.reset_at):
+                    return
+                if level >= SUBMIT or self.remaining > self._floor(level):
+                    self.remaining = max(0, self.remaining - 1)
+                    return
+                if self.reset_at is None:
+                    self.reset_at = now + self.default_reset  # nothing else would ever wake us
+                wait = self.reset_at - now
+                if level == LOW or wait > self.max_wait:
+                    self.shed += 1
+                    self.breaker.abandon()
+                    raise RateLimitedError(f"Horizon rate limit: {self.remaining} requests left")
+                self._cond.wait(wait)
+
+    def record(self, status_code, headers):
+        """Feed a response back: update the budget and the breaker."""
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        with self._cond:
+            if "x-ratelimit-limit" in headers:
+                self.limit = int(headers["x-ratelimit-limit"])
+            if "x-ratelimit-remaining" in headers:
+                self.remaining = int(headers["x-ratelimit-remaining"])
+            if "x-ratelimit-reset" in headers:
+                self.reset_at = self.clock() + float(headers["x-ratelimit-reset"])
+            if status_code == 429:
+                self.remaining = 0
+                retry_after = headers.get("retry-after")
+                if retry_after is not None:
+                    self.reset_at = self.clock() + float(retry_after)
+            self._cond.notify_all()
+        if status_code == 429 or status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def record_error(self):
+        """A connection-level failure (no response at all)."""
+        self.breaker.record_failure()
+
+    def status(self):
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "reset_in": None if self.reset_at is None else max(0.0, self.reset_at - self.clock()),
+            "breaker": self.breaker.state,
+            "shed": self.shed,
+        }
+
+
+governor = HorizonGovernor()
@@ -0,0 +1,220 @@
+"""One place to decide which Horizon and friendbot every page talks to.
+
+Set ``HORIZON_URL`` (and optionally ``FRIENDBOT_URL``) in the environment to
+point the whole App Store at another Horizon, e.g. the local stand-in::
+
+    python -m core.standin --port 8000
+    HORIZON_URL=http://127.0.0.1:8000 streamlit run Home.py
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from stellar_sdk import Server
+from stellar_sdk.client.requests_client import RequestsClient
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import ConnectionError
+
+from core.governor import LOW, HorizonUnavailableError, current_priority, governor, priority
+from core.metrics import metrics
+from core.warmcache import STALE, open_default
+
+# --- CONFIGURATION ---
+TESTNET_HORIZON_URL = "https://horizon-testnet.stellar.org"
+TESTNET_FRIENDBOT_URL = "https://friendbot.stellar.org"
+
+HORIZON_URL = os.getenv("HORIZON_URL", TESTNET_HORIZON_URL).rstrip("/")
+
+# An overridden Horizon (the stand-in) serves friendbot itself, so follow it
+# unless friendbot is pinned separately.
+FRIENDBOT_URL = os.getenv(
+    "FRIENDBOT_URL",
+    TESTNET_FRIENDBOT_URL if HORIZON_URL == TESTNET_HORIZON_URL else f"{HORIZON_URL}/friendbot",
+).rstrip("/")
+
+FRIENDBOT_TIMEOUT = 30
+SNAPSHOT_SIZE = 512
+POOL_SIZE = 32
+
+
+class HorizonClient(RequestsClient):
+    """The HTTP client behind ``get_server()``.
+
+    Every call is admitted by the shared ``governor`` first. Successful GETs
+    are remembered, so when a read is shed, rate limited, or Horizon is down,
+    the last good snapshot is served instead (marked with an
+    ``X-Organism-Snapshot: stale`` header).
+
+    With a ``warm_cache`` (``core.warmcache``), GETs it holds a policy for
+    are answered from disk while fresh, and served stale while a background
+    thread refreshes them. Those responses carry ``X-Organism-Cache``.
+    Submissions drop the cached account state.
+
+    Each request is reported to every hook as
+    ``hook(method, url, status, elapsed_seconds, response_bytes)``; by
+    default that is ``core.metrics``. Calls answered without touching the
+    network report a status of ``"warm"``, ``"stale"`` or ``"shed"``.
+    """
+
+    def __init__(self, governor=governor, snapshot_size=SNAPSHOT_SIZE, hooks=None, warm_cache=None, **kwargs):
+        # Retries would spend the shared budget behind the governor's back.
+        kwargs.setdefault("num_retries", 0)
+        super().__init__(**kwargs)
+        self.governor = governor
+        self.hooks = [metrics.record] if hooks is None else list(hooks)
+        self.snapshot_size = snapshot_size
+        self._snapshots = OrderedDict()
+        self._snapshots_lock = threading.Lock()
+        self.warm_cache = warm_cache
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+
+    def _snapshot_key(self, url, params):
+        return url, tuple(sorted((params or {}).items()))
+
+    def _remember(self, key, response):
+        with self._snapshots_lock:
+            self._snapshots[key] = response
+            self._snapshots.move_to_end(key)
+            while len(self._snapshots) > self.snapshot_size:
+                self._snapshots.popitem(last=False)
+
+    def _report(self, method, url, status, elapsed=None, response=None):
+        nbytes = 0
+        if response is not None:
+            length = response.headers.get("Content-Length")
+            nbytes = int(length) if length else len(response.text.encode())
+        for hook in self.hooks:
+            hook(method, url, status, elapsed, nbytes)
+
+    def _stale(self, key):
+        with self._snapshots_lock:
+            response = self._snapshots.get(key)
+        if response is None and self.warm_cache is not None:
+            # Nothing in memory yet (fresh process): fall back to disk.
+            hit = self.warm_cache.lookup(key[0], dict(key[1]), any_age=True)
+            if hit is not None:
+                status_code, headers, text, response_url = hit[1]
+                response = Response(status_code=status_code, text=text, headers=headers, url=response_url)
+        if response is None:
+            self._report("GET", key[0], "shed")
+            return None
+        self._report("GET", key[0], "stale")
+        return Response(
+            status_code=response.status_code,
+            text=response.text,
+            headers={**response.headers, "X-Organism-Snapshot": "stale"},
+            url=response.url,
+        )
+
+    def _warm(self, url, params, max_content_size):
+        started = time.perf_counter()
+        hit = self.warm_cache.lookup(url, params)
+        if hit is None:
+            return None
+        freshness, (status_code, headers, text, response_url) = hit
+        if freshness == STALE:
+            self._revalidate(url, params, max_content_size)
+        response = Response(status_code, text, {**headers, "X-Organism-Cache": freshness}, response_url)
+        self._report("GET", url, "warm", time.perf_counter() - started, response)
+        return response
+
+    def _revalidate(self, url, params, max_content_size):
+        key = self._snapshot_key(url, params)
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def refresh():
+            try:
+                with priority(LOW):
+                    self._fetch(url, params, max_content_size)
+            except ConnectionError:
+                pass
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=refresh, name="horizon-revalidate", daemon=True).start()
+
+    def get(self, url, params=None, max_content_size=None):
+        if self.warm_cache is not None:
+            response = self._warm(url, params, max_content_size)
+            if response is not None:
+                return response
+        return self._fetch(url, params, max_content_size)
+
+    def _fetch(self, url, params=None, max_content_size=None):
+        key = self._snapshot_key(url, params)
+        try:
+            self.governor.acquire(current_priority("GET"))
+        except HorizonUnavailableError:
+            stale = self._stale(key)
+            if stale is None:
+                raise
+            return stale
+        started = time.perf_counter()
+        try:
+            response = super().get(url, params=params, max_content_size=max_content_size)
+        except ConnectionError:
+            self._report("GET", url, "error", time.perf_counter() - started)
+            self.governor.record_error()
+            stale = self._stale(key)
+            if stale is None:
+                raise
+            return stale
+        self._report("GET", url, response.status_code, time.perf_counter() - started, response)
+        self.governor.record(response.status_code, response.headers)
+        if response.status_code == 200:
+            self._remember(key, response)
+            if self.warm_cache is not None:
+                self.warm_cache.store(url, params, response)
+        elif response.status_code == 429 or response.status_code >= 500:
+            return self._stale(key) or response
+        return response
+
+    def post(self, url, data=None, json_data=None):
+        try:
+            self.governor.acquire(current_priority("POST"))
+        except HorizonUnavailableError:
+            self._report("POST", url, "shed")
+            raise
+        started = time.perf_counter()
+        try:
+            response = super().post(url, data=data, json_data=json_data)
+        except ConnectionError:
+            self._report("POST", url, "error", time.perf_counter() - started)
+            self.governor.record_error()
+            raise
+        self._report("POST", url, response.status_code, time.perf_counter() - started, response)
+        self.governor.record(response.status_code, response.headers)
+        if self.warm_cache is not None:
+            self.warm_cache.invalidate_volatile()
+        return response
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_server():
+    """Return the process-wide ``Server`` for ``HORIZON_URL``."""
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                _server = Server(HORIZON_URL, client=HorizonClient(pool_size=POOL_SIZE, warm_cache=open_default()))
+    return _server
+
+
+def friendbot_url(public_key):
+    return f"{FRIENDBOT_URL}/?addr={public_key}"
+
+
+def fund_with_friendbot(public_key):
+    """Ask friendbot for testnet lumens. Returns True when the account got funded."""
+    response = requests.get(friendbot_url(public_key), timeout=FRIENDBOT_TIMEOUT)
+    return response.ok
@@ -0,0 +1,349 @@
+"""Headless load test of the pages, on ``AppTest`` and the Horizon stand-in.
+
+Each simulated session runs one user journey on one page in a fresh
+``streamlit.testing.v1.AppTest``: load the page, connect, trust the page's
+asset, receive a payout, as far as the page has them (``JOURNEYS``). A step
+clicks the first button whose label matches it; if the page shows none, the
+step is skipped and the journey counts as incomplete. Payouts queued through
+``core.batching`` are waited for before the next step. Freighter is played
+by the harness: requests queued for a ``core.wallet`` bridge are answered
+between runs (connect with the session's key, sign with its secret). Pages
+that still connect through a redirect get its query parameters instead
+(``REDIRECTS``).
+
+Sessions run in a process pool against one in-process stand-in, page after
+page::
+
+    python -m core.loadtest --sessions 16 --workers 4 --latency 0.02
+    python -m core.loadtest pages/020_stardust_swirl_emporium.py --json out.json
+
+For every page it reports script runs per second (of wall time, across the
+pool), p50/p95 script run time, Horizon calls per journey (counted by
+``core.metrics``), how many journeys hit an exception and how many skipped
+a step (``!`` marks the skipped steps), and the most common exceptions and
+``st.error`` messages.
+Workers default to ``HORIZON_CACHE=off``, ``DEMO_POOL=off`` and
+``SESSION_STORE=memory``, so a run neither reads nor leaves state in
+``.cache/``. Set them explicitly to measure with the caches on.
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core.standin import Standin, StandinConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_TIMEOUT = 30
+MAX_WALLET_ROUNDS = 4  # Freighter answers per step (a signature can lead to another request)
+
+# (step, button label pattern); the page's first matching button is clicked.
+# A tuple of patterns is clicked in order (build, then sign...).
+JOURNEY = (
+    ("connect", r"(?<![a-z])connect"),
+    ("trust", r"trust|establish"),
+    ("payout", r"receive|claim|request \d|payout|reward|enter"),
+)
+# Each page's own labels, by number prefix; a page lists only the steps it has.
+# JOURNEY covers pages added since.
+JOURNEYS = {
+    "001": (("connect", r"^Connect Freighter Wallet"),),
+    "002": (("connect", r"Connect Freighter"), ("trust", (r"Build ChangeTrust", r"Sign with Freighter"))),
+    "003": (
+        ("connect", r"^Connect Freighter Wallet"),
+        ("trust", r"^Create Trustline"),
+        ("payout", (r"^Create Claimable Balance \(Issuer\)", r"^Claim Balance")),
+    ),
+    "004": (("connect", r"^Connect Freighter"),),
+    "005": (("connect", r"^Connect Wallet"),),
+    "006": (("connect", r"^Connect Freighter Wallet"), ("trust", r"^Transplant .* Spore")),
+    "007": (("connect", r"^Connect Freighter"), ("trust", r"Adopt Your AetherGem")),  # trustline and first gem, one signature
+    "008": (("connect", r"^Connect Freighter"),),
+    "009": (("connect", r"^Connect Freighter"), ("trust", r"^Acquire .* Fragment")),
+    "010": (("connect", r"^Connect Freighter Wallet"), ("trust", r"^Trust FRAGA"), ("payout", r"^Request 10 FRAGA")),
+    "011": (("connect", r"^Connect Freighter Wallet"), ("trust", r"^Establish Trustline for")),
+    "012": (("connect", r"^Connect to Freighter"), ("trust", r"^Create Trustline for"), ("payout", r"^Forge ")),
+    "013": (("connect", r"^Connect with Freighter"), ("trust", r"^Establish Trustline for"), ("payout", r"^Get \d+ Demo")),
+    "014": (("connect", r"^Connect Freighter"), ("trust", r"^Trust .* Asset"), ("payout", r"^Obtain ")),
+    "015": (("connect", r"^Connect$"),),
+    "016": (("connect", r"^Connect Freighter Wallet"), ("trust", r"^Sponsor New Whim-Seed")),  # trustline and sponsorship, one signature
+    "017": (("connect", r"^Connect Freighter"), ("trust", r"^Trust GLIM")),
+    "018": (("connect", r"^Connect Freighter Wallet"), ("trust", r"^Establish Trustline for"), ("payout", r"^Gather \d+ ")),
+    "019": (("connect", r"^Connect Freighter"),),
+    "020": (
+        ("connect", r"Connect Freighter Wallet"),
+        ("trust", r"Establish SWIRL Trustline"),
+        ("payout", r"Receive a Stardust Swirl"),
+    ),
+}
+# Query parameters the redirect-bridge pages read the connected key from;
+# "{public_key}" is filled in. Pages not listed read ?publicKey=.
+REDIRECTS = {
+    "003": {"freighter_pk": "{public_key}"},
+    "007": {"freighter_pk": "{public_key}"},
+    "008": {"freighter_response": '{"type": "freighter_connected", "data": {"publicKey": "{public_key}"}}'},
+    "014": {"freighter_pk": "{public_key}"},
+    "015": {"pk": "{public_key}"},
+    "016": {"freighter_pk": "{public_key}"},
+    "018": {"freighter_status": "success", "freighter_type": "connect", "freighter_data": "{public_key}"},
+}
+REDIRECT = {"publicKey": "{public_key}"}
+
+OK, SKIPPED, ERROR = "ok", "skipped", "error"
+
+
+def _worker_init(horizon_url):
+    os.environ["HORIZON_URL"] = horizon_url
+    for name, value in (("HORIZON_CACHE", "off"), ("DEMO_POOL", "off"), ("SESSION_STORE", "memory")):
+        os.environ.setdefault(name, value)
+
+
+def _horizon_calls():
+    from core.metrics import metrics
+
+    with metrics._lock:
+        return sum(entry["count"] for entry in metrics.global_stats.calls.values())
+
+
+class Journey:
+    """One simulated session on one page."""
+
+    def __init__(self, path, keypair, network_passphrase, redirect=REDIRECT):
+        from streamlit.testing.v1 import AppTest
+
+        self.keypair = keypair
+        self.redirect = redirect
+        self.network_passphrase = network_passphrase
+        self.at = AppTest.from_file(path, default_timeout=RUN_TIMEOUT)
+        self.at.secrets["UNUSED"] = "x"  # st.secrets needs a secrets source to be readable
+        self.durations = []
+        self.exceptions = []
+        self.alerts = []  # st.error messages; pages report most Horizon failures that way
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            self.at.run()
+        finally:
+            self.durations.append(time.perf_counter() - started)
+        for exception in self.at.exception:
+            self.exceptions.append(exception.message.splitlines()[0] if exception.message else exception.value)
+        for alert in self.at.error:
+            if alert.value not in self.alerts:
+                self.alerts.append(alert.value)
+
+    def _pending(self):
+        """``{bridge key: request}`` for the requests queued for Freighter."""
+        pending = {}
+        for key, value in self.at.session_state.items():
+            if key.startswith("_") and key.endswith("_request") and isinstance(value, dict) and "action" in value:
+                pending[key[1:-len("_request")]] = value
+        return pending
+
+    def _sign(self, envelope_xdr, network_passphrase):
+        from stellar_sdk import TransactionBuilder
+
+        envelope = TransactionBuilder.from_xdr(envelope_xdr, network_passphrase or self.network_passphrase)
+        envelope.sign(self.keypair)
+        return envelope.to_xdr()
+
+    def answer_wallet(self):
+        """Play Freighter for whatever the page asked for; True if it asked anything."""
+        answered = False
+        for _ in range(MAX_WALLET_ROUNDS):
+            pending = self._pending()
+            if not pending:
+                break
+            for key, request in pending.items():
+                reply = {"id": request["id"]}
+                if request["action"] == "connect":
+                    reply["public_key"] = self.keypair.public_key
+                elif request["action"] == "sign":
+                    reply["signed_xdr"] = self._sign(request["xdr"], request.get("network"))
+                else:
+                    reply["signed_xdrs"] = [self._sign(x, request.get("network")) for x in request["xdrs"]]
+                self.at.session_state[key] = reply
+            answered = True
+            self.run()
+        return answered
+
+    def click(self, pattern):
+        pattern = re.compile(pattern, re.I)
+        for button in self.at.button:
+            if button.label and pattern.search(button.label) and not button.disabled:
+                button.click()
+                self.run()
+                return True
+        return False
+
+    def connect_redirect(self):
+        """Land back on the page the way Freighter's redirect would, for pages still on that bridge."""
+        for key, value in self.redirect.items():
+            self.at.query_params[key] = value.replace("{public_key}", self.keypair.public_key)
+        self.run()
+
+    def settle_payouts(self):
+        """Rerun until the payouts queued through ``core.batching`` have landed."""
+        batching = sys.modules.get("core.batching")
+        if batching is None:
+            return
+        deadline = time.monotonic() + RUN_TIMEOUT
+        while time.monotonic() < deadline:
+            with batching._tickets_lock:
+                pending = any(not future.done() for future in batching._tickets.values())
+            if not pending:
+                break
+            time.sleep(batching.POLL_INTERVAL)
+        self.run()  # what watch_payout's rerun would show
+
+    def step(self, name, pattern):
+        before = len(self.exceptions)
+        for label in (pattern,) if isinstance(pattern, str) else pattern:
+            if not self.click(label):
+                return SKIPPED
+            answered = self.answer_wallet()
+            if name == "connect" and not answered:
+                self.connect_redirect()
+        if name == "payout":
+            self.settle_payouts()
+        return ERROR if len(self.exceptions) > before else OK
+
+
+def run_journey(path, session):
+    """One session's journey on ``path``; runs in a pool worker."""
+    from stellar_sdk import Keypair, Network
+
+    from core.horizon import fund_with_friendbot
+
+    keypair = Keypair.random()
+    fund_with_friendbot(keypair.public_key)
+    page = os.path.basename(path)[:3]
+    calls = _horizon_calls()
+    started = time.perf_counter()
+    journey = Journey(path, keypair, Network.TESTNET_NETWORK_PASSPHRASE, REDIRECTS.get(page, REDIRECT))
+    plan = JOURNEYS.get(page, JOURNEY)
+    steps = dict.fromkeys(["load"] + [name for name, _ in plan], SKIPPED)  # steps never reached stay skipped
+    try:
+        journey.run()
+        steps["load"] = ERROR if journey.exceptions else OK
+        for name, pattern in plan:
+            steps[name] = journey.step(name, pattern)
+    except Exception as e:  # AppTest timeouts, or the harness itself
+        journey.exceptions.append(f"{type(e).__name__}: {e}")
+    return {
+        "session": session,
+        "durations": journey.durations,
+        "elapsed": time.perf_counter() - started,
+        "horizon_calls": _horizon_calls() - calls,
+        "steps": steps,
+        "exceptions": journey.exceptions,
+        "alerts": journey.alerts,
+    }
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def summarize(path, results, wall):
+    durations = [d for result in results for d in result["durations"]]
+    calls = [result["horizon_calls"] for result in results]
+    steps = {}
+    for result in results:
+        for name, outcome in result["steps"].items():
+            steps.setdefault(name, {OK: 0, SKIPPED: 0, ERROR: 0})[outcome] += 1
+    errors, alerts = {}, {}
+    for result in results:
+        for message in result["exceptions"]:
+            errors[message] = errors.get(message, 0) + 1
+        for message in result["alerts"]:
+            alerts[message] = alerts.get(message, 0) + 1
+    return {
+        "page": os.path.basename(path),
+        "sessions": len(results),
+        "runs": len(durations),
+        "wall_seconds": round(wall, 3),
+        "runs_per_second": round(len(durations) / wall, 2) if wall else 0.0,
+        "run_ms_p50": round(_percentile(durations, 50) * 1000, 1),
+        "run_ms_p95": round(_percentile(durations, 95) * 1000, 1),
+        "horizon_calls_per_journey": round(statistics.mean(calls), 1) if calls else 0.0,
+        "journeys_with_errors": sum(1 for result in results if result["exceptions"]),
+        "journeys_incomplete": sum(1 for result in results if SKIPPED in result["steps"].values()),
+        "steps": steps,
+        "errors": dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+        "alerts": dict(sorted(alerts.items(), key=lambda item: -item[1])[:5]),
+    }
+
+
+def run(paths, sessions=8, workers=4, config=None):
+    """Run ``sessions`` journeys per page, ``workers`` at a time; one summary per page."""
+    summaries = []
+    with Standin(config or StandinConfig()) as standin:
+        context = multiprocessing.get_context("spawn")  # workers import the pages with the stand-in's URL
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_worker_init, initargs=(standin.url,)) as pool:
+            for path in paths:
+                started = time.perf_counter()
+                results = list(pool.map(run_journey, [path] * sessions, range(sessions)))
+                summary = summarize(path, results, time.perf_counter() - started)
+                summaries.append(summary)
+                print(_row(summary), flush=True)
+    return summaries
+
+
+HEADER = (
+    f"{'page':<46} {'runs/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'calls/journey':>13} {'errors':>7} {'incomplete':>10}"
+    "  steps (ok/skipped/error)"
+)
+
+
+def _row(summary):
+    steps = " ".join(
+        f"{name}:{c[OK]}/{c[SKIPPED]}/{c[ERROR]}{'!' if c[SKIPPED] else ''}" for name, c in summary["steps"].items()
+    )
+    return (
+        f"{summary['page'][:46]:<46} {summary['runs_per_second']:>7} {summary['run_ms_p50']:>8} {summary['run_ms_p95']:>8} "
+        f"{summary['horizon_calls_per_journey']:>13} {summary['journeys_with_errors']:>4}/{summary['sessions']:<2} "
+        f"{summary['journeys_incomplete']:>7}/{summary['sessions']:<2}  {steps}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the pages with AppTest against the Horizon stand-in.")
+    parser.add_argument("pages", nargs="*", help="page scripts (default: every file in pages/)")
+    parser.add_argument("--sessions", type=int, default=8, help="journeys per page")
+    parser.add_argument("--workers", type=int, default=4, help="sessions run at the same time")
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in latency per request, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stand-in requests that fail")
+    parser.add_argument("--json", help="also write the summaries to this file")
+    args = parser.parse_args()
+    paths = [os.path.abspath(p) for p in args.pages] or sorted(glob.glob(os.path.join(ROOT, "pages", "*.py")))
+    print(HEADER)
+    # Workers must find the pool functions as core.loadtest.*: AppTest swaps out __main__.
+    from core import loadtest
+
+    summaries = loadtest.run(paths, args.sessions, args.workers, StandinConfig(latency=args.latency, error_rate=args.error_rate))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+    for summary in summaries:
+        skipped = [f"{name} ×{c[SKIPPED]}" for name, c in summary["steps"].items() if c[SKIPPED]]
+        if skipped:
+            print(f"  {summary['page'][:3]} skipped: {', '.join(skipped)}")
+        for message, count in summary["errors"].items():
+            print(f"  {summary['page'][:3]} ×{count}: {message[:160]}")
+        for message, count in summary["alerts"].items():
+            print(f"  {summary['page'][:3]} ×{count} st.error: {message[:150]}")
+
+
+if __name__ == "__main__":
+    main()
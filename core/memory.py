@@ -0,0 +1,304 @@
+"""Per-session memory accounting, caps and compaction for ``st.session_state``.
+
+Pages keep their data in ``st.session_state``, and some of it only grows:
+project lists with milestones, component graphs, message logs, a balance
+cache for every account ever shown. Session state lives in the server
+process, so with many concurrent sessions its RSS grew without bound. Each
+page calls ``session_budget`` first thing, before it reads session state::
+
+    session_budget(cold=("projects",), caps={"streamlit_messages": 50})
+
+* ``caps``: cache- or log-like keys keep only their newest ``n`` entries
+  (dicts in insertion order, lists from the end). ``LRUDict`` does the
+  same on every write and counts reads as use.
+* ``cold``: the page's big structures. While the session is on another
+  page they are pickled and zlib-compressed into a ``Frozen`` blob, and the
+  next ``session_budget`` call on their own page thaws them before the page
+  reads them. Only pages that declare a key may read it.
+* Accounting: every ``SESSION_MEASURE_INTERVAL`` seconds the deep size of
+  each key is recorded, attributed to the page that created it.
+  ``memory_report()`` totals it by page; ``render_memory_panel()`` shows it
+  (with ``?debug=memory`` or ``SESSION_DEBUG=1``) and the metrics exporter
+  publishes it as ``streamlit_session_state_bytes``.
+
+A session above ``SESSION_BUDGET_BYTES`` also gets every declared cap halved
+and every other page's declared structure frozen, however small.
+"""
+import os
+import pickle
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import streamlit as st
+
+from core.metrics import _script_run, metrics, register_collector
+
+BUDGET_BYTES = int(os.getenv("SESSION_BUDGET_BYTES", str(4 * 1024 * 1024)))
+COMPACT_MIN_BYTES = int(os.getenv("SESSION_COMPACT_MIN_BYTES", "16384"))
+MEASURE_INTERVAL = float(os.getenv("SESSION_MEASURE_INTERVAL", "10"))
+MAX_SESSIONS = 1024
+
+SHARED = "(shared)"  # keys that existed before their session's first measured run
+
+
+class Frozen:
+    """A session-state value, pickled and compressed while its page is not showing."""
+
+    __slots__ = ("blob", "size")
+
+    def __init__(self, value):
+        raw = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.blob = zlib.compress(raw)
+        self.size = len(raw)
+
+    def thaw(self):
+        return pickle.loads(zlib.decompress(self.blob))
+
+    def __repr__(self):
+        return f"<Frozen {len(self.blob)} bytes ({self.size} raw)>"
+
+
+class LRUDict(OrderedDict):
+    """A dict that keeps its ``max_entries`` most recently used keys."""
+
+    def __init__(self, max_entries=256, *args, **kwargs):
+        self.max_entries = max_entries
+        super().__init__(*args, **kwargs)
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.max_entries:
+            self.popitem(last=False)
+
+    def __reduce__(self):
+        return type(self), (self.max_entries, list(self.items()))
+
+
+def deep_size(value, seen=None):
+    """Approximate bytes held by ``value``: builtin containers are followed, other objects are not."""
+    seen = set() if seen is None else seen
+    stack, total = [value], 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0)
+        if isinstance(obj, Frozen):
+            total += sys.getsizeof(obj.blob, 0)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return total
+
+
+def _trim(value, limit):
+    """Drop the oldest entries of a dict or list in place."""
+    excess = len(value) - limit if isinstance(value, (dict, list)) else 0
+    if excess <= 0:
+        return
+    if isinstance(value, dict):
+        for key in list(value)[:excess]:
+            del value[key]
+    else:
+        del value[:excess]
+
+
+class SessionMemory:
+    def __init__(self, page):
+        self.page = page  # the page the session is on
+        self.owners = {}  # key → page that created it
+        self.sizes = {}  # key → bytes at the last measurement
+        self.frozen = set()  # keys held as Frozen blobs
+        self.unpicklable = set()
+        self.runs = 0
+        self.measured_at = None
+        self.over_budget = False
+
+    @property
+    def total(self):
+        return sum(self.sizes.values())
+
+
+class MemoryAccounting:
+    """Process-wide view of every session's state, plus what each page declared."""
+
+    def __init__(self, budget_bytes=BUDGET_BYTES, compact_min_bytes=COMPACT_MIN_BYTES, measure_interval=MEASURE_INTERVAL, max_sessions=MAX_SESSIONS):
+        self.budget_bytes = budget_bytes
+        self.compact_min_bytes = compact_min_bytes
+        self.measure_interval = measure_interval
+        self.max_sessions = max_sessions
+        self.cold = {}  # page → keys it compacts while away
+        self.caps = {}  # page → {key: max entries}
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _session(self, session_id, page):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = SessionMemory(page)
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session_id)
+            return session
+
+    def run(self, state, session_id, page, cold=(), caps=None):
+        """One page run's bookkeeping on ``state`` (the session state)."""
+        self.cold[page] = frozenset(cold)
+        self.caps[page] = dict(caps or {})
+        session = self._session(session_id, page)
+        previous, session.page = session.page, page
+        session.runs += 1
+
+        # Keys that appeared since the last call were created by the previous run.
+        for key in state.keys():
+            if key not in session.owners:
+                session.owners[key] = previous if session.runs > 1 else SHARED
+
+        for key in self.cold[page]:
+            value = state.get(key)
+            if isinstance(value, Frozen):
+                state[key] = value.thaw()
+            session.frozen.discard(key)
+
+        for key, limit in self.caps[page].items():
+            if key in state:
+                _trim(state[key], limit)
+
+        self._compact(state, session, page, min_bytes=0 if session.over_budget else self.compact_min_bytes)
+
+        if session.measured_at is None or time.monotonic() - session.measured_at >= self.measure_interval:
+            self._measure(state, session)
+            if session.total > self.budget_bytes and not session.over_budget:
+                session.over_budget = True
+                print(f"⚠️ Session {session_id[:8]} holds {session.total / 1048576:.1f} MiB of state (budget {self.budget_bytes / 1048576:.1f} MiB); compacting.")
+                self._squeeze(state, page)
+                self._compact(state, session, page, min_bytes=0)
+                self._measure(state, session)
+            elif session.total <= self.budget_bytes:
+                session.over_budget = False
+
+    def _compact(self, state, session, page, min_bytes):
+        """Freeze the structures other pages declared cold and created themselves.
+
+        Pages reuse key names, so a key is only frozen for the page that owns
+        it: another page's ``balances`` is left alone.
+        """
+        keep = self.cold.get(page, frozenset())
+        for other, keys in list(self.cold.items()):
+            if other == page:
+                continue
+            for key in keys - keep:
+                if session.owners.get(key) != other:
+                    continue
+                if key in session.frozen or key in session.unpicklable or key not in state:
+                    continue
+                value = state[key]
+                if isinstance(value, Frozen) or deep_size(value) < min_bytes:
+                    continue
+                try:
+                    state[key] = Frozen(value)
+                except Exception:
+                    session.unpicklable.add(key)
+                    continue
+                session.frozen.add(key)
+
+    def _squeeze(self, state, page):
+        """Halve every declared cap (the current page's included)."""
+        for caps in list(self.caps.values()):
+            for key, limit in caps.items():
+                if key in state and not isinstance(state[key], Frozen):
+                    _trim(state[key], max(1, limit // 2))
+
+    def _measure(self, state, session):
+        seen = set()
+        session.sizes = {key: deep_size(state[key], seen) for key in list(state.keys()) if key in state}
+        session.measured_at = time.monotonic()
+
+    def _live(self):
+        try:
+            from streamlit.runtime import Runtime
+        except ImportError:
+            return None
+        return Runtime.instance() if Runtime.exists() else None
+
+    def report(self):
+        """``{page: {"sessions", "bytes", "frozen_bytes"}}`` over live sessions, by owning page."""
+        runtime = self._live()
+        with self._lock:
+            if runtime is not None:
+                for session_id in [sid for sid in self.sessions if not runtime.is_active_session(sid)]:
+                    del self.sessions[session_id]
+            sessions = list(self.sessions.values())
+        pages = {}
+        for session in sessions:
+            for key, size in session.sizes.items():
+                row = pages.setdefault(session.owners.get(key, session.page), {"sessions": set(), "bytes": 0, "frozen_bytes": 0})
+                row["sessions"].add(id(session))
+                row["bytes"] += size
+                if key in session.frozen:
+                    row["frozen_bytes"] += size
+        return {page: {**row, "sessions": len(row["sessions"])} for page, row in sorted(pages.items())}
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP streamlit_session_state_bytes Approximate session-state bytes by owning page.",
+            "# TYPE streamlit_session_state_bytes gauge",
+        ]
+        for page, row in self.report().items():
+            lines.append(f'streamlit_session_state_bytes{{page="{page}"}} {row["bytes"]}')
+            lines.append(f'streamlit_session_state_bytes{{page="{page}",frozen="true"}} {row["frozen_bytes"]}')
+        return "\n".join(lines) + "\n"
+
+
+accounting = MemoryAccounting()
+register_collector(accounting.to_prometheus)
+
+
+def session_budget(cold=(), caps=None):
+    """Account for this session's state, apply ``caps`` and compact other pages' ``cold`` keys.
+
+    Call it at the top of the page, before the page reads session state.
+    """
+    run = _script_run()
+    if run is None:
+        return
+    metrics.start_run()  # also counts reruns that make no Horizon calls
+    session_id, page, _ = run
+    accounting.run(st.session_state, session_id, page, cold=cold, caps=caps)
+
+
+def memory_report():
+    return accounting.report()
+
+
+def render_memory_panel():
+    """Admin table of session-state memory by page (opt-in, see module docstring)."""
+    if os.getenv("SESSION_DEBUG") != "1" and st.query_params.get("debug") != "memory":
+        return
+    report = memory_report()
+    st.subheader("🧠 Session state by page")
+    if not report:
+        st.caption("No sessions measured yet.")
+        return
+    total = sum(row["bytes"] for row in report.values())
+    st.caption(f"{len(accounting.sessions)} sessions · {total / 1048576:.2f} MiB in total · budget {accounting.budget_bytes / 1048576:.1f} MiB per session")
+    st.dataframe(
+        [
+            {"page": page, "sessions": row["sessions"], "KiB": round(row["bytes"] / 1024, 1), "frozen KiB": round(row["frozen_bytes"] / 1024, 1)}
+            for page, row in sorted(report.items(), key=lambda item: -item[1]["bytes"])
+        ],
+        hide_index=True,
+    )
@@ -0,0 +1,352 @@
+"""Horizon call instrumentation.
+
+``HorizonClient`` reports every request here: endpoint template, status,
+latency and response size. Counts and latency histograms are kept globally
+and per Streamlit session, together with how many Horizon calls each rerun
+made. Set ``HORIZON_METRICS_PORT`` to expose them on localhost::
+
+    curl localhost:9464/metrics        # Prometheus text format
+    curl localhost:9464/metrics.json
+
+Pages can also draw ``render_debug_panel()`` in the sidebar; it only shows
+up with ``?debug=horizon`` in the URL or ``HORIZON_DEBUG=1``.
+"""
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CALLS_PER_RERUN_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+MAX_SESSIONS = 256
+
+_TEMPLATES = [
+    (re.compile(r"/G[A-Z2-7]{55}(?=/|$)"), "/{account_id}"),
+    (re.compile(r"/M[A-Z2-7]{68}(?=/|$)"), "/{account_id}"),
+    (re.compile(r"/[0-9a-f]{72}(?=/|$)"), "/{balance_id}"),
+    (re.compile(r"/[0-9a-f]{64}(?=/|$)"), "/{hash}"),
+    (re.compile(r"/\d+(?=/|$)"), "/{id}"),
+    (re.compile(r"(/data)/[^/]+$"), r"\1/{key}"),
+]
+
+
+def endpoint_template(url):
+    """``https://h/accounts/GABC.../payments?limit=10`` → ``/accounts/{account_id}/payments``."""
+    path = urlparse(url).path.rstrip("/") or "/"
+    for pattern, replacement in _TEMPLATES:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th observation (good enough for a panel)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, total in self.cumulative():
+            if total >= target:
+                return bound
+        return float("inf")
+
+    def to_dict(self):
+        return {
+            "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in self.cumulative()},
+            "sum": round(self.sum, 6),
+            "count": self.count,
+        }
+
+
+class CallStats:
+    """Per-(method, endpoint, status) counters for one scope (global or a session)."""
+
+    def __init__(self):
+        self.calls = {}
+        self.calls_per_rerun = Histogram(CALLS_PER_RERUN_BUCKETS)
+
+    def observe(self, method, endpoint, status, elapsed, nbytes):
+        key = (method, endpoint, str(status))
+        entry = self.calls.get(key)
+        if entry is None:
+            entry = self.calls[key] = {"count": 0, "bytes": 0, "latency": Histogram(LATENCY_BUCKETS)}
+        entry["count"] += 1
+        entry["bytes"] += nbytes
+        if elapsed is not None:
+            entry["latency"].observe(elapsed)
+
+    def to_dict(self):
+        return {
+            "calls": [
+                {
+                    "method": method,
+                    "endpoint": endpoint,
+                    "status": status,
+                    "count": entry["count"],
+                    "bytes": entry["bytes"],
+                    "latency_seconds": entry["latency"].to_dict(),
+                }
+                for (method, endpoint, status), entry in sorted(self.calls.items())
+            ],
+            "calls_per_rerun": self.calls_per_rerun.to_dict(),
+        }
+
+
+class SessionStats(CallStats):
+    def __init__(self, page):
+        super().__init__()
+        self.page = page
+        self.run_marker = None
+        self.current_run_calls = 0
+        self.last_run_calls = 0
+
+    def to_dict(self):
+        data = super().to_dict()
+        data.update({"page": self.page, "current_run_calls": self.current_run_calls, "last_run_calls": self.last_run_calls})
+        return data
+
+
+def _script_run():
+    """(session_id, page, per-run marker) for the calling Streamlit thread, or None."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None
+    page = ctx.page_script_hash
+    try:
+        page = ctx.pages_manager.get_pages()[page]["page_name"]
+    except (AttributeError, KeyError, TypeError):
+        pass
+    # ScriptRunContext.reset() swaps in a fresh cursors dict on every rerun.
+    return ctx.session_id, page, ctx.cursors
+
+
+class HorizonMetrics:
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.global_stats = CallStats()
+        self.sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, method, url, status, elapsed=None, nbytes=0):
+        """The ``HorizonClient`` hook. ``status`` may be ``"stale"`` or ``"shed"``."""
+        endpoint = endpoint_template(url)
+        run = _script_run()
+        with self._lock:
+            self.global_stats.observe(method, endpoint, status, elapsed, nbytes)
+            if run is None:
+                return
+            session = self._enter(*run)
+            session.current_run_calls += 1
+            session.observe(method, endpoint, status, elapsed, nbytes)
+
+    def start_run(self):
+        """Mark the start of the calling script run.
+
+        Closes the session's previous run, so a rerun that made no Horizon
+        calls is counted too. ``core.memory.session_budget`` calls it at the
+        top of every page.
+        """
+        run = _script_run()
+        if run is not None:
+            with self._lock:
+                self._enter(*run)
+
+    def _enter(self, session_id, page, marker):
+        """The session's stats, with its current run switched to ``marker``."""
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = SessionStats(page)
+            while len(self.sessions) > self.max_sessions:
+                self._close_run(self.sessions.popitem(last=False)[1])
+        self.sessions.move_to_end(session_id)
+        if session.run_marker is not marker:
+            self._close_run(session)
+            session.run_marker = marker
+            session.page = page
+        return session
+
+    def _close_run(self, session):
+        if session.run_marker is None:
+            return
+        session.calls_per_rerun.observe(session.current_run_calls)
+        self.global_stats.calls_per_rerun.observe(session.current_run_calls)
+        session.last_run_calls = session.current_run_calls
+        session.current_run_calls = 0
+        session.run_marker = None
+
+    def _sweep(self):
+        """Close the last run of sessions that have ended (the browser tab is gone)."""
+        try:
+            from streamlit.runtime import Runtime
+        except ImportError:
+            return
+        if not Runtime.exists():
+            return
+        runtime = Runtime.instance()
+        with self._lock:
+            for session_id in [sid for sid in self.sessions if not runtime.is_active_session(sid)]:
+                self._close_run(self.sessions.pop(session_id))
+
+    def session(self, session_id):
+        with self._lock:
+            return self.sessions.get(session_id)
+
+    def reset(self):
+        with self._lock:
+            self.global_stats = CallStats()
+            self.sessions.clear()
+
+    def to_json(self):
+        self._sweep()
+        with self._lock:
+            return json.dumps(
+                {
+                    "global": self.global_stats.to_dict(),
+                    "sessions": {sid: s.to_dict() for sid, s in self.sessions.items()},
+                },
+                indent=2,
+            )
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP horizon_requests_total Horizon requests by endpoint and status.",
+            "# TYPE horizon_requests_total counter",
+        ]
+        latency, size = [], []
+        self._sweep()
+        with self._lock:
+            for (method, endpoint, status), entry in sorted(self.global_stats.calls.items()):
+                labels = f'method="{method}",endpoint="{endpoint}",status="{status}"'
+                lines.append(f"horizon_requests_total{{{labels}}} {entry['count']}")
+                size.append(f"horizon_response_bytes_total{{{labels}}} {entry['bytes']}")
+                histogram = entry["latency"]
+                for bound, total in histogram.cumulative():
+                    le = "+Inf" if bound == float("inf") else bound
+                    latency.append(f'horizon_request_duration_seconds_bucket{{{labels},le="{le}"}} {total}')
+                latency.append(f"horizon_request_duration_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+                latency.append(f"horizon_request_duration_seconds_count{{{labels}}} {histogram.count}")
+            per_rerun = self.global_stats.calls_per_rerun
+            reruns = [f'horizon_calls_per_rerun_bucket{{le="{"+Inf" if b == float("inf") else b}"}} {t}' for b, t in per_rerun.cumulative()]
+            reruns += [f"horizon_calls_per_rerun_sum {per_rerun.sum:.0f}", f"horizon_calls_per_rerun_count {per_rerun.count}"]
+        lines += ["# HELP horizon_request_duration_seconds Horizon request latency.", "# TYPE horizon_request_duration_seconds histogram"] + latency
+        lines += ["# HELP horizon_response_bytes_total Horizon response body bytes.", "# TYPE horizon_response_bytes_total counter"] + size
+        lines += ["# HELP horizon_calls_per_rerun Horizon calls made by one script rerun.", "# TYPE horizon_calls_per_rerun histogram"] + reruns
+        return "\n".join(lines) + "\n"
+
+
+metrics = HorizonMetrics()
+
+# Other modules' Prometheus text, appended to /metrics (see core.memory).
+_collectors = []
+
+
+def register_collector(collector):
+    """Add ``collector()`` (returning Prometheus text) to the ``/metrics`` output."""
+    _collectors.append(collector)
+
+
+# --- EXPORT ENDPOINT ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            body = metrics.to_prometheus() + "".join(collector() for collector in _collectors)
+            content_type = "text/plain; version=0.0.4"
+        elif path == "/metrics.json":
+            body, content_type = metrics.to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(port=None, host="127.0.0.1"):
+    """Serve ``/metrics`` and ``/metrics.json`` once per process."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            _exporter.daemon_threads = True
+            threading.Thread(target=_exporter.serve_forever, name="horizon-metrics", daemon=True).start()
+    return _exporter
+
+
+if os.getenv("HORIZON_METRICS_PORT"):
+    try:
+        start_exporter(os.environ["HORIZON_METRICS_PORT"])
+    except OSError as e:
+        # Another Streamlit worker already owns the port.
+        print(f"⚠️ Horizon metrics exporter not started: {e}")
+
+
+# --- DEBUG PANEL ---
+def render_debug_panel():
+    """Sidebar table of this session's Horizon calls (opt-in, see module docstring)."""
+    import streamlit as st
+
+    if os.getenv("HORIZON_DEBUG") != "1" and st.query_params.get("debug") != "horizon":
+        return
+    run = _script_run()
+    session = metrics.session(run[0]) if run else None
+    with st.sidebar.expander("🛰️ Horizon calls", expanded=False):
+        if session is None:
+            st.caption("No Horizon calls in this session yet.")
+            return
+        if session.run_marker is run[2]:
+            current, previous = session.current_run_calls, session.last_run_calls
+        else:
+            current, previous = 0, session.current_run_calls
+        st.caption(f"This rerun so far: {current} · previous rerun: {previous}")
+        rows = []
+        for (method, endpoint, status), entry in sorted(session.calls.items()):
+            histogram = entry["latency"]
+            p95 = histogram.quantile(0.95)
+            rows.append({
+                "call": f"{method} {endpoint}",
+                "status": status,
+                "count": entry["count"],
+                "avg ms": round(1000 * histogram.sum / histogram.count, 1) if histogram.count else None,
+                "p95 ≤ ms": None if p95 in (None, float("inf")) else round(1000 * p95),
+                "KiB": round(entry["bytes"] / 1024, 1),
+            })
+        st.dataframe(rows, hide_index=True)
@@ -0,0 +1,391 @@
+"""Local, server-side persistence of page state, keyed by wallet public key.
+
+Session state only lives as long as the browser tab's websocket session. A
+reload, a lost connection or a query-param redirect (012 still connects that
+way) starts a new session, and the page has to rebuild from Horizon, or
+cannot: 001's projects, 012's kraftwerk graph and 013's networks were simply
+gone. ``persist`` keeps a page's own structures in a local store under the
+connected wallet's public key and hands them back to the next session that
+connects the same wallet, in one local read::
+
+    persist(st.session_state.public_key, ("projects",), exclude=("project_account_sk",))
+
+Call it every run, once the keys are initialised and the public key is
+known. A public key alone proves nothing (012 still takes it from a query
+parameter), so nothing is read or written for it until the session has
+proven it holds the wallet: ``persist`` offers a button in the sidebar that
+asks Freighter to sign a challenge transaction (sequence 0, never
+submitted) through its own ``core.wallet`` bridge, and checks the
+signature. The first call after that rehydrates the keys: stored values
+replace keys that are missing or still empty (all of them, after a wallet
+switch). After that the call only registers the current values with the
+store. Fields named in ``exclude`` are dropped from every dict inside the
+values before they are stored, so secret keys never reach the store.
+Writes are behind the page: a flusher thread
+pickles registered values every ``SESSION_STORE_FLUSH_INTERVAL`` seconds
+(so in-place changes made later in the run are seen too) and writes
+whatever changed in one transaction. Values stay registered for
+``SESSION_STORE_WATCH_FOR`` seconds after the last run that registered them.
+
+State is kept per Horizon URL and page, like the demo account pool, and
+dropped after ``SESSION_STORE_MAX_AGE`` seconds. ``SESSION_STORE`` picks the
+backend: ``sqlite`` (default, ``SESSION_STORE_PATH``), ``memory`` (this
+process only) or ``off``.
+"""
+import atexit
+import copy
+import hashlib
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+
+from stellar_sdk import Account, Network, TransactionBuilder
+
+from core import horizon, wallet
+from core.envelopes import parse
+from core.metrics import _script_run
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "sessions.sqlite3")
+FLUSH_INTERVAL = float(os.getenv("SESSION_STORE_FLUSH_INTERVAL", "2"))
+WATCH_FOR = float(os.getenv("SESSION_STORE_WATCH_FOR", "60"))
+MAX_AGE = float(os.getenv("SESSION_STORE_MAX_AGE", str(30 * 86400)))
+CHALLENGE_TIMEOUT = 300
+CHALLENGE_BRIDGE = "session_store_bridge"  # its own bridge, so pages never see the challenge
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    network TEXT NOT NULL,
+    public_key TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    state BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (network, public_key, namespace)
+);
+CREATE INDEX IF NOT EXISTS sessions_age ON sessions (updated_at);
+"""
+
+
+class MemoryBackend:
+    """Blobs in a dict; lost with the process."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row = self._rows.get(key)
+        return row[0] if row is not None else None
+
+    def put_many(self, rows):
+        now = time.time()
+        with self._lock:
+            for key, blob in rows:
+                self._rows[key] = (blob, now)
+
+    def expire(self, max_age):
+        cutoff = time.time() - max_age
+        with self._lock:
+            for key in [key for key, (_, updated_at) in self._rows.items() if updated_at < cutoff]:
+                del self._rows[key]
+
+
+class SQLiteBackend:
+    """Blobs in a SQLite file shared by every Streamlit process on the host."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._local = threading.local()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    def get(self, key):
+        row = self._db().execute(
+            "SELECT state FROM sessions WHERE network = ? AND public_key = ? AND namespace = ?", key
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def put_many(self, rows):
+        now = time.time()
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)",
+                [(*key, blob, now) for key, blob in rows],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def expire(self, max_age):
+        self._db().execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+
+
+class _Watched:
+    __slots__ = ("values", "exclude", "touched_at", "digest")
+
+    def __init__(self, values, exclude=(), digest=None):
+        self.values = values
+        self.exclude = exclude
+        self.touched_at = time.monotonic()
+        self.digest = digest
+
+
+def _scrub(value, exclude):
+    """``value`` with the ``exclude`` keys removed from every dict in it (containers copied)."""
+    if not exclude:
+        return value
+    if isinstance(value, dict):
+        scrubbed = copy.copy(value)
+        for key, item in list(dict.items(value)):
+            if key in exclude:
+                del scrubbed[key]
+            else:
+                scrubbed[key] = _scrub(item, exclude)
+        return scrubbed
+    if type(value) in (list, tuple):
+        return type(value)(_scrub(item, exclude) for item in value)
+    return value
+
+
+def _dump(values):
+    return zlib.compress(pickle.dumps(values, pickle.HIGHEST_PROTOCOL))
+
+
+class SessionStore:
+    """Write-behind store of ``{key: value}`` dicts per (network, public key, namespace)."""
+
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL, watch_for=WATCH_FOR, max_age=MAX_AGE):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.watch_for = watch_for
+        self._watched = {}  # (network, public key, namespace) → _Watched
+        self._lock = threading.Lock()
+        self._flushing = threading.Lock()
+        self._thread = None
+        if backend is not None:
+            try:
+                backend.expire(max_age)
+            except sqlite3.Error:
+                pass
+
+    @staticmethod
+    def key(public_key, namespace):
+        return (horizon.HORIZON_URL, public_key, namespace)
+
+    def load(self, public_key, namespace):
+        """The stored ``{key: value}`` dict, or ``{}``."""
+        if self.backend is None:
+            return {}
+        key = self.key(public_key, namespace)
+        with self._lock:
+            watched = self._watched.get(key)
+        if watched is not None:
+            try:
+                # Newer than anything on disk; copied, since another session may hold it.
+                values = _scrub(dict(watched.values), watched.exclude)
+                return pickle.loads(pickle.dumps(values, pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                pass
+        try:
+            blob = self.backend.get(key)
+            return pickle.loads(zlib.decompress(blob)) if blob is not None else {}
+        except (sqlite3.Error, zlib.error, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            print(f"⚠️ Could not restore {namespace} state for {public_key[:8]}: {e}")
+            return {}
+
+    def track(self, public_key, namespace, values, stored=None, exclude=()):
+        """Register ``values`` (live references) to be written behind the page.
+
+        ``stored`` is what ``load`` returned, so state that was just restored
+        is not written straight back. ``exclude`` keys are never written.
+        """
+        if self.backend is None:
+            return
+        key = self.key(public_key, namespace)
+        with self._lock:
+            watched = self._watched.get(key)
+            if watched is None:
+                digest = None
+                if stored:
+                    try:
+                        digest = hashlib.blake2b(_dump(stored), digest_size=16).digest()
+                    except Exception:
+                        pass
+                self._watched[key] = _Watched(values, frozenset(exclude), digest)
+            else:
+                watched.values = values
+                watched.exclude = frozenset(exclude)
+                watched.touched_at = time.monotonic()
+        self._start()
+
+    def _start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="session-store", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write every registered value that changed since it was last written."""
+        if self.backend is None:
+            return 0
+        with self._flushing:
+            now = time.monotonic()
+            with self._lock:
+                watched = list(self._watched.items())
+            rows, digests = [], []
+            for key, entry in watched:
+                try:
+                    blob = _dump(_scrub(dict(entry.values), entry.exclude))
+                except RuntimeError:
+                    continue  # the page was changing it mid-pickle; next round
+                except Exception as e:
+                    print(f"⚠️ Not persisting {key[2]} state: {e}")
+                    with self._lock:
+                        self._watched.pop(key, None)
+                    continue
+                digest = hashlib.blake2b(blob, digest_size=16).digest()
+                if digest != entry.digest:
+                    rows.append((key, blob))
+                    digests.append((entry, digest))
+            if rows:
+                try:
+                    self.backend.put_many(rows)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Session store write failed: {e}")
+                    return 0
+                for entry, digest in digests:
+                    entry.digest = digest
+            with self._lock:
+                for key, entry in watched:
+                    if now - entry.touched_at > self.watch_for and self._watched.get(key) is entry:
+                        del self._watched[key]
+            return len(rows)
+
+    def status(self):
+        with self._lock:
+            watched = len(self._watched)
+        return {"backend": type(self.backend).__name__ if self.backend is not None else None, "watched": watched}
+
+
+def open_default():
+    kind = os.getenv("SESSION_STORE", "sqlite").lower()
+    if kind in ("0", "off", "false", "no"):
+        return SessionStore(None)
+    if kind == "memory":
+        return SessionStore(MemoryBackend())
+    try:
+        return SessionStore(SQLiteBackend(os.getenv("SESSION_STORE_PATH", DEFAULT_PATH)))
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Session store disabled: {e}")
+        return SessionStore(None)
+
+
+session_store = open_default()
+atexit.register(session_store.flush)
+
+
+def _empty(value):
+    try:
+        return not value
+    except Exception:
+        return False
+
+
+def _challenge(public_key, network_passphrase):
+    """A transaction only ``public_key``'s holder can sign; sequence 0, so it can never be submitted."""
+    return (
+        TransactionBuilder(Account(public_key, -1), network_passphrase, base_fee=100)
+        .append_manage_data_op("session store", secrets.token_hex(16))
+        .set_timeout(CHALLENGE_TIMEOUT)
+        .build()
+    )
+
+
+def _proven(public_key, network_passphrase):
+    """True once this session signed a challenge with ``public_key``; else offers to."""
+    import streamlit as st
+
+    if st.session_state.get("_session_store_proof") == public_key:
+        return True
+    challenge = st.session_state.get("_session_store_challenge")
+    result = wallet.wallet_result(CHALLENGE_BRIDGE)
+    if result is not None and challenge is not None and "signed_xdr" in result:
+        try:
+            parsed = parse(result["signed_xdr"], network_passphrase)
+            valid = (
+                challenge["public_key"] == public_key
+                and parsed.hash_hex == challenge["hash"]
+                and time.time() < challenge["expires_at"]
+                and parsed.signed_by(public_key)
+            )
+        except Exception:
+            valid = False
+        st.session_state.pop("_session_store_challenge", None)
+        if valid:
+            st.session_state["_session_store_proof"] = public_key
+            return True
+        st.sidebar.error("The signature did not match this wallet; saved state stays locked.")
+    elif result is not None:
+        st.session_state.pop("_session_store_challenge", None)
+        st.sidebar.warning(f"Saved state stays locked: {result.get('error', 'no signature')}")
+    if st.sidebar.button("🔐 Unlock saved state", key="_session_store_unlock", help="Sign a challenge in Freighter (never submitted) to keep this page's state for your wallet across visits."):
+        envelope = _challenge(public_key, network_passphrase)
+        st.session_state["_session_store_challenge"] = {
+            "public_key": public_key,
+            "hash": envelope.hash_hex(),
+            "expires_at": time.time() + CHALLENGE_TIMEOUT,
+        }
+        wallet.sign(envelope, tag="session_store", address=public_key, network_passphrase=network_passphrase, key=CHALLENGE_BRIDGE)
+    wallet.bridge(CHALLENGE_BRIDGE)
+    return False
+
+
+def persist(public_key, keys, namespace=None, exclude=(), network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+    """Keep ``keys`` of this page's session state under ``public_key`` (see module docstring)."""
+    import streamlit as st
+
+    if not public_key or session_store.backend is None:
+        return
+    if not _proven(public_key, network_passphrase):
+        return
+    if namespace is None:
+        run = _script_run()
+        namespace = run[1] if run is not None else "app"
+    marker = f"_persisted_{namespace}"
+    previous = st.session_state.get(marker)
+    stored = None
+    if previous != public_key:
+        # First run with this wallet on this page: one local read.
+        stored = session_store.load(public_key, namespace)
+        for key in keys:
+            value = st.session_state.get(key)
+            if key in stored and (previous is not None or _empty(value)):
+                st.session_state[key] = stored[key]
+            elif previous is not None and isinstance(value, (dict, list)):
+                st.session_state[key] = type(value)()  # the other wallet's, not this one's
+        st.session_state[marker] = public_key
+    values = {key: st.session_state[key] for key in keys if key in st.session_state}
+    session_store.track(public_key, namespace, values, stored, exclude)
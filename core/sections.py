@@ -0,0 +1,87 @@
+"""Render-once page sections, replayed for every later visitor.
+
+Concept blurbs, "About" and feature lists, explainers and disclaimers are
+the same for everybody. Still, every rerun of every session rebuilt them
+element by element: dedenting and parsing the markdown, building each
+element's proto. ``static_section`` renders such a section once per
+process. Later calls replay the recorded element messages through
+Streamlit's cache replay, without running the function::
+
+    @static_section
+    def about():
+        st.markdown("## 🛟 About ApexStream")
+        st.markdown(ABOUT)
+
+    with st.sidebar:
+        about()
+
+The cache key is the function's module, name and source hash (plus its
+arguments), so editing a section renders it afresh. The recording is
+shared by every session. A section may only draw non-widget elements, and
+its output may depend only on its arguments: no session state, wallet or
+Horizon data. Pass page constants in as arguments too, since editing a
+constant outside the function does not change the function's source.
+Elements drawn through ``st.sidebar`` replay into the sidebar, and elements
+drawn through ``st`` replay into whatever container the call sits in.
+
+Calls and actual renders per section are exported on ``/metrics`` as
+``streamlit_static_section_calls_total`` and
+``streamlit_static_section_renders_total``.
+"""
+import functools
+import os
+import threading
+
+import streamlit as st
+
+from core.metrics import register_collector
+
+MAX_ENTRIES = 256  # per section, one per distinct set of arguments
+
+_counts = {}  # section → [calls, renders]
+_lock = threading.Lock()
+
+
+def _count(name, index):
+    with _lock:
+        _counts.setdefault(name, [0, 0])[index] += 1
+
+
+def static_section(func):
+    """Render ``func`` once per process; replay its elements on later calls."""
+    # Pages all run as __main__, so sections are labelled by file.
+    name = f"{os.path.splitext(os.path.basename(func.__code__.co_filename))[0]}.{func.__qualname__}"
+
+    # functools.wraps makes the cache key func's own (inspect.getsource follows __wrapped__).
+    @st.cache_data(show_spinner=False, max_entries=MAX_ENTRIES)
+    @functools.wraps(func)
+    def render(*args, **kwargs):
+        _count(name, 1)
+        func(*args, **kwargs)
+
+    @functools.wraps(func)
+    def section(*args, **kwargs):
+        _count(name, 0)
+        render(*args, **kwargs)
+
+    section.clear = render.clear
+    return section
+
+
+def to_prometheus():
+    with _lock:
+        counts = sorted(_counts.items())
+    lines = [
+        "# HELP streamlit_static_section_calls_total Static section calls, replays included.",
+        "# TYPE streamlit_static_section_calls_total counter",
+    ]
+    lines += [f'streamlit_static_section_calls_total{{section="{name}"}} {calls}' for name, (calls, _) in counts]
+    lines += [
+        "# HELP streamlit_static_section_renders_total Static section calls that ran the function.",
+        "# TYPE streamlit_static_section_renders_total counter",
+    ]
+    lines += [f'streamlit_static_section_renders_total{{section="{name}"}} {renders}' for name, (_, renders) in counts]
+    return "\n".join(lines) + "\n"
+
+
+register_collector(to_prometheus)
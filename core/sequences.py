@@ -0,0 +1,144 @@
+"""Local sequence numbers for transaction sources.
+
+Building a transaction used to start with ``load_account`` just to learn the
+source's sequence number, and two quick clicks would both build on the same
+number and one would fail with ``tx_bad_seq``. ``SequenceManager`` loads an
+account once, then hands out increasing sequence numbers locally::
+
+    source = load_source_account(public_key)   # no Horizon call once warm
+    tx = TransactionBuilder(source, NETWORK_PASSPHRASE, 100)...build()
+
+Submit through ``submit_transaction`` (or report results with
+``sequences.observe``) so the manager resyncs from Horizon after a
+``tx_bad_seq`` and forgets numbers that were never consumed. An envelope
+that is never sent (Freighter refused to sign it) gives its number back
+through ``sequences.release``; ``core.wallet`` does that for its requests.
+"""
+import threading
+
+from stellar_sdk import Account, MuxedAccount
+from stellar_sdk.exceptions import BadRequestError
+
+from core.envelopes import parse
+from core.horizon import get_server
+
+# Rejections after which the ledger did consume the sequence number.
+CONSUMED = ("tx_failed", "tx_fee_bump_inner_failed")
+
+
+def source_and_sequence(envelope_xdr):
+    """``(source account id, sequence)`` of a (possibly fee-bumped) envelope."""
+    parsed = parse(envelope_xdr)
+    if not parsed.inner.transaction.v1:
+        raise ValueError("pre-protocol-13 (v0) envelopes are not supported")
+    return parsed.source, parsed.sequence
+
+
+def result_code(error):
+    """The transaction result code of a Horizon ``BadRequestError``, if any."""
+    extras = getattr(error, "extras", None) or {}
+    return (extras.get("result_codes") or {}).get("transaction")
+
+
+class SequenceManager:
+    """Per-source sequence state shared by every session in the process."""
+
+    def __init__(self, loader=None):
+        self.loader = loader or (lambda account_id: get_server().load_account(account_id))
+        self._sequences = {}  # account id → last sequence handed out
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _account_lock(self, account_id):
+        with self._lock:
+            return self._locks.setdefault(account_id, threading.Lock())
+
+    def account(self, account_id, reserve=True):
+        """An ``Account`` to build the next transaction from.
+
+        Its sequence is reserved: the builder will use ``sequence + 1`` and the
+        next caller gets the number after that. Pass ``reserve=False`` for an
+        envelope the app never hears back about if the user does not sign it
+        (a Freighter redirect); the next caller then builds on the same number.
+        """
+        muxed = MuxedAccount.from_account(account_id)
+        account_id = muxed.account_id
+        with self._account_lock(account_id):
+            current = self._sequences.get(account_id)
+            if current is None:
+                current = self.loader(account_id).sequence
+            self._sequences[account_id] = current + 1 if reserve else current
+        return Account(muxed, current)
+
+    def peek(self, account_id):
+        """The last sequence handed out (or loaded) for ``account_id``, or ``None``."""
+        return self._sequences.get(MuxedAccount.from_account(account_id).account_id)
+
+    def resync(self, account_id):
+        """Reload the sequence from Horizon (after ``tx_bad_seq``)."""
+        account_id = MuxedAccount.from_account(account_id).account_id
+        with self._account_lock(account_id):
+            self._sequences[account_id] = self.loader(account_id).sequence
+
+    def forget(self, account_id):
+        """Drop local state; the next ``account()`` reloads from Horizon."""
+        account_id = MuxedAccount.from_account(account_id).account_id
+        with self._account_lock(account_id):
+            self._sequences.pop(account_id, None)
+
+    def release(self, envelope_xdr):
+        """Give back the number of an envelope that will never be sent."""
+        try:
+            account_id, sequence = source_and_sequence(envelope_xdr)
+        except (ValueError, AttributeError):
+            return
+        if sequence == 0:
+            return  # a challenge to sign (core.persistence), never meant for the ledger
+        with self._account_lock(account_id):
+            current = self._sequences.get(account_id)
+            if current == sequence:
+                self._sequences[account_id] = sequence - 1
+            elif current is not None and current > sequence:
+                # Numbers after it are out already and can no longer land.
+                del self._sequences[account_id]
+
+    def observe(self, envelope_xdr, error=None, code=None):
+        """Feed back a submission result: the ``BadRequestError``, or just its
+        transaction result ``code``; neither means success."""
+        try:
+            account_id, sequence = source_and_sequence(envelope_xdr)
+        except (ValueError, AttributeError):
+            return
+        if code is None and error is not None:
+            code = result_code(error) or "tx_malformed"
+        if code is None or code in CONSUMED:
+            # Built elsewhere (another page, Freighter, another process):
+            # never hand this number out again.
+            with self._account_lock(account_id):
+                if account_id in self._sequences:
+                    self._sequences[account_id] = max(self._sequences[account_id], sequence)
+        elif code == "tx_bad_seq":
+            self.resync(account_id)
+        else:
+            # Rejected before it reached the ledger, so its number is still free.
+            self.forget(account_id)
+
+
+sequences = SequenceManager()
+
+
+def load_source_account(account_id, reserve=True):
+    """Drop-in for ``server.load_account`` when the result only feeds a ``TransactionBuilder``."""
+    return sequences.account(account_id, reserve=reserve)
+
+
+def submit_transaction(transaction):
+    """``get_server().submit_transaction`` that keeps ``sequences`` in step."""
+    envelope_xdr = transaction if isinstance(transaction, str) else transaction.to_xdr()
+    try:
+        response = get_server().submit_transaction(transaction)
+    except BadRequestError as e:
+        sequences.observe(envelope_xdr, e)
+        raise
+    sequences.observe(envelope_xdr)
+    return response
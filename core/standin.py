@@ -0,0 +1,981 @@
+"""A local Horizon + friendbot stand-in for offline runs and load benchmarks.
+
+It implements the slice of Horizon the pages actually use (accounts,
+transaction submission, sync and async, fee bumps, payments, offers,
+claimable balances, fee stats and friendbot) on top of a small in-memory
+ledger.
+The ledger is deterministic: the same sequence of requests always produces
+the same accounts, ids and timestamps, so benchmark runs are comparable.
+
+Run it next to Streamlit::
+
+    python -m core.standin --port 8000 --latency 0.05 --error-rate 0.01
+    HORIZON_URL=http://127.0.0.1:8000 streamlit run Home.py
+
+or in-process from a benchmark::
+
+    with Standin(StandinConfig(latency=0.02)) as standin:
+        os.environ["HORIZON_URL"] = standin.url
+        ...
+
+``--surge-fee`` simulates congestion: transactions bidding less per
+operation wait in the queue (the synchronous endpoint answers 504) until a
+fee bump outbids it or the surge is lowered through ``/_standin/config``.
+
+This is a stand-in, not a validator. Offers are recorded but never matched,
+path payments deliver without touching the order book, and only ed25519
+signers are checked.
+"""
+import argparse
+import base64
+import copy
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from stellar_sdk import (
+    AccountMerge,
+    Asset,
+    BeginSponsoringFutureReserves,
+    BumpSequence,
+    ChangeTrust,
+    ClaimClaimableBalance,
+    Clawback,
+    FeeBumpTransactionEnvelope,
+    CreateAccount,
+    CreateClaimableBalance,
+    CreatePassiveSellOffer,
+    EndSponsoringFutureReserves,
+    Keypair,
+    ManageBuyOffer,
+    ManageData,
+    ManageSellOffer,
+    Network,
+    PathPaymentStrictReceive,
+    PathPaymentStrictSend,
+    Payment,
+    SetOptions,
+    SetTrustLineFlags,
+    TransactionBuilder,
+    xdr,
+)
+from stellar_sdk.exceptions import BadSignatureError
+
+STROOP = Decimal("0.0000001")
+FRIENDBOT_STARTING_BALANCE = Decimal("10000")
+BASE_RESERVE = Decimal("0.5")
+GENESIS_TIME = 1700000000
+LEDGER_CLOSE_SECONDS = 5
+
+
+@dataclass
+class StandinConfig:
+    """Knobs for latency, error and rate-limit injection."""
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    rate_limit: int = 0  # requests per rate_window, 0 = unlimited
+    rate_window: float = 3600.0
+    seed: int = 0
+    base_fee: int = 100
+    surge_fee: int = 0  # per-operation bid needed while congested, 0 = no surge
+    network_passphrase: str = Network.TESTNET_NETWORK_PASSPHRASE
+
+
+class TransactionFailed(Exception):
+    def __init__(self, tx_code, op_codes=None):
+        super().__init__(tx_code)
+        self.tx_code = tx_code
+        self.op_codes = op_codes or []
+
+
+def result_xdr(tx_code, fee=0, inner_hash=None):
+    """A ``TransactionResult`` carrying only the transaction-level code.
+
+    Operation results are left empty; Horizon's ``result_codes`` extras (on
+    the synchronous endpoint) are where the stand-in reports those. With
+    ``inner_hash`` it is a fee bump's result wrapping the inner one.
+    """
+    name = "tx" + tx_code[len("tx_"):].upper()
+    code = getattr(xdr.TransactionResultCode, name)
+    results = [] if code in (xdr.TransactionResultCode.txSUCCESS, xdr.TransactionResultCode.txFAILED) else None
+    if inner_hash is None:
+        result = xdr.TransactionResultResult(code=code, results=results)
+    else:
+        success = code == xdr.TransactionResultCode.txSUCCESS
+        inner = xdr.InnerTransactionResult(
+            fee_charged=xdr.Int64(0),
+            result=xdr.InnerTransactionResultResult(code=code, results=results),
+            ext=xdr.InnerTransactionResultExt(0),
+        )
+        result = xdr.TransactionResultResult(
+            code=xdr.TransactionResultCode.txFEE_BUMP_INNER_SUCCESS if success else xdr.TransactionResultCode.txFEE_BUMP_INNER_FAILED,
+            inner_result_pair=xdr.InnerTransactionResultPair(xdr.Hash(bytes.fromhex(inner_hash)), inner),
+        )
+    return xdr.TransactionResult(
+        fee_charged=xdr.Int64(fee),
+        result=result,
+        ext=xdr.TransactionResultExt(0),
+    ).to_xdr()
+
+
+class TransactionHeld(Exception):
+    """The bid is below the surge fee; the transaction waits in the queue."""
+
+
+class OperationFailed(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+# --- HELPERS ---
+def asset_key(asset):
+    if asset.is_native():
+        return "native"
+    return f"{asset.code}:{asset.issuer}"
+
+
+def asset_fields(key, prefix=""):
+    if key == "native":
+        return {f"{prefix}asset_type": "native"}
+    code, issuer = key.split(":")
+    asset_type = "credit_alphanum4" if len(code) <= 4 else "credit_alphanum12"
+    return {
+        f"{prefix}asset_type": asset_type,
+        f"{prefix}asset_code": code,
+        f"{prefix}asset_issuer": issuer,
+    }
+
+
+def fmt(amount):
+    return str(Decimal(amount).quantize(STROOP))
+
+
+def account_id_of(muxed):
+    return muxed.account_id if hasattr(muxed, "account_id") else muxed
+
+
+# --- LEDGER ---
+class Ledger:
+    """Deterministic in-memory ledger state shared by every request."""
+
+    def __init__(self, config=None):
+        self.config = config or StandinConfig()
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.sequence = 1000
+            self.accounts = {}
+            self.offers = {}
+            self.claimable_balances = {}
+            self.payments = []
+            self.transactions = {}
+            self.failed_op_codes = {}
+            self.held = {}  # hash → envelope XDR bidding below the surge fee
+            self.next_offer_id = 1
+
+    @property
+    def closed_at(self):
+        return GENESIS_TIME + self.sequence * LEDGER_CLOSE_SECONDS
+
+    def _close(self):
+        self.sequence += 1
+
+    # --- accounts ---
+    def create_account(self, account_id, starting_balance):
+        self.accounts[account_id] = {
+            "sequence": self.sequence << 32,
+            "balances": {"native": {"balance": Decimal(starting_balance), "limit": None}},
+            "data": {},
+            "signers": {account_id: 1},
+            "last_modified_ledger": self.sequence,
+        }
+
+    def account(self, account_id):
+        account = self.accounts.get(account_id)
+        if account is None:
+            raise OperationFailed("op_no_destination")
+        return account
+
+    def account_json(self, account_id):
+        account = self.accounts[account_id]
+        balances = []
+        for key, line in account["balances"].items():
+            entry = {
+                "balance": fmt(line["balance"]),
+                "buying_liabilities": "0.0000000",
+                "selling_liabilities": "0.0000000",
+            }
+            if line["limit"] is not None:
+                entry["limit"] = fmt(line["limit"])
+                entry["is_authorized"] = True
+            entry.update(asset_fields(key))
+            balances.append(entry)
+        # Horizon lists the native balance last.
+        balances.sort(key=lambda b: b["asset_type"] == "native")
+        return {
+            "id": account_id,
+            "account_id": account_id,
+            "sequence": str(account["sequence"]),
+            "subentry_count": len(account["balances"]) - 1 + len(account["data"]),
+            "last_modified_ledger": account["last_modified_ledger"],
+            "thresholds": {"low_threshold": 0, "med_threshold": 0, "high_threshold": 0},
+            "flags": {"auth_required": False, "auth_revocable": False, "auth_immutable": False, "auth_clawback_enabled": False},
+            "balances": balances,
+            "signers": [
+                {"key": key, "weight": weight, "type": "ed25519_public_key"}
+                for key, weight in account["signers"].items()
+            ],
+            "data": {name: base64.b64encode(value).decode() for name, value in account["data"].items()},
+            "num_sponsoring": 0,
+            "num_sponsored": 0,
+            "paging_token": account_id,
+        }
+
+    def friendbot(self, account_id):
+        with self.lock:
+            if account_id in self.accounts:
+                raise OperationFailed("op_already_exists")
+            Keypair.from_public_key(account_id)
+            self.create_account(account_id, FRIENDBOT_STARTING_BALANCE)
+            self._record_payment("create_account", None, account_id, "native", FRIENDBOT_STARTING_BALANCE, None)
+            self._close()
+            return {"hash": f"friendbot-{account_id}", "ledger": self.sequence, "successful": True}
+
+    def _line(self, account_id, key):
+        line = self.account(account_id)["balances"].get(key)
+        if line is None:
+            if key != "native" and key.split(":")[1] == account_id:
+                # Issuers hold an unlimited supply of their own assets.
+                return None
+            raise OperationFailed("op_no_trust")
+        return line
+
+    def _debit(self, account_id, key, amount):
+        line = self._line(account_id, key)
+        if line is None:
+            return
+        if line["balance"] < amount:
+            raise OperationFailed("op_underfunded")
+        line["balance"] -= amount
+
+    def _credit(self, account_id, key, amount):
+        line = self._line(account_id, key)
+        if line is None:
+            return
+        if line["limit"] is not None and line["balance"] + amount > line["limit"]:
+            raise OperationFailed("op_line_full")
+        line["balance"] += amount
+
+    def _record_payment(self, kind, source, destination, key, amount, tx_hash):
+        record = {
+            "id": str(len(self.payments) + 1),
+            "paging_token": str(len(self.payments) + 1),
+            "type": kind,
+            "transaction_hash": tx_hash,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.closed_at)),
+            "transaction_successful": True,
+        }
+        if kind == "create_account":
+            record.update({"funder": source, "account": destination, "starting_balance": fmt(amount), "source_account": source})
+        else:
+            record.update({"from": source, "to": destination, "amount": fmt(amount), "source_account": source})
+            record.update(asset_fields(key))
+        self.payments.append(record)
+
+    # --- transactions ---
+    def submit(self, envelope_xdr):
+        """Apply a signed envelope atomically and return Horizon's response body."""
+        with self.lock:
+            envelope = TransactionBuilder.from_xdr(envelope_xdr, self.config.network_passphrase)
+            tx_hash = envelope.hash_hex()
+            if tx_hash in self.transactions:
+                if not self.transactions[tx_hash]["successful"]:
+                    raise TransactionFailed("tx_failed", self.failed_op_codes.get(tx_hash))
+                return self.transactions[tx_hash]
+            fee_bump = None
+            if isinstance(envelope, FeeBumpTransactionEnvelope):
+                fee_bump, envelope = envelope, envelope.transaction.inner_transaction_envelope
+            bid, slots = (fee_bump or envelope).transaction.fee, len(envelope.transaction.operations) + (fee_bump is not None)
+            if self.config.surge_fee and bid < self.config.surge_fee * slots:
+                self.held[tx_hash] = envelope_xdr
+                raise TransactionHeld(tx_hash)
+            self.held.pop(tx_hash, None)
+            inner_hash = envelope.hash_hex()
+            self.held.pop(inner_hash, None)
+            snapshot = (
+                copy.deepcopy(self.accounts),
+                copy.deepcopy(self.offers),
+                copy.deepcopy(self.claimable_balances),
+                len(self.payments),
+                self.next_offer_id,
+            )
+            try:
+                self._apply(envelope, inner_hash, fee_bump)
+            except TransactionFailed as failure:
+                (self.accounts, self.offers, self.claimable_balances, n_payments, self.next_offer_id) = snapshot
+                del self.payments[n_payments:]
+                if failure.tx_code == "tx_failed":
+                    # It made it into a ledger: only the operations are rolled back.
+                    self._charge(envelope.transaction, fee_bump)
+                    self._close()
+                    self._record(envelope, tx_hash, envelope_xdr, "tx_failed", fee_bump)
+                    self.failed_op_codes[tx_hash] = self.failed_op_codes[inner_hash] = failure.op_codes
+                    if fee_bump is not None:
+                        raise TransactionFailed("tx_fee_bump_inner_failed", failure.op_codes) from None
+                raise
+            self._close()
+            return self._record(envelope, tx_hash, envelope_xdr, "tx_success", fee_bump)
+
+    def release_held(self):
+        """Retry queued transactions after the surge fee changed."""
+        with self.lock:
+            for envelope_xdr in list(self.held.values()):
+                try:
+                    self.submit(envelope_xdr)
+                except (TransactionFailed, TransactionHeld):
+                    pass
+
+    def _record(self, envelope, tx_hash, envelope_xdr, tx_code, fee_bump=None):
+        """Store the transaction; a fee bump is also found under its inner hash."""
+        tx = envelope.transaction
+        fee = fee_bump.transaction.fee if fee_bump is not None else tx.fee
+        inner_hash = envelope.hash_hex() if fee_bump is not None else None
+        result = {
+            "id": tx_hash,
+            "hash": tx_hash,
+            "ledger": self.sequence,
+            "successful": tx_code == "tx_success",
+            "source_account": tx.source.account_id,
+            "source_account_sequence": str(tx.sequence),
+            "fee_charged": str(fee),
+            "max_fee": str(fee),
+            "fee_account": tx.source.account_id,
+            "operation_count": len(tx.operations),
+            "envelope_xdr": envelope_xdr,
+            "result_xdr": result_xdr(tx_code, fee, inner_hash),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.closed_at)),
+        }
+        self.transactions[tx_hash] = result
+        if fee_bump is not None:
+            result["fee_account"] = fee_bump.transaction.fee_source.account_id
+            result["fee_bump_transaction"] = {"hash": tx_hash}
+            result["inner_transaction"] = {"hash": inner_hash, "max_fee": str(tx.fee)}
+            self.transactions[inner_hash] = {**result, "id": inner_hash, "hash": inner_hash}
+        return result
+
+    def _check_signed(self, envelope, account_id, tx_hash):
+        signers = self.accounts[account_id]["signers"]
+        for decorated in envelope.signatures:
+            for signer, weight in signers.items():
+                if weight <= 0:
+                    continue
+                keypair = Keypair.from_public_key(signer)
+                if keypair.signature_hint() != decorated.signature_hint:
+                    continue
+                try:
+                    keypair.verify(tx_hash, decorated.signature)
+                    return True
+                except BadSignatureError:
+                    continue
+        return False
+
+    def _apply(self, envelope, tx_hash, fee_bump=None):
+        tx = envelope.transaction
+        source = tx.source.account_id
+        if source not in self.accounts:
+            raise TransactionFailed("tx_no_source_account")
+        account = self.accounts[source]
+        if tx.sequence != account["sequence"] + 1:
+            raise TransactionFailed("tx_bad_seq")
+        if fee_bump is None:
+            if tx.fee < self.config.base_fee * len(tx.operations):
+                raise TransactionFailed("tx_insufficient_fee")
+        else:
+            bump = fee_bump.transaction
+            if bump.fee < self.config.base_fee * (len(tx.operations) + 1):
+                raise TransactionFailed("tx_insufficient_fee")
+            if bump.fee_source.account_id not in self.accounts:
+                raise TransactionFailed("tx_no_source_account")
+            if not self._check_signed(fee_bump, bump.fee_source.account_id, bytes.fromhex(fee_bump.hash_hex())):
+                raise TransactionFailed("tx_bad_auth")
+        bounds = tx.preconditions.time_bounds if tx.preconditions else None
+        if bounds is not None:
+            if bounds.max_time and self.closed_at > bounds.max_time:
+                raise TransactionFailed("tx_too_late")
+            if bounds.min_time and self.closed_at < bounds.min_time:
+                raise TransactionFailed("tx_too_early")
+        raw_hash = bytes.fromhex(tx_hash)
+        required = {source} | {op.source.account_id for op in tx.operations if op.source is not None}
+        for account_id in required:
+            if account_id in self.accounts and not self._check_signed(envelope, account_id, raw_hash):
+                raise TransactionFailed("tx_bad_auth")
+
+        # Fee and sequence are consumed even when an operation fails.
+        self._charge(tx, fee_bump)
+
+        op_codes = []
+        failed = False
+        for index, op in enumerate(tx.operations):
+            op_source = op.source.account_id if op.source is not None else source
+            if op_source not in self.accounts:
+                op_codes.append("op_no_source_account")
+                failed = True
+                continue
+            try:
+                self._apply_op(op, op_source, tx, index, tx_hash)
+                op_codes.append("op_success")
+            except OperationFailed as err:
+                op_codes.append(err.code)
+                failed = True
+        if failed:
+            raise TransactionFailed("tx_failed", op_codes)
+
+    def _charge(self, tx, fee_bump=None):
+        """Consume the sequence number and charge the fee (to the fee-bump sponsor, if any)."""
+        payer = self.accounts[fee_bump.transaction.fee_source.account_id if fee_bump is not None else tx.source.account_id]
+        fee = Decimal(fee_bump.transaction.fee if fee_bump is not None else tx.fee) * STROOP
+        if payer["balances"]["native"]["balance"] < fee:
+            raise TransactionFailed("tx_insufficient_balance")
+        self.accounts[tx.source.account_id]["sequence"] = tx.sequence
+        payer["balances"]["native"]["balance"] -= fee
+
+    def _apply_op(self, op, source, tx, index, tx_hash):
+        if isinstance(op, CreateAccount):
+            destination = op.destination
+            if destination in self.accounts:
+                raise OperationFailed("op_already_exists")
+            amount = Decimal(op.starting_balance)
+            self._debit(source, "native", amount)
+            self.create_account(destination, amount)
+            self._record_payment("create_account", source, destination, "native", amount, tx_hash)
+        elif isinstance(op, (Payment, PathPaymentStrictReceive, PathPaymentStrictSend)):
+            destination = account_id_of(op.destination)
+            if destination not in self.accounts:
+                raise OperationFailed("op_no_destination")
+            if isinstance(op, Payment):
+                send_key = dest_key = asset_key(op.asset)
+                send_amount = dest_amount = Decimal(op.amount)
+            elif isinstance(op, PathPaymentStrictReceive):
+                send_key, dest_key = asset_key(op.send_asset), asset_key(op.dest_asset)
+                send_amount, dest_amount = Decimal(op.send_max), Decimal(op.dest_amount)
+            else:
+                send_key, dest_key = asset_key(op.send_asset), asset_key(op.dest_asset)
+                send_amount, dest_amount = Decimal(op.send_amount), Decimal(op.dest_min)
+            self._debit(source, send_key, send_amount)
+            self._credit(destination, dest_key, dest_amount)
+            self._record_payment("payment", source, destination, dest_key, dest_amount, tx_hash)
+        elif isinstance(op, ChangeTrust):
+            if not isinstance(op.asset, Asset) or op.asset.is_native():
+                raise OperationFailed("op_malformed")
+            key = asset_key(op.asset)
+            if op.asset.issuer not in self.accounts:
+                raise OperationFailed("op_no_issuer")
+            balances = self.accounts[source]["balances"]
+            limit = Decimal(op.limit)
+            if limit == 0:
+                line = balances.get(key)
+                if line is not None and line["balance"] > 0:
+                    raise OperationFailed("op_invalid_limit")
+                balances.pop(key, None)
+            elif key in balances:
+                balances[key]["limit"] = limit
+            else:
+                self._require_reserve(source)
+                balances[key] = {"balance": Decimal(0), "limit": limit}
+        elif isinstance(op, ManageData):
+            data = self.accounts[source]["data"]
+            if op.data_value is None:
+                if op.data_name not in data:
+                    raise OperationFailed("op_name_not_found")
+                del data[op.data_name]
+            else:
+                if op.data_name not in data:
+                    self._require_reserve(source)
+                value = op.data_value
+                data[op.data_name] = value if isinstance(value, bytes) else value.encode()
+        elif isinstance(op, CreateClaimableBalance):
+            amount = Decimal(op.amount)
+            self._debit(source, asset_key(op.asset), amount)
+            balance_id = tx.get_claimable_balance_id(index)
+            self.claimable_balances[balance_id] = {
+                "id": balance_id,
+                "asset": "native" if op.asset.is_native() else asset_key(op.asset),
+                "amount": amount,
+                "sponsor": source,
+                "claimants": [c.destination for c in op.claimants],
+                "last_modified_ledger": self.sequence + 1,
+            }
+        elif isinstance(op, ClaimClaimableBalance):
+            balance = self.claimable_balances.get(op.balance_id)
+            if balance is None:
+                raise OperationFailed("op_does_not_exist")
+            if source not in balance["claimants"]:
+                raise OperationFailed("op_cannot_claim")
+            self._credit(source, balance["asset"], balance["amount"])
+            del self.claimable_balances[op.balance_id]
+        elif isinstance(op, (ManageSellOffer, ManageBuyOffer, CreatePassiveSellOffer)):
+            self._manage_offer(op, source)
+        elif isinstance(op, SetOptions):
+            signer = op.signer
+            if signer is not None and signer.signer_key.signer_key_type.name == "SIGNER_KEY_TYPE_ED25519":
+                signers = self.accounts[source]["signers"]
+                key = signer.signer_key.encoded_signer_key
+                if signer.weight == 0:
+                    signers.pop(key, None)
+                else:
+                    signers[key] = signer.weight
+            if op.master_weight is not None:
+                self.accounts[source]["signers"][source] = op.master_weight
+        elif isinstance(op, BumpSequence):
+            account = self.accounts[source]
+            if op.bump_to > account["sequence"]:
+                account["sequence"] = op.bump_to
+        elif isinstance(op, AccountMerge):
+            destination = account_id_of(op.destination)
+            if destination not in self.accounts:
+                raise OperationFailed("op_no_account")
+            if len(self.accounts[source]["balances"]) > 1:
+                raise OperationFailed("op_has_sub_entries")
+            self._credit(destination, "native", self.accounts[source]["balances"]["native"]["balance"])
+            del self.accounts[source]
+        elif isinstance(op, Clawback):
+            self._debit(account_id_of(op.from_), asset_key(op.asset), Decimal(op.amount))
+        elif isinstance(op, (SetTrustLineFlags, BeginSponsoringFutureReserves, EndSponsoringFutureReserves)):
+            pass
+        else:
+            raise OperationFailed("op_not_supported")
+        if source in self.accounts:
+            self.accounts[source]["last_modified_ledger"] = self.sequence + 1
+
+    def _require_reserve(self, account_id):
+        account = self.accounts[account_id]
+        entries = len(account["balances"]) - 1 + len(account["data"])
+        if account["balances"]["native"]["balance"] < (2 + entries + 1) * BASE_RESERVE:
+            raise OperationFailed("op_low_reserve")
+
+    def _manage_offer(self, op, source):
+        offer_id = op.offer_id
+        if offer_id and offer_id not in self.offers:
+            raise OperationFailed("op_not_found")
+        if isinstance(op, ManageBuyOffer):
+            amount = Decimal(op.amount) * Decimal(op.price.n) / Decimal(op.price.d)
+        else:
+            amount = Decimal(op.amount)
+        if amount == 0:
+            self.offers.pop(offer_id, None)
+            return
+        selling, buying = asset_key(op.selling), asset_key(op.buying)
+        line = self._line(source, selling)
+        if line is not None and line["balance"] < amount:
+            raise OperationFailed("op_underfunded")
+        if not offer_id:
+            offer_id = self.next_offer_id
+            self.next_offer_id += 1
+        self.offers[offer_id] = {
+            "seller": source,
+            "selling": selling,
+            "buying": buying,
+            "amount": amount,
+            "price_r": {"n": op.price.n, "d": op.price.d},
+            "last_modified_ledger": self.sequence + 1,
+        }
+
+    # --- read models ---
+    def offer_json(self, offer_id):
+        offer = self.offers[offer_id]
+        record = {
+            "id": str(offer_id),
+            "paging_token": str(offer_id),
+            "seller": offer["seller"],
+            "selling": asset_fields(offer["selling"]),
+            "buying": asset_fields(offer["buying"]),
+            "amount": fmt(offer["amount"]),
+            "price_r": offer["price_r"],
+            "price": fmt(Decimal(offer["price_r"]["n"]) / Decimal(offer["price_r"]["d"])),
+            "last_modified_ledger": offer["last_modified_ledger"],
+        }
+        return record
+
+    def claimable_balance_json(self, balance_id):
+        balance = self.claimable_balances[balance_id]
+        return {
+            "id": balance_id,
+            "paging_token": balance_id,
+            "asset": balance["asset"],
+            "amount": fmt(balance["amount"]),
+            "sponsor": balance["sponsor"],
+            "last_modified_ledger": balance["last_modified_ledger"],
+            "claimants": [
+                {"destination": destination, "predicate": {"unconditional": True}}
+                for destination in balance["claimants"]
+            ],
+        }
+
+    def ledger_json(self):
+        return {
+            "id": str(self.sequence),
+            "sequence": self.sequence,
+            "paging_token": str(self.sequence << 32),
+            "base_fee_in_stroops": self.config.base_fee,
+            "base_reserve_in_stroops": int(BASE_RESERVE / STROOP),
+            "closed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.closed_at)),
+        }
+
+    def fee_stats_json(self):
+        fee = str(self.config.base_fee)
+        distribution = {key: fee for key in ("max", "min", "mode", "p10", "p20", "p30", "p40", "p50", "p60", "p70", "p80", "p90", "p95", "p99")}
+        if self.config.surge_fee:
+            # Under surge the upper half of the bids clears the surge fee.
+            for key in ("max", "mode", "p50", "p60", "p70", "p80", "p90", "p95", "p99"):
+                distribution[key] = str(self.config.surge_fee)
+        return {
+            "last_ledger": str(self.sequence),
+            "last_ledger_base_fee": fee,
+            "ledger_capacity_usage": "1.00" if self.config.surge_fee else "0.01",
+            "fee_charged": dict(distribution),
+            "max_fee": dict(distribution),
+        }
+
+
+# --- HTTP ---
+def page(records, query, base_url):
+    """Wrap records the way Horizon's collection endpoints do."""
+    order = query.get("order", "asc")
+    limit = int(query.get("limit", 10))
+    if order == "desc":
+        records = list(reversed(records))
+    cursor = query.get("cursor")
+    if cursor:
+        tokens = [r["paging_token"] for r in records]
+        records = records[tokens.index(cursor) + 1:] if cursor in tokens else []
+    records = records[:limit]
+    return {
+        "_links": {"self": {"href": base_url}},
+        "_embedded": {"records": records},
+    }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server_version = "HorizonStandin/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def ledger(self):
+        return self.server.ledger
+
+    @property
+    def config(self):
+        return self.server.ledger.config
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/hal+json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        for name, value in {**getattr(self, "rate_headers", {}), **(headers or {})}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _problem(self, status, title, detail="", extras=None):
+        body = {"type": f"https://stellar.org/horizon-errors/{title.lower().replace(' ', '_')}", "title": title, "status": status, "detail": detail}
+        if extras is not None:
+            body["extras"] = extras
+        self._send(status, body)
+
+    def _inject(self):
+        """Apply the configured latency, rate limit and random failures.
+
+        True means the request has already been answered.
+        """
+        rng = self.server.rng
+        with self.server.rng_lock:
+            delay = self.config.latency + (rng.uniform(0, self.config.jitter) if self.config.jitter else 0.0)
+            fail = rng.random() < self.config.error_rate
+            limited = self._spend_rate_limit()
+        if delay:
+            time.sleep(delay)
+        if limited:
+            self._problem(429, "Rate Limit Exceeded", "The rate limit for the requesting IP address is over its alloted limit.")
+            return True
+        if fail:
+            self._problem(self.config.error_status, "Injected Failure", "Error injected by the Horizon stand-in.")
+        return fail
+
+    def _spend_rate_limit(self):
+        limit = self.config.rate_limit
+        if not limit:
+            return False
+        now = time.monotonic()
+        window = self.server.rate_window
+        if now - window["started"] >= self.config.rate_window:
+            window["started"], window["used"] = now, 0
+        window["used"] += 1
+        reset = max(0, int(window["started"] + self.config.rate_window - now))
+        self.rate_headers = {
+            "X-Ratelimit-Limit": str(limit),
+            "X-Ratelimit-Remaining": str(max(0, limit - window["used"])),
+            "X-Ratelimit-Reset": str(reset),
+        }
+        if window["used"] > limit:
+            self.rate_headers["Retry-After"] = str(reset)
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        if parts[:1] == ["_standin"]:
+            return self._control(parts[1:], query)
+        if self._inject():
+            return
+        try:
+            self._route_get(parts, query, url.path)
+        except KeyError:
+            self._problem(404, "Resource Missing", "The resource at the url requested was not found.")
+        except (ValueError, IndexError) as err:
+            self._problem(400, "Bad Request", str(err))
+
+    def _route_get(self, parts, query, path):
+        ledger = self.ledger
+        with ledger.lock:
+            if not parts:
+                return self._send(200, {"horizon_version": "standin", "network_passphrase": self.config.network_passphrase, "history_latest_ledger": ledger.sequence})
+            head = parts[0]
+            if head == "friendbot":
+                try:
+                    return self._send(200, ledger.friendbot(query["addr"]))
+                except OperationFailed as err:
+                    return self._problem(400, "Bad Request", f"createAccountAlreadyExist ({err.code})")
+            if head == "accounts":
+                account_id = parts[1]
+                if account_id not in ledger.accounts:
+                    raise KeyError(account_id)
+                if len(parts) == 2:
+                    return self._send(200, ledger.account_json(account_id))
+                if parts[2] == "data":
+                    value = ledger.accounts[account_id]["data"][parts[3]]
+                    return self._send(200, {"value": base64.b64encode(value).decode()})
+                if parts[2] == "payments":
+                    return self._send(200, page(self._payments(account_id), query, path))
+                if parts[2] == "offers":
+                    return self._send(200, page(self._offers({"seller": account_id}), query, path))
+                if parts[2] == "transactions":
+                    records = [t for t in ledger.transactions.values() if t["source_account"] == account_id]
+                    return self._send(200, page(self._paged(records), query, path))
+                raise KeyError(path)
+            if head == "payments":
+                return self._send(200, page(self._payments(query.get("account")), query, path))
+            if head == "offers":
+                if len(parts) == 2:
+                    return self._send(200, ledger.offer_json(int(parts[1])))
+                return self._send(200, page(self._offers(query), query, path))
+            if head == "claimable_balances":
+                if len(parts) == 2:
+                    return self._send(200, ledger.claimable_balance_json(parts[1]))
+                return self._send(200, page(self._claimable_balances(query), query, path))
+            if head == "transactions" and len(parts) == 2:
+                return self._send(200, ledger.transactions[parts[1]])
+            if head == "ledgers":
+                return self._send(200, page([ledger.ledger_json()], query, path))
+            if head == "fee_stats":
+                return self._send(200, ledger.fee_stats_json())
+            raise KeyError(path)
+
+    def _paged(self, records):
+        for index, record in enumerate(records):
+            record.setdefault("paging_token", str(index + 1))
+        return records
+
+    def _payments(self, account_id):
+        payments = self.ledger.payments
+        if account_id is None:
+            return list(payments)
+        return [
+            p for p in payments
+            if account_id in (p.get("from"), p.get("to"), p.get("funder"), p.get("account"))
+        ]
+
+    def _offers(self, query):
+        records = []
+        for offer_id, offer in sorted(self.ledger.offers.items()):
+            if "seller" in query and offer["seller"] != query["seller"]:
+                continue
+            if "selling" in query and offer["selling"] != query["selling"]:
+                continue
+            if "buying" in query and offer["buying"] != query["buying"]:
+                continue
+            records.append(self.ledger.offer_json(offer_id))
+        return records
+
+    def _claimable_balances(self, query):
+        records = []
+        for balance_id, balance in sorted(self.ledger.claimable_balances.items()):
+            if "claimant" in query and query["claimant"] not in balance["claimants"]:
+                continue
+            if "sponsor" in query and balance["sponsor"] != query["sponsor"]:
+                continue
+            if "asset" in query and balance["asset"] != query["asset"]:
+                continue
+            records.append(self.ledger.claimable_balance_json(balance_id))
+        return records
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        if parts[:1] == ["_standin"]:
+            return self._control(parts[1:], form)
+        if self._inject():
+            return
+        if parts == ["transactions"]:
+            return self._submit(form.get("tx", ""))
+        if parts == ["transactions_async"]:
+            return self._submit_async(form.get("tx", ""))
+        if parts == ["friendbot"]:
+            return self.do_GET()
+        self._problem(404, "Resource Missing", "The resource at the url requested was not found.")
+
+    def _submit(self, envelope_xdr):
+        try:
+            self._send(200, self.ledger.submit(envelope_xdr))
+        except TransactionHeld:
+            self._problem(504, "Timeout", "Your request timed out before completing. Please try your request again.")
+        except TransactionFailed as err:
+            codes = {"transaction": err.tx_code}
+            if err.op_codes:
+                codes["operations"] = err.op_codes
+            self._problem(
+                400,
+                "Transaction Failed",
+                "The transaction failed when submitted to the stellar network.",
+                {"envelope_xdr": envelope_xdr, "result_codes": codes},
+            )
+        except Exception as err:
+            self._problem(400, "Transaction Malformed", str(err), {"envelope_xdr": envelope_xdr})
+
+    def _submit_async(self, envelope_xdr):
+        """``/transactions_async``: answers like stellar-core's ``tx`` endpoint.
+
+        The stand-in applies the transaction right away, so a ``PENDING``
+        transaction is already visible under ``/transactions/{hash}``.
+        """
+        try:
+            tx_hash = TransactionBuilder.from_xdr(envelope_xdr, self.config.network_passphrase).hash_hex()
+        except Exception as err:
+            return self._problem(400, "Transaction Malformed", str(err), {"envelope_xdr": envelope_xdr})
+        if tx_hash in self.ledger.transactions or tx_hash in self.ledger.held:
+            return self._send(409, {"tx_status": "DUPLICATE", "hash": tx_hash})
+        try:
+            self.ledger.submit(envelope_xdr)
+        except TransactionHeld:
+            pass
+        except TransactionFailed as err:
+            if err.tx_code not in ("tx_failed", "tx_fee_bump_inner_failed"):
+                return self._send(400, {"tx_status": "ERROR", "hash": tx_hash, "error_result_xdr": result_xdr(err.tx_code)})
+        self._send(201, {"tx_status": "PENDING", "hash": tx_hash})
+
+    def _control(self, parts, params):
+        """Test hooks: ``/_standin/reset`` and ``/_standin/config?latency=..``."""
+        if parts == ["reset"]:
+            self.ledger.reset()
+            return self._send(200, {"reset": True})
+        if parts == ["config"]:
+            for field in ("latency", "jitter", "error_rate", "rate_window"):
+                if field in params:
+                    setattr(self.config, field, float(params[field]))
+            for field in ("error_status", "rate_limit", "surge_fee"):
+                if field in params:
+                    setattr(self.config, field, int(params[field]))
+            if "surge_fee" in params:
+                self.ledger.release_held()
+            return self._send(200, {"latency": self.config.latency, "jitter": self.config.jitter, "error_rate": self.config.error_rate, "error_status": self.config.error_status, "rate_limit": self.config.rate_limit, "surge_fee": self.config.surge_fee})
+        self._problem(404, "Resource Missing", "Unknown stand-in control endpoint.")
+
+
+class Standin:
+    """Owns a ``Ledger`` and the HTTP server that exposes it."""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.ledger = Ledger(config)
+        self.httpd = ThreadingHTTPServer((host, port), StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.ledger = self.ledger
+        self.httpd.rng = random.Random(self.ledger.config.seed)
+        self.httpd.rng_lock = threading.Lock()
+        self.httpd.rate_window = {"started": time.monotonic(), "used": 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="horizon-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Horizon + friendbot stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests allowed per --rate-window, with X-Ratelimit-* headers")
+    parser.add_argument("--rate-window", type=float, default=3600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--surge-fee", type=int, default=0, help="per-operation fee needed to be included, 0 = no congestion")
+    args = parser.parse_args()
+    config = StandinConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit=args.rate_limit,
+        rate_window=args.rate_window,
+        seed=args.seed,
+        surge_fee=args.surge_fee,
+    )
+    standin = Standin(config, host=args.host, port=args.port)
+    print(f"🛰️  Horizon stand-in listening on {standin.url}")
+    print(f"   export HORIZON_URL={standin.url}")
+    try:
+        standin.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Page CSS as cached static files instead of inline ``<style>`` blocks.
+
+Every page sent its whole style block through ``st.markdown(...,
+unsafe_allow_html=True)`` on every rerun: 100 to 250 lines of CSS over the
+websocket each time, several with an ``@import`` of Google Fonts. Pages now
+hand the same string to ``inject_css``::
+
+    inject_css(CUSTOM_CSS)
+
+The ``<style>`` blocks are minified once per process and written to
+``core/page_styles/<content hash>.css``. The page then sends one ``<link>``
+tag. Streamlit serves the directory as the (never rendered)
+``page_styles`` component, with ``Cache-Control: public``. Because the file
+name changes with the content, a browser fetches each stylesheet once.
+Markup outside the ``<style>`` blocks is still sent inline.
+
+Google Fonts ``@import``s are bundled too. A background thread downloads
+the font CSS and the woff2 files it points at into ``page_styles/fonts/``
+once per host. Until that copy exists (or if the download failed) the
+stylesheet keeps the remote ``@import``. ``PAGE_STYLES=inline`` restores
+the old inline blocks.
+"""
+import hashlib
+import os
+import re
+import threading
+
+import requests
+import streamlit as st
+import streamlit.components.v1 as components
+
+FONTS_TIMEOUT = 15
+# The CSS API picks the font format by user agent; this one gets woff2.
+FONTS_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+_STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_styles")
+_FONTS = os.path.join(_STATIC, "fonts")
+try:
+    os.makedirs(_FONTS, exist_ok=True)
+except OSError:
+    pass  # read-only checkout: stylesheet() falls back to inline blocks
+_assets = components.declare_component("page_styles", path=_STATIC)
+
+_STYLE = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_IMPORT = re.compile(r"@import\s+url\(\s*['\"]?([^'\")]+)['\"]?\s*\)\s*;", re.I)
+_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_FONT_URL = re.compile(r"url\((https://fonts\.gstatic\.com/[^)]+)\)")
+_GOOGLE_FONTS = "https://fonts.googleapis.com/"
+
+_built = {}  # source hash → (html, waiting on fonts?)
+_lock = threading.Lock()
+_fetching = set()
+_failed = set()  # not retried until the next restart
+
+
+def _hash(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def minify(css):
+    """Comments and optional whitespace removed; ``@import``s moved to the front."""
+    css = _COMMENT.sub("", css)
+    imports = [match.group(0) for match in _IMPORT.finditer(css)]
+    parts = _STRING.split(_IMPORT.sub("", css))
+    for i in range(0, len(parts), 2):  # odd parts are quoted strings, kept as they are
+        part = re.sub(r"\s+", " ", parts[i])
+        part = re.sub(r"\s*([{};,>])\s*", r"\1", part)
+        parts[i] = re.sub(r":\s+", ":", part).replace(";}", "}")
+    css = "".join(parts).strip()
+    return "".join(re.sub(r"\s+", " ", rule.strip()) for rule in imports) + css
+
+
+def _write(name, text, directory=_STATIC):
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)  # other processes never see a partial file
+    return name
+
+
+def _font_stylesheet(url):
+    return f"fonts-{_hash(url)}.css"
+
+
+def bundle_fonts(url):
+    """Download a Google Fonts stylesheet and its font files next to the page styles, once."""
+    name = _font_stylesheet(url)
+    if os.path.exists(os.path.join(_STATIC, name)):
+        return True
+    try:
+        response = requests.get(url, headers={"User-Agent": FONTS_USER_AGENT}, timeout=FONTS_TIMEOUT)
+        response.raise_for_status()
+        css = response.text
+        for font_url in set(_FONT_URL.findall(css)):
+            font_name = f"{_hash(font_url)}{os.path.splitext(font_url)[1]}"
+            font_path = os.path.join(_FONTS, font_name)
+            if not os.path.exists(font_path):
+                font = requests.get(font_url, timeout=FONTS_TIMEOUT)
+                font.raise_for_status()
+                tmp = f"{font_path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(font.content)
+                os.replace(tmp, font_path)
+            css = css.replace(font_url, f"fonts/{font_name}")
+        _write(name, minify(css))
+        return True
+    except (requests.RequestException, OSError):
+        with _lock:
+            _failed.add(url)
+        return False
+    finally:
+        with _lock:
+            _fetching.discard(url)
+
+
+def _local_fonts(css):
+    """``css`` with bundled copies of its Google Fonts imports; True if some are still downloading."""
+    waiting = False
+
+    def local(match):
+        nonlocal waiting
+        url = match.group(1)
+        if not url.startswith(_GOOGLE_FONTS):
+            return match.group(0)
+        name = _font_stylesheet(url)
+        if os.path.exists(os.path.join(_STATIC, name)):
+            return f"@import url({name});"
+        with _lock:
+            if url in _failed:
+                return match.group(0)
+            waiting = True
+            if url in _fetching:
+                return match.group(0)
+            _fetching.add(url)
+        threading.Thread(target=bundle_fonts, args=(url,), name="page-fonts", daemon=True).start()
+        return match.group(0)
+
+    return _IMPORT.sub(local, css), waiting
+
+
+def _build(source):
+    styles = _STYLE.findall(source)
+    markup = _STYLE.sub("", source).strip()
+    if not styles:
+        return source, False
+    css, waiting = _local_fonts(minify("\n".join(styles)))
+    name = _write(f"{_hash(css)}.css", css)
+    link = f'<link rel="stylesheet" href="component/{_assets.name}/{name}">'
+    return link + markup, waiting
+
+
+def stylesheet(source):
+    """The markup to send for ``source``: a ``<link>`` plus whatever was not CSS."""
+    key = _hash(source)
+    with _lock:
+        built = _built.get(key)
+    if built is None or built[1]:  # rebuilt once the fonts are local
+        try:
+            built = _build(source)
+        except OSError as e:
+            print(f"⚠️ Page styles sent inline: {e}")
+            built = (source, False)
+        with _lock:
+            _built[key] = built
+    return built[0]
+
+
+def inject_css(source):
+    """Send a page's ``<style>`` block as a cached stylesheet link."""
+    if os.getenv("PAGE_STYLES", "static").lower() == "inline":
+        st.markdown(source, unsafe_allow_html=True)
+        return
+    st.markdown(stylesheet(source), unsafe_allow_html=True)
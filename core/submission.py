@@ -0,0 +1,403 @@
+"""Background transaction submission with result tracking.
+
+``server.submit_transaction`` blocks the script thread until the ledger
+closes, so the whole rerun waited on it. ``submit_async`` hands the signed
+envelope to a worker and returns a ticket (the transaction hash) at once.
+The worker posts it to Horizon's ``/transactions_async`` and polls
+``/transactions/{hash}`` until the outcome is final. Outcomes are kept in a
+process-wide cache that later reruns read::
+
+    st.session_state.ticket = submit_async(signed_xdr)
+    ...
+    outcome = submission_result(st.session_state.ticket)
+    if outcome["status"] == PENDING:
+        watch(st.session_state.ticket)  # reruns the page once it settles
+    elif outcome["status"] == SUCCESS:
+        st.success(outcome["hash"])
+
+Both paths are idempotent by transaction hash. The same signed XDR coming
+back through a rerun or a retry is answered from the cache instead of being
+posted again; use ``submit_once`` where a page needs the result inline.
+When a submission times out, the hash is looked up on Horizon before the
+envelope is ever re-sent.
+
+With a fee sponsor (``FEE_SPONSOR_SECRET``, see ``core.fees``), a queued
+transaction still pending after ``FEE_BUMP_AFTER`` seconds is re-sent once
+inside a fee bump. Horizon finds a fee bump by its inner hash, so the ticket
+stays the same.
+
+Envelopes whose signatures do not verify (see ``core.envelopes``) finish as
+``tx_bad_auth`` without a round trip to Horizon.
+
+``submit_batch`` takes the envelopes of one multi-transaction flow (signed
+together through ``core.wallet.sign_many``) and returns their tickets in
+order. Stellar-core queues one transaction per source account, so envelopes
+from the same source are sent one after another, each once the previous one
+is in a ledger. When one is rejected without consuming its sequence number,
+the rest from that source are not sent: their sequence numbers can no
+longer be used.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from stellar_sdk import Network, xdr
+from stellar_sdk.client.response import Response
+from stellar_sdk.exceptions import BadRequestError, BadResponseError, ConnectionError, NotFoundError
+
+from core.envelopes import InvalidSignatureError, check_signatures, parse
+from core.fees import BUMP_AFTER, fee_bump, fee_sponsor
+from core.horizon import get_server
+from core.sequences import CONSUMED, result_code, sequences, source_and_sequence
+
+PENDING, SUCCESS, FAILED, ERROR = "pending", "success", "failed", "error"
+
+POLL_INTERVAL = 1.0
+TIMEOUT = 120.0
+# After a lost response, how long to look the hash up before sending again.
+RESEND_AFTER = 10.0
+MAX_WORKERS = 8
+MAX_RESULTS = 2048
+
+
+def transaction_hash(envelope_xdr, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+    return parse(envelope_xdr, network_passphrase).hash_hex
+
+
+def _horizon_code(code, prefix):
+    """``txBAD_SEQ`` → ``tx_bad_seq``; ``PAYMENT_NO_TRUST`` → ``op_no_trust``."""
+    name = code.name
+    if name.startswith(prefix):
+        return f"{prefix}_{name[len(prefix):].lower()}"
+    family = re.sub(r"(?<!^)(?=[A-Z])", "_", type(code).__name__[: -len("ResultCode")]).upper() + "_"
+    return "op_" + (name[len(family):] if name.startswith(family) else name).lower()
+
+
+def result_codes(result_xdr):
+    """Horizon-style ``{"transaction": ..., "operations": [...]}`` from a ``TransactionResult``."""
+    result = xdr.TransactionResult.from_xdr(result_xdr).result
+    if result.inner_result_pair is not None:
+        result = result.inner_result_pair.result.result
+    codes = {"transaction": _horizon_code(result.code, "tx")}
+    operations = []
+    for op_result in result.results or []:
+        if op_result.code != xdr.OperationResultCode.opINNER:
+            operations.append(_horizon_code(op_result.code, "op"))
+            continue
+        tr = op_result.tr
+        inner = next(v for k, v in vars(tr).items() if k != "type" and v is not None)
+        operations.append(_horizon_code(inner.code, "op"))
+    if operations:
+        codes["operations"] = operations
+    return codes
+
+
+def _settled(outcome):
+    """True when sending the envelope again cannot change ``outcome``.
+
+    Only a pending submission or one that reached a ledger is final. A
+    rejection before the ledger (``tx_bad_seq``, ``tx_insufficient_balance``,
+    ``tx_too_early``, ``tx_bad_auth``...) or an error without any result (a
+    lost connection) did not consume the sequence number, so the same
+    envelope may go through later and is sent again.
+    """
+    return outcome["status"] in (PENDING, SUCCESS, FAILED)
+
+
+def _replay(outcome):
+    """Return or raise what the original ``submit_transaction`` call did."""
+    if outcome is None or outcome["status"] == PENDING:
+        raise ConnectionError("transaction is still pending")
+    if outcome["status"] == SUCCESS:
+        return outcome["response"]
+    if outcome.get("exception") is not None:
+        raise outcome["exception"]
+    problem = {"title": "Transaction Failed", "detail": outcome.get("detail", ""), "extras": {"result_codes": outcome.get("result_codes") or {}}}
+    raise BadRequestError(Response(400, json.dumps(problem), {}, ""))
+
+
+def _body(error):
+    try:
+        return json.loads(error.message)
+    except (TypeError, ValueError):
+        return {}
+
+
+class SubmissionQueue:
+    def __init__(
+        self,
+        network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE,
+        poll_interval=POLL_INTERVAL,
+        timeout=TIMEOUT,
+        max_workers=MAX_WORKERS,
+        max_results=MAX_RESULTS,
+        resend_after=RESEND_AFTER,
+        sponsor=None,
+        bump_after=BUMP_AFTER,
+    ):
+        self.network_passphrase = network_passphrase
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.resend_after = resend_after
+        self.sponsor = sponsor
+        self.bump_after = bump_after
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="horizon-submit")
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+
+    def submit(self, envelope, signer=None):
+        """Queue a signed envelope (XDR or transaction object); returns its ticket.
+
+        ``signer`` (a public key, or several) must have signed it, for callers
+        that know who was asked to sign (the connected wallet).
+        """
+        envelope_xdr = envelope if isinstance(envelope, str) else envelope.to_xdr()
+        ticket = transaction_hash(envelope_xdr, self.network_passphrase)
+        if self._claim(ticket) and not self._rejected(ticket, envelope_xdr, signer):
+            self._executor.submit(self._run, ticket, envelope_xdr)
+        return ticket
+
+    def submit_many(self, envelopes, signer=None):
+        """Queue the envelopes of one flow; returns their tickets, in order."""
+        chains = OrderedDict()  # source → [(sequence, ticket, xdr, claimed)]
+        tickets = []
+        for envelope in envelopes:
+            envelope_xdr = envelope if isinstance(envelope, str) else envelope.to_xdr()
+            parsed = parse(envelope_xdr, self.network_passphrase)
+            tickets.append(parsed.hash_hex)
+            claimed = self._claim(parsed.hash_hex)
+            chains.setdefault(parsed.source, []).append((parsed.sequence, parsed.hash_hex, envelope_xdr, claimed))
+        for chain in chains.values():
+            chain.sort()
+            self._executor.submit(self._run_chain, [entry[1:] for entry in chain], signer)
+        return tickets
+
+    def _run_chain(self, chain, signer=None):
+        """Send envelopes from one source in turn; stop at the first one that did not land."""
+        for index, (ticket, envelope_xdr, claimed) in enumerate(chain):
+            if claimed and not self._rejected(ticket, envelope_xdr, signer):
+                self._run(ticket, envelope_xdr)
+            # Known tickets may still be in flight from an earlier submit.
+            outcome = self.wait(ticket, self.timeout) or {}
+            if outcome.get("status") not in (SUCCESS, FAILED):
+                for skipped, skipped_xdr, skipped_claimed in chain[index + 1:]:
+                    if skipped_claimed:
+                        self._finish(skipped, skipped_xdr, ERROR, detail="not sent: an earlier transaction in the batch did not go through")
+                if index + 1 < len(chain):
+                    sequences.forget(source_and_sequence(envelope_xdr)[0])
+                return
+
+    def submit_once(self, envelope, signer=None):
+        """``server.submit_transaction``, once per transaction hash.
+
+        Duplicates (concurrent or later) get the first call's response or
+        exception without another POST. If the response is lost, the hash
+        is looked up on Horizon instead of re-sending.
+        """
+        envelope_xdr = envelope if isinstance(envelope, str) else envelope.to_xdr()
+        ticket = transaction_hash(envelope_xdr, self.network_passphrase)
+        if not self._claim(ticket) or self._rejected(ticket, envelope_xdr, signer):
+            return _replay(self.wait(ticket, self.timeout))
+        try:
+            response = get_server().submit_transaction(envelope_xdr)
+        except BadRequestError as e:
+            codes = (e.extras or {}).get("result_codes") or {}
+            status = FAILED if result_code(e) in CONSUMED else ERROR
+            self._finish(ticket, envelope_xdr, status, result_codes=codes, detail=e.detail, exception=e)
+            raise
+        except (ConnectionError, BadResponseError) as e:
+            # Horizon may have taken it (a 504 means "still waiting for the ledger").
+            record = self._resolve(ticket)
+            if record is None:
+                sequences.forget(source_and_sequence(envelope_xdr)[0])
+                self._finish(ticket, envelope_xdr, ERROR, detail=str(e), exception=e)
+                raise
+            self._settle_record(ticket, envelope_xdr, record)
+            return _replay(self.result(ticket))
+        except Exception as e:
+            self._finish(ticket, envelope_xdr, ERROR, detail=str(e), exception=e)
+            raise
+        self._finish(ticket, envelope_xdr, SUCCESS, ledger=response.get("ledger"), response=response)
+        return response
+
+    def _claim(self, ticket):
+        """True if the caller should send ``ticket``; False if it is known already."""
+        with self._lock:
+            outcome = self._results.get(ticket)
+            if outcome is not None and _settled(outcome):
+                return False
+            self._results[ticket] = {"status": PENDING, "hash": ticket, "submitted_at": time.time()}
+            self._trim()
+            return True
+
+    def result(self, ticket):
+        """The outcome dict for ``ticket``, or ``None`` if it is unknown (or evicted)."""
+        with self._lock:
+            outcome = self._results.get(ticket)
+            return dict(outcome) if outcome is not None else None
+
+    def wait(self, ticket, timeout=None):
+        """Block until ``ticket`` settles (for scripts and tests, not page code)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._settled:
+            while self._results.get(ticket, {}).get("status") == PENDING:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._settled.wait(remaining)
+            outcome = self._results.get(ticket)
+            return dict(outcome) if outcome is not None else None
+
+    def _trim(self):
+        while len(self._results) > self.max_results:
+            for key, outcome in self._results.items():
+                if outcome["status"] != PENDING:
+                    del self._results[key]
+                    break
+            else:
+                return
+
+    def _rejected(self, ticket, envelope_xdr, signer=None):
+        """Finish ``ticket`` as ``tx_bad_auth`` without posting if its signatures don't verify
+        or ``signer`` did not sign it."""
+        try:
+            check_signatures(envelope_xdr, signer=signer, network_passphrase=self.network_passphrase)
+        except InvalidSignatureError as e:
+            self._finish(ticket, envelope_xdr, ERROR, result_codes={"transaction": "tx_bad_auth"}, detail=str(e))
+            return True
+        return False
+
+    def _finish(self, ticket, envelope_xdr, status, **fields):
+        codes = fields.get("result_codes") or {}
+        if status == SUCCESS:
+            sequences.observe(envelope_xdr)
+        elif codes.get("transaction"):
+            sequences.observe(envelope_xdr, code=codes["transaction"])
+        with self._settled:
+            self._results[ticket] = {**self._results.get(ticket, {}), "status": status, "finished_at": time.time(), **fields}
+            self._settled.notify_all()
+
+    def _lookup(self, ticket):
+        try:
+            return get_server().transactions().transaction(ticket).call()
+        except (NotFoundError, ConnectionError, BadResponseError):
+            return None
+
+    def _resolve(self, ticket):
+        """Poll for ``ticket`` for up to ``resend_after`` seconds."""
+        deadline = time.monotonic() + self.resend_after
+        while True:
+            record = self._lookup(ticket)
+            if record is not None or time.monotonic() >= deadline:
+                return record
+            time.sleep(self.poll_interval)
+
+    def _settle_record(self, ticket, envelope_xdr, record):
+        codes = result_codes(record["result_xdr"]) if record.get("result_xdr") else {}
+        status = SUCCESS if record.get("successful") else FAILED
+        self._finish(ticket, envelope_xdr, status, ledger=record.get("ledger"), result_codes=codes, response=record)
+
+    def _post(self, envelope_xdr):
+        """``tx_status`` from ``/transactions_async`` plus the response body."""
+        try:
+            body = get_server().submit_transaction_async(envelope_xdr)
+        except (BadRequestError, BadResponseError) as e:
+            body = _body(e)
+            return body.get("tx_status", "ERROR" if isinstance(e, BadRequestError) else "TRY_AGAIN_LATER"), body
+        except ConnectionError:
+            return "UNKNOWN", {}
+        return body.get("tx_status", "PENDING"), body
+
+    def _bump(self, ticket, envelope_xdr):
+        """Re-send a stuck transaction inside a fee bump paid by the sponsor."""
+        envelope = fee_bump(envelope_xdr, self.sponsor, self.network_passphrase)
+        if envelope is None:
+            error = "not bumped: the fee would be above MAX_BASE_FEE"
+        else:
+            status, body = self._post(envelope.to_xdr())
+            if status in ("PENDING", "DUPLICATE"):
+                with self._lock:
+                    self._results[ticket]["fee_bump"] = envelope.hash_hex()
+                return
+            codes = result_codes(body["error_result_xdr"]) if body.get("error_result_xdr") else {}
+            error = f"fee bump {status}: {codes or body.get('detail') or body.get('title') or 'no detail'}"
+        # The original is still queued; keep polling it, but say why it was not bumped.
+        print(f"⚠️ {ticket[:8]}: {error}")
+        with self._lock:
+            self._results[ticket]["fee_bump_error"] = error
+
+    def _run(self, ticket, envelope_xdr):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        accepted = False
+        resend_at = None
+        bump_at = started + self.bump_after if self.sponsor is not None else None
+        try:
+            while True:
+                if not accepted and (resend_at is None or time.monotonic() >= resend_at):
+                    status, body = self._post(envelope_xdr)
+                    if status == "ERROR":
+                        codes = result_codes(body["error_result_xdr"]) if body.get("error_result_xdr") else {}
+                        detail = body.get("detail") or body.get("title") or "rejected by stellar-core"
+                        return self._finish(ticket, envelope_xdr, ERROR, result_codes=codes, detail=detail)
+                    accepted = status in ("PENDING", "DUPLICATE")
+                    # A lost response may still have reached Horizon: look the
+                    # hash up for a while before sending the envelope again.
+                    resend_at = time.monotonic() + self.resend_after if status == "UNKNOWN" else None
+                record = self._lookup(ticket)
+                if record is not None:
+                    return self._settle_record(ticket, envelope_xdr, record)
+                if accepted and bump_at is not None and time.monotonic() >= bump_at:
+                    bump_at = None
+                    self._bump(ticket, envelope_xdr)
+                if time.monotonic() >= deadline:
+                    # It may still land; the source's sequence is unknown now.
+                    sequences.forget(source_and_sequence(envelope_xdr)[0])
+                    return self._finish(ticket, envelope_xdr, ERROR, detail=f"no result after {self.timeout:.0f}s")
+                time.sleep(self.poll_interval)
+        except Exception as e:
+            self._finish(ticket, envelope_xdr, ERROR, detail=str(e))
+
+
+submissions = SubmissionQueue(sponsor=fee_sponsor())
+
+
+def submit_async(envelope, signer=None):
+    """Queue ``envelope`` for background submission; returns a ticket."""
+    return submissions.submit(envelope, signer)
+
+
+def submit_batch(envelopes, signer=None):
+    """Queue the envelopes of one flow; returns their tickets, in order."""
+    return submissions.submit_many(envelopes, signer)
+
+
+def submit_once(envelope, signer=None):
+    """Blocking, idempotent submit; see ``SubmissionQueue.submit_once``."""
+    return submissions.submit_once(envelope, signer)
+
+
+def submission_result(ticket):
+    return submissions.result(ticket)
+
+
+def watch(ticket, interval=POLL_INTERVAL, message="⏳ Transaction submitted, waiting for the ledger..."):
+    """Show ``message`` while ``ticket`` is pending and rerun the page once it settles.
+
+    Only the small fragment reruns while waiting; the page script does not.
+    """
+    import streamlit as st
+
+    @st.fragment(run_every=interval)
+    def _watch():
+        outcome = submissions.result(ticket)
+        if outcome is None or outcome["status"] != PENDING:
+            st.rerun()
+        st.info(message)
+
+    _watch()
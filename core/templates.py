@@ -0,0 +1,118 @@
+"""Prebuilt transaction templates for hot, fixed-shape actions.
+
+Several pages build the same transaction on every click (a trustline to a
+fixed asset, a fixed payment to the issuer) with a fresh ``TransactionBuilder``,
+new ``Asset`` objects and a full XDR encode. A ``TransactionTemplate``
+encodes the operations and memo once. ``build`` only writes the source
+account, fee, sequence number and time bounds in front of those bytes and
+hashes the result::
+
+    trust = trustline_template(FRAGMENT_A, "100000000000")
+    xdr = trust.build(load_source_account(public_key)).to_xdr()
+
+``template(key, build_operations)`` caches any other shape under a key of
+the caller's choosing; ``build_operations`` only runs the first time.
+"""
+import base64
+import hashlib
+import struct
+import threading
+import time
+
+from stellar_sdk import ChangeTrust, Network, TransactionEnvelope
+from stellar_sdk.memo import NoneMemo
+
+from core.fees import fees
+
+TX_TIMEOUT = 300
+
+_ENVELOPE_TYPE_TX = struct.pack(">I", 2)
+_PRECOND_NONE = struct.pack(">I", 0)
+_PRECOND_TIME = struct.pack(">I", 1)
+_EXT_NONE = struct.pack(">I", 0)
+
+
+class PreparedTransaction:
+    """A built envelope; mirrors the parts of ``TransactionEnvelope`` pages use."""
+
+    def __init__(self, tx_bytes, network_passphrase):
+        self.tx_bytes = tx_bytes
+        self.network_passphrase = network_passphrase
+        self.signatures = []
+        self._hash = None
+
+    def hash(self):
+        if self._hash is None:
+            network_id = hashlib.sha256(self.network_passphrase.encode()).digest()
+            self._hash = hashlib.sha256(network_id + _ENVELOPE_TYPE_TX + self.tx_bytes).digest()
+        return self._hash
+
+    def hash_hex(self):
+        return self.hash().hex()
+
+    def sign(self, keypair):
+        decorated = keypair.sign_decorated(self.hash())
+        self.signatures.append(decorated.signature_hint + struct.pack(">I", 64) + decorated.signature)
+
+    def to_xdr(self):
+        signatures = struct.pack(">I", len(self.signatures)) + b"".join(self.signatures)
+        return base64.b64encode(_ENVELOPE_TYPE_TX + self.tx_bytes + signatures).decode()
+
+    def to_envelope(self):
+        """The full ``TransactionEnvelope``, decoded (slow path)."""
+        return TransactionEnvelope.from_xdr(self.to_xdr(), self.network_passphrase)
+
+
+class TransactionTemplate:
+    def __init__(self, operations, memo=None, timeout=TX_TIMEOUT, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+        operations = list(operations)
+        if not operations:
+            raise ValueError("a transaction template needs at least one operation")
+        self.operation_count = len(operations)
+        self.timeout = timeout
+        self.network_passphrase = network_passphrase
+        # Everything after the time bounds is fixed: memo, operations, ext.
+        self._tail = (
+            (memo or NoneMemo()).to_xdr_object().to_xdr_bytes()
+            + struct.pack(">I", len(operations))
+            + b"".join(op.to_xdr_object().to_xdr_bytes() for op in operations)
+            + _EXT_NONE
+        )
+
+    def build(self, source_account, base_fee=None):
+        """Like ``TransactionBuilder(...).build()``: uses ``source_account.sequence + 1``
+        and increments it. ``base_fee`` defaults to the ``core.fees`` estimate."""
+        base_fee = base_fee or fees.base_fee()
+        sequence = source_account.sequence + 1
+        if self.timeout is None:
+            cond = _PRECOND_NONE
+        else:
+            cond = _PRECOND_TIME + struct.pack(">QQ", 0, int(time.time()) + self.timeout)
+        head = (
+            source_account.account.to_xdr_object().to_xdr_bytes()
+            + struct.pack(">Iq", base_fee * self.operation_count, sequence)
+            + cond
+        )
+        source_account.increment_sequence_number()
+        return PreparedTransaction(head + self._tail, self.network_passphrase)
+
+
+_templates = {}
+_lock = threading.Lock()
+
+
+def template(key, build_operations, memo=None, timeout=TX_TIMEOUT):
+    """The process-wide template for ``key``, created from ``build_operations()`` once."""
+    existing = _templates.get(key)
+    if existing is not None:
+        return existing
+    with _lock:
+        if key not in _templates:
+            _templates[key] = TransactionTemplate(build_operations(), memo=memo, timeout=timeout)
+        return _templates[key]
+
+
+def trustline_template(asset, limit=None, timeout=TX_TIMEOUT):
+    """A single ``ChangeTrust`` to ``asset`` (``limit`` ``None`` means the maximum)."""
+    key = ("change_trust", asset.code, asset.issuer, limit, timeout)
+    return template(key, lambda: [ChangeTrust(asset=asset, limit=limit)], timeout=timeout)
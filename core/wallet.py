@@ -0,0 +1,158 @@
+"""Freighter connect and signing through one declared, bidirectional component.
+
+Pages used to talk to Freighter with throwaway ``components.html`` scripts.
+Some wrote the result into ``window.location`` query params, which reloads
+the browser tab, opens a new websocket session and reruns the whole script.
+Others called ``window.streamlitReportMessage`` or
+``window.parent.streamlit.setComponentValue``, which do not exist, so their
+results never came back at all. The wallet component here is declared with
+``components.declare_component`` and returns its result with
+``setComponentValue``, so a signature costs one incremental rerun::
+
+    result = wallet_result()                       # top of the page
+    if result and result["action"] == SIGN and "signed_xdr" in result:
+        submit_once(result["signed_xdr"])
+    ...
+    if st.button("Sign"):
+        sign(tx.to_xdr(), tag="prophecy")          # queued for the bridge
+    ...
+    bridge()                                       # end of the page
+
+``connect``, ``sign`` and ``sign_many`` queue one request per session.
+``bridge`` hands it to the component, and ``wallet_result`` returns the
+finished request exactly once. A result is a dict with ``action``, ``tag``
+and either ``public_key``, ``signed_xdr``, ``signed_xdrs`` or ``error``.
+Envelopes that come back with an ``error``, or whose request is cancelled
+or replaced before Freighter answers, give their sequence numbers back
+(``core.sequences``), so the next transaction does not fail ``tx_bad_seq``.
+
+The bridge is one iframe per session. ``wallet_result`` reserves a slot for
+it near the top of the page and ``bridge`` fills that slot, so the iframe
+keeps its place (and stays mounted) however much the page above the end
+changes between reruns. A click only changes the request the mounted
+iframe receives. The freighter-api bundle is downloaded once per host into
+the component directory and served by Streamlit next to it; until that
+copy exists, the iframe falls back to the CDN.
+"""
+import os
+import threading
+import uuid
+
+import requests
+import streamlit as st
+import streamlit.components.v1 as components
+from stellar_sdk import Network
+
+from core.sequences import sequences
+
+CONNECT, SIGN, SIGN_MANY = "connect", "sign", "sign_many"
+BRIDGE_KEY = "freighter_bridge"
+
+FREIGHTER_API_URL = os.getenv("FREIGHTER_API_URL", "https://unpkg.com/@stellar/freighter-api@2.0.0/build/index.min.js")
+BUNDLE_TIMEOUT = 15
+
+_FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wallet_component")
+_BUNDLE = os.path.join(_FRONTEND, "freighter-api.min.js")
+_component = components.declare_component("freighter_wallet", path=_FRONTEND)
+
+
+def cache_bundle(url=FREIGHTER_API_URL, path=_BUNDLE):
+    """Download the freighter-api bundle next to the component, once."""
+    if os.path.exists(path):
+        return True
+    try:
+        response = requests.get(url, timeout=BUNDLE_TIMEOUT)
+        response.raise_for_status()
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(response.content)
+        os.replace(tmp, path)  # other processes never see a partial file
+        return True
+    except (requests.RequestException, OSError):
+        return False
+
+
+threading.Thread(target=cache_bundle, name="freighter-bundle", daemon=True).start()
+
+
+def _pending_key(key):
+    return f"_{key}_request"
+
+
+def _slot_key(key):
+    return f"_{key}_slot"
+
+
+def _release(request):
+    """Hand back the sequence numbers of envelopes that will not be signed."""
+    if request is None or request["action"] == CONNECT:
+        return
+    for envelope_xdr in reversed(request.get("xdrs") or [request["xdr"]]):
+        sequences.release(envelope_xdr)
+
+
+def _request(key, action, tag, **fields):
+    request = {"id": uuid.uuid4().hex, "action": action, "tag": tag, **fields}
+    _release(st.session_state.get(_pending_key(key)))  # replaced before Freighter answered
+    st.session_state[_pending_key(key)] = request
+    return request["id"]
+
+
+def _xdr(envelope):
+    return envelope if isinstance(envelope, str) else envelope.to_xdr()
+
+
+def connect(tag=None, key=BRIDGE_KEY):
+    """Ask Freighter for the user's public key."""
+    return _request(key, CONNECT, tag)
+
+
+def sign(envelope, tag=None, address=None, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE, key=BRIDGE_KEY):
+    """Ask Freighter to sign one envelope (XDR or transaction object)."""
+    return _request(key, SIGN, tag, xdr=_xdr(envelope), address=address, network=network_passphrase)
+
+
+def sign_many(envelopes, tag=None, address=None, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE, key=BRIDGE_KEY):
+    """Ask Freighter to sign several envelopes; they come back together, in order."""
+    xdrs = [_xdr(envelope) for envelope in envelopes]
+    if not xdrs:
+        raise ValueError("nothing to sign")
+    return _request(key, SIGN_MANY, tag, xdrs=xdrs, address=address, network=network_passphrase)
+
+
+def pending(key=BRIDGE_KEY):
+    """The queued request still waiting on Freighter, or ``None``."""
+    return st.session_state.get(_pending_key(key))
+
+
+def cancel(key=BRIDGE_KEY):
+    _release(st.session_state.pop(_pending_key(key), None))
+
+
+def wallet_result(key=BRIDGE_KEY):
+    """The finished request, once; ``None`` while nothing new came back.
+
+    Reads the value the bridge set during the previous run, so it can be
+    called before ``bridge`` (at the top of the page). Also reserves the
+    bridge's place on the page.
+    """
+    st.session_state[_slot_key(key)] = st.empty()
+    request = pending(key)
+    value = st.session_state.get(key)
+    if request is None or not isinstance(value, dict) or value.get("id") != request["id"]:
+        return None
+    st.session_state.pop(_pending_key(key), None)
+    if "error" in value:
+        _release(request)
+    return {**value, "action": request["action"], "tag": request["tag"]}
+
+
+def bridge(key=BRIDGE_KEY):
+    """Render the (invisible) wallet component with the queued request.
+
+    Call it once per run, after every button that can queue a request. It
+    renders into the slot ``wallet_result`` reserved, if any.
+    """
+    slot = st.session_state.pop(_slot_key(key), None)
+    with slot if slot is not None else st.container():
+        return _component(request=pending(key), key=key, default=None)
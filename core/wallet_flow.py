@@ -0,0 +1,164 @@
+"""Connect → sign → submit as one state machine, with fragment-scoped progress.
+
+Pages drove these steps with ``st.rerun()``: once after a connect so the
+sidebar showed the new key, once after a signature, once more after the
+submission settled, and some just to refresh a status line. Each rerun
+re-executes the whole script, Horizon reads included. ``WalletFlow`` keeps
+the step a session is on in ``st.session_state`` and moves it forward at
+the top of the page, before anything that shows it is rendered, so a step
+never needs a rerun of its own::
+
+    flow = WalletFlow()
+    event = flow.advance()             # top of the page, before the sidebar
+    if event and event["state"] == SUCCESS:
+        st.session_state.status = event["status"]
+    ...
+    if st.button("Nourish"):
+        flow.sign(tx, tag="nourish", status="Your flora is thriving!")
+    ...
+    flow.progress()                    # status line; only it polls
+    bridge()
+
+States::
+
+    IDLE ─connect→ CONNECTING ─→ CONNECTED
+      └──sign───→ SIGNING ─→ SIGNED (submit=False)
+                          └→ SUBMITTING ─→ SUCCESS | FAILED
+
+``advance`` returns an event (the flow's state dict) once, on the run a
+step finishes, and ``None`` otherwise. Extra keyword arguments given to
+``connect``/``sign``/``sign_many`` come back in the event, so the page
+does not have to keep its own "what was I doing" state. While a
+submission is pending, ``progress`` reruns only its own fragment; the page
+reruns once, when the outcome is in.
+"""
+import streamlit as st
+from stellar_sdk import Network
+
+from core import wallet
+from core.submission import PENDING, POLL_INTERVAL, SUCCESS, submission_result, submit_async, submit_batch
+
+IDLE, CONNECTING, CONNECTED = "idle", "connecting", "connected"
+SIGNING, SIGNED, SUBMITTING = "signing", "signed", "submitting"
+FAILED = "failed"  # SUCCESS comes from core.submission
+
+WAITING = {
+    CONNECTING: "⏳ Waiting for Freighter to connect...",
+    SIGNING: "⏳ Waiting for your signature in Freighter...",
+    SUBMITTING: "⏳ Transaction submitted, waiting for the ledger...",
+}
+
+
+class WalletFlow:
+    def __init__(self, key="wallet_flow", bridge_key=wallet.BRIDGE_KEY, network_passphrase=Network.TESTNET_NETWORK_PASSPHRASE):
+        self.key = key
+        self.bridge_key = bridge_key
+        self.network_passphrase = network_passphrase
+
+    @property
+    def data(self):
+        if self.key not in st.session_state:
+            st.session_state[self.key] = {"state": IDLE}
+        return st.session_state[self.key]
+
+    @property
+    def state(self):
+        return self.data["state"]
+
+    @property
+    def busy(self):
+        return self.state in WAITING
+
+    def _move(self, state, **fields):
+        data = {**self.data, "state": state, **fields}
+        st.session_state[self.key] = data
+        return dict(data)
+
+    def _start(self, state, tag, context):
+        # A new step starts from a clean slate; only the connection survives.
+        public_key = self.data.get("public_key")
+        st.session_state[self.key] = {"state": state, "tag": tag, "public_key": public_key, **context}
+
+    def connect(self, tag=None, **context):
+        self._start(CONNECTING, tag, context)
+        wallet.connect(tag=tag, key=self.bridge_key)
+
+    def sign(self, envelope, tag=None, address=None, submit=True, **context):
+        """Ask Freighter to sign ``envelope``; with ``submit`` the signed XDR is sent too."""
+        self._start(SIGNING, tag, {"submit": submit, **context})
+        wallet.sign(envelope, tag=tag, address=address, network_passphrase=self.network_passphrase, key=self.bridge_key)
+
+    def sign_many(self, envelopes, tag=None, address=None, submit=True, **context):
+        self._start(SIGNING, tag, {"submit": submit, **context})
+        wallet.sign_many(envelopes, tag=tag, address=address, network_passphrase=self.network_passphrase, key=self.bridge_key)
+
+    def reset(self):
+        wallet.cancel(self.bridge_key)
+        self._start(IDLE, None, {})
+
+    def advance(self):
+        """Apply what came back since the last run; the finished step's event, once.
+
+        Call it once per run, near the top of the page (it stands in for
+        ``wallet_result``).
+        """
+        result = wallet.wallet_result(self.bridge_key)
+        if result is not None:
+            return self._received(result)
+        if self.state == SUBMITTING:
+            return self._settle()
+        return None
+
+    def _received(self, result):
+        if "error" in result:
+            return self._move(FAILED, error=result["error"])
+        if result["action"] == wallet.CONNECT:
+            return self._move(CONNECTED, public_key=result["public_key"])
+        signed = result.get("signed_xdrs") or [result["signed_xdr"]]
+        if not self.data.get("submit", True):
+            return self._move(SIGNED, signed_xdr=signed[0], signed_xdrs=signed)
+        try:
+            if result["action"] == wallet.SIGN_MANY:
+                tickets = submit_batch(signed)
+            else:
+                tickets = [submit_async(signed[0])]
+        except Exception as e:
+            return self._move(FAILED, error=f"Error submitting transaction: {e}")
+        self._move(SUBMITTING, tickets=tickets)
+        return self._settle()  # a repeated envelope may have settled already
+
+    def _outcomes(self):
+        return [submission_result(ticket) for ticket in self.data.get("tickets", [])]
+
+    def _settle(self):
+        outcomes = self._outcomes()
+        if any(outcome is not None and outcome["status"] == PENDING for outcome in outcomes):
+            return None
+        if outcomes and all(outcome is not None and outcome["status"] == SUCCESS for outcome in outcomes):
+            return self._move(SUCCESS, outcomes=outcomes, hash=outcomes[-1]["hash"])
+        failed = next((outcome for outcome in outcomes if outcome is None or outcome["status"] != SUCCESS), None) or {}
+        error = failed.get("result_codes") or failed.get("detail") or "the result was lost"
+        return self._move(FAILED, outcomes=outcomes, error=error)
+
+    def progress(self, interval=POLL_INTERVAL, messages=None):
+        """The flow's status line, as a fragment.
+
+        While a submission is pending only this fragment reruns, every
+        ``interval`` seconds; once the outcome is in, the page reruns once so
+        ``advance`` can hand it over. A ``None`` in ``messages`` hides that
+        state's line.
+        """
+        messages = {**WAITING, **(messages or {})}
+        run_every = interval if self.state == SUBMITTING else None
+
+        @st.fragment(run_every=run_every)
+        def _progress():
+            state = self.state
+            if state == SUBMITTING:
+                outcomes = self._outcomes()
+                if not any(outcome is not None and outcome["status"] == PENDING for outcome in outcomes):
+                    st.rerun()
+            if messages.get(state):
+                st.info(messages[state])
+
+        _progress()
@@ -0,0 +1,202 @@
+"""Disk-backed warm cache for Horizon GETs.
+
+Streamlit restarts after every organism commit, and every restart used to
+begin with cold caches. ``WarmCache`` keeps successful Horizon responses in
+a small SQLite file, so issuer accounts, assets and claimable balances are
+still warm for the first visitors after a redeploy.
+
+Each endpoint template (see ``core.metrics.endpoint_template``) has a
+policy ``(ttl, stale_for, volatile)``:
+
+* younger than ``ttl`` seconds: served straight from disk;
+* up to ``stale_for`` seconds past ``ttl``: served from disk while
+  ``HorizonClient`` refreshes it in the background (stale-while-revalidate);
+* older: fetched from Horizon as usual.
+
+``volatile`` entries (account state) are dropped whenever a transaction is
+submitted, so a page never builds on a balance or sequence number from
+before its own payment. Endpoints without a policy are never cached. The
+file is trimmed to ``max_bytes``, evicting the least recently read entries.
+
+Set ``HORIZON_CACHE_PATH`` to move the file, or ``HORIZON_CACHE=off`` to
+disable it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core.metrics import endpoint_template
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "horizon.sqlite3")
+MAX_BYTES = 32 * 1024 * 1024
+
+# endpoint template → (ttl, stale_for, volatile)
+POLICIES = {
+    "/assets": (300, 3600, False),
+    "/transactions/{hash}": (86400, 0, False),
+    "/claimable_balances/{balance_id}": (60, 600, True),
+    "/claimable_balances": (15, 60, True),
+    "/accounts/{account_id}": (5, 60, True),
+    "/accounts/{account_id}/data/{key}": (30, 300, True),
+    "/fee_stats": (10, 30, False),
+    "/ledgers": (5, 15, False),
+}
+
+FRESH, STALE = "fresh", "stale"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body TEXT NOT NULL,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    read_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_read_at ON responses (read_at);
+CREATE INDEX IF NOT EXISTS responses_endpoint ON responses (endpoint);
+"""
+
+
+class WarmCache:
+    def __init__(self, path=DEFAULT_PATH, policies=None, max_bytes=MAX_BYTES, clock=time.time):
+        self.path = path
+        self.policies = POLICIES if policies is None else policies
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db().executescript(_SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Several Streamlit processes may share the file; WAL keeps
+            # readers from blocking on a writer.
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def key(url, params=None):
+        return json.dumps([url, sorted((params or {}).items())])
+
+    def policy(self, url):
+        return self.policies.get(endpoint_template(url))
+
+    def lookup(self, url, params=None, any_age=False):
+        """``(freshness, (status, headers, body, url))`` or ``None``.
+
+        ``any_age`` ignores the policy window; ``HorizonClient`` uses it as a
+        last resort when Horizon cannot be reached at all.
+        """
+        policy = self.policy(url)
+        if policy is None:
+            return None
+        ttl, stale_for, _ = policy
+        key = self.key(url, params)
+        try:
+            row = self._db().execute(
+                "SELECT status, headers, body, url, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        status, headers, body, response_url, fetched_at = row
+        age = self.clock() - fetched_at
+        if age <= ttl:
+            freshness = FRESH
+        elif age <= ttl + stale_for or any_age:
+            freshness = STALE
+        else:
+            return None
+        self._touch(key)
+        return freshness, (status, json.loads(headers), body, response_url)
+
+    def _touch(self, key):
+        try:
+            self._db().execute("UPDATE responses SET read_at = ? WHERE key = ?", (self.clock(), key))
+        except sqlite3.Error:
+            pass
+
+    def store(self, url, params, response):
+        if self.policy(url) is None:
+            return
+        body = response.text
+        size = len(body.encode())
+        if size > self.max_bytes:
+            return
+        now = self.clock()
+        row = (
+            self.key(url, params),
+            endpoint_template(url),
+            response.status_code,
+            json.dumps(dict(response.headers)),
+            body,
+            response.url,
+            size,
+            now,
+            now,
+        )
+        with self._write_lock:
+            try:
+                db = self._db()
+                db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                self._evict(db)
+            except sqlite3.Error:
+                pass
+
+    def _evict(self, db):
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so a full cache does not evict on every insert.
+        excess = total - int(self.max_bytes * 0.9)
+        doomed, freed = [], 0
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY read_at"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def invalidate_volatile(self):
+        """Forget account state after a submission may have changed it."""
+        endpoints = [endpoint for endpoint, (_, _, volatile) in self.policies.items() if volatile]
+        if not endpoints:
+            return
+        placeholders = ", ".join("?" * len(endpoints))
+        with self._write_lock:
+            try:
+                self._db().execute(f"DELETE FROM responses WHERE endpoint IN ({placeholders})", endpoints)
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        with self._write_lock:
+            self._db().execute("DELETE FROM responses")
+
+    def stats(self):
+        entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"path": self.path, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+def open_default():
+    """The process-wide cache, or ``None`` when disabled or the file can't be opened."""
+    if os.getenv("HORIZON_CACHE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    try:
+        return WarmCache(os.getenv("HORIZON_CACHE_PATH", DEFAULT_PATH))
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠️ Horizon warm cache disabled: {e}")
+        return None
@@ -84,9 +84,9 @@ def build_polished_dapp(spec, cycle):
     STYLE: {spec['visual_style']}
     
     MANDATES (DO NOT BREAK THESE):
-    1. Freighter Integration (st.components.v1.html + signTransaction).
+    1. Freighter Integration through the shared wallet component ('from core.wallet import CONNECT, SIGN, bridge, connect, sign, wallet_result'): buttons call `connect()` or `sign(xdr)`, the page reads `result = wallet_result()` near the top (`result["public_key"]`, `result["signed_xdr"]`, or `result["error"]`) and calls `bridge()` exactly once at the end (before any `st.stop()`). Never send Freighter results through `window.location` or query params.
     2. Custom CSS for style "{spec['visual_style']}".
-    3. STRICTLY use 'st.query_params' (No experimental_get_query_params).
+    3. For URL parameters, STRICTLY use 'st.query_params' (No experimental_get_query_params).
     4. NO external images. Use Emojis only.
     
     5. CRITICAL IMPORT RULES:
@@ -94,12 +94,31 @@ def build_polished_dapp(spec, cycle):
        - 'from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset'
        - 'from stellar_sdk.exceptions import BadRequestError, NotFoundError'
        - 'import requests' (Required for friendbot)
+       - 'from core.horizon import HORIZON_URL, get_server, friendbot_url' (The shared Horizon layer)
     
     6. STRICT SYNTAX & ANTI-HALLUCINATION RULES:
-       - URLS: NEVER wrap URLs in Markdown. Use pure strings. Example: HORIZON_URL = "https://horizon-testnet.stellar.org" (No brackets or parenthesis).
+       - URLS: NEVER wrap URLs in Markdown. Use pure strings (No brackets or parenthesis).
+       - HORIZON: NEVER hard-code the Horizon URL or call `Server(...)`. Use `server = get_server()` and the imported `HORIZON_URL`.
+       - BALANCE REFRESHES: Wrap reads that only refresh a display in `with priority(LOW):` ('from core.governor import LOW, priority') so they are shed before transactions under rate limits.
+       - MULTIPLE ACCOUNTS: To show balances of several accounts, call `fetch_balances([pk1, pk2, ...])` once ('from core.balances import fetch_balances'); it returns `{{pk: {{"XLM": 1.0, CODE: 2.0}}}}`. Never loop over `load_account`.
+       - TRANSACTION SOURCES: Build transactions from `load_source_account(public_key)` ('from core.sequences import load_source_account'), never `server.load_account`; sequence numbers are handed out locally.
+       - TRUSTLINES: Build a plain trustline transaction as `trustline_template(ASSET, limit).build(load_source_account(public_key))` ('from core.templates import trustline_template'); it returns an envelope with `.to_xdr()` and `.sign(keypair)`, precompiled once per asset.
+       - FEES: Never hard-code `base_fee=100`. Pass `base_fee=base_fee()` to `TransactionBuilder` ('from core.fees import base_fee'); it follows Horizon's fee stats under surge pricing.
+       - SUBMISSION: Never block a rerun on `server.submit_transaction`. Store `st.session_state.ticket = submit_async(signed_xdr)`, then on every rerun read `outcome = submission_result(ticket)`: while `outcome["status"] == PENDING` call `watch(ticket)`, otherwise show success (`outcome["hash"]`) or `outcome["result_codes"]` ('from core.submission import PENDING, SUCCESS, submission_result, submit_async, watch'). Where the result must be shown inline, call `submit_once(signed_xdr)` instead: it raises `BadRequestError` like `submit_transaction`, but never posts the same transaction hash twice.
+       - ISSUER PAYOUTS: Payments/mints signed by the app's own issuer key go through `st.session_state.payout_ticket = payout_async(ISSUER_KEYPAIR, stellar_sdk.Payment(...))` ('from core.batching import payout_async, payout_result, watch_payout'), which batches them with other sessions' payouts on a pooled channel account without blocking the rerun. On every rerun read `outcome = payout_result(ticket)`: while `outcome["status"] == PENDING` call `watch_payout(ticket)`, otherwise show `outcome["hash"]` or the error (`outcome["code"]`, `outcome["error"]`).
+       - MULTI-STEP FLOWS: When one user action needs several operations (trustline, then an issuer payment, then ManageData), never chain Freighter round trips. Collect them in `plan = FlowPlan(public_key)` ('from core.flows import FlowPlan'): `plan.trust(ASSET, limit)`, `plan.add(op, "label")`, and `plan.add(op, "label", signer=ISSUER_KEYPAIR)` for operations from the issuer, which co-signs. Then send `plan.to_xdr()` to Freighter once.
+       - DEMO KEYS: Without `ISSUER_KEY` in `st.secrets`, take the demo issuer from `st.session_state.demo_key = lease_demo_secret()` ('from core.demo import lease_demo_secret'). It is already funded, so never call friendbot or `time.sleep` for it while rendering.
+       - SIGNED XDR: To read a signed XDR that came back from Freighter, use `parse(signed_xdr).envelope` / `.hash_hex` / `.source` ('from core.envelopes import parse') instead of `TransactionBuilder.from_xdr`; parses are cached. Submitting already rejects bad signatures as `tx_bad_auth` without calling Horizon.
+       - BATCH SIGNING: When a flow needs several separate transactions (one per milestone, one per recipient) that cannot be one FlowPlan, build them with `load_source_account` so their sequence numbers follow each other, queue them with `sign_many(transactions, tag=...)` ('from core.wallet import sign_many, SIGN_MANY') for one wallet interaction, and send the result's `signed_xdrs` with `tickets = submit_batch(signed_xdrs)` ('from core.submission import submit_batch'). Check each ticket with `submission_result`.
+       - WALLET FLOW: Drive connect → sign → submit with `flow = WalletFlow()` ('from core.wallet_flow import WalletFlow, CONNECTED, SUCCESS, FAILED'). Call `event = flow.advance()` near the top, BEFORE the sidebar, and apply `event["state"]` there; start steps with `flow.connect()` / `flow.sign(xdr, tag=..., **context)`; render `flow.progress()` where the status belongs. NEVER call `st.rerun()` after a connect, a signature or a submission just to refresh the sidebar or a status line.
+       - LIVE BALANCES: Show account balances with `balance_metrics(public_key, [("XLM Balance", "XLM", "{{:,.2f}} XLM"), ("GEM", GEM_ASSET, "{{:.0f}}")])` ('from core.balances import balance_metrics, live_account'); it refreshes itself in an `st.fragment`. For custom layouts use `live_account(public_key, render)`, where `render(account)` receives the Horizon account dict. NEVER add a 'Refresh' button or `st.rerun()` just to update balances.
+       - SESSION MEMORY: Right after the imports, call `session_budget(cold=(...), caps={{...}})` ('from core.memory import session_budget'), before anything reads `st.session_state`. List the page's big structures (project lists, graphs) in `cold`, and cap caches and logs in `caps`, e.g. `{{"messages": 50}}`. Keep per-account caches in `LRUDict(64)` ('from core.memory import LRUDict'). Never read another page's session-state keys.
+       - PERSISTED STATE: Once the wallet's public key is known, call `persist(public_key, ("projects",))` ('from core.persistence import persist') every run for the user-built structures that must survive a reload (projects, graphs, collections). Once the wallet signs the unlock challenge it offers, it restores them in one local read; never rebuild them from Horizon or store them in query params. Name every field that holds a secret key in `exclude=(...)` so it is never stored.
+       - PAGE STYLES: Put all custom CSS in one `<style>` block and send it with `inject_css(CUSTOM_CSS)` ('from core.styles import inject_css'), never `st.markdown(CUSTOM_CSS, unsafe_allow_html=True)`. It is served as a cached stylesheet, and Google Fonts `@import`s are bundled locally.
+       - STATIC SECTIONS: Put text that is the same for every visitor (concept blurb, about, feature lists, disclaimers) in a function decorated with `@static_section` ('from core.sections import static_section'). Give it no widgets and no session state, and pass page constants in as arguments.
        - PASSPHRASE: MUST use `Network.TESTNET_NETWORK_PASSPHRASE`. Never `TESTNET_PASSPHRASE`.
        - ASSET CODES: 1-12 Alphanumeric characters ONLY. NO UNDERSCORES (e.g., Use "FRAGA", never "FRAG_A").
-       - FRIENDBOT: The python SDK `Server` does NOT have a `.friendbot()` method. You MUST use: `requests.get(f"https://friendbot.stellar.org/?addr={{public_key}}")`
+       - FRIENDBOT: The python SDK `Server` does NOT have a `.friendbot()` method. You MUST use: `requests.get(friendbot_url(public_key))`
        - HTML COMPONENTS: `components.html()` does NOT accept a `key` argument. NEVER pass `key=...` to it.
        - JS FORMATTING: NEVER use `.format()` on HTML/JS strings (it breaks curly braces). Use f-strings and double curly braces `{{}}` for JS logic.
     
@@ -1,16 +1,28 @@
 import streamlit as st
-import streamlit.components.v1 as components
 import json
 import base64
 import time
 import secrets
-from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Price, asset
+from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Price, asset, ClaimPredicate, Claimant, CreateClaimableBalance
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.balances import fetch_balances
+from core.fees import base_fee
+from core.governor import LOW, priority
+from core.horizon import get_server
+from core.memory import LRUDict, session_budget
+from core.persistence import persist
+from core.sections import static_section
+from core.sequences import load_source_account
+from core.styles import inject_css
+from core.submission import PENDING, SUCCESS, submission_result, submit_async, submit_batch, watch
+from core.wallet import CONNECT, SIGN_MANY, bridge, connect, sign, sign_many, wallet_result
+
+session_budget(cold=("projects", "balances")) # Before anything reads st.session_state (see core.memory)
 
 # --- Configuration ---
 # Set to 'testnet' for development, 'public' for production
 NETWORK_PASSPHRASE_TESTNET = Network.TESTNET_NETWORK_PASSPHRASE
-HORIZON_URL_TESTNET = "https://horizon-testnet.stellar.org/"
+MAX_CACHED_BALANCES = 64
 
 # --- Streamlit Session State Initialization ---
 if "is_connected" not in st.session_state:
@@ -20,11 +32,11 @@ if "public_key" not in st.session_state:
 if "network" not in st.session_state:
     st.session_state.network = "testnet" # Default network
 if "horizon_server" not in st.session_state:
-    st.session_state.horizon_server = Server(HORIZON_URL_TESTNET)
+    st.session_state.horizon_server = get_server()
 if "projects" not in st.session_state:
     st.session_state.projects = []
 if "balances" not in st.session_state:
-    st.session_state.balances = {}
+    st.session_state.balances = LRUDict(MAX_CACHED_BALANCES) # Only the accounts viewed most recently
 if "selected_project_id" not in st.session_state:
     st.session_state.selected_project_id = None
 
@@ -255,62 +267,17 @@ CUSTOM_CSS = """
     }
 </style>
 """
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
-
-# --- Freighter Integration JavaScript ---
-# This script is injected into the Streamlit app to interact with Freighter.
-# It handles connecting, getting public key, and signing transactions.
-FREIGHTER_JS = """
-<script>
-    async function connectFreighter() {
-        if (window.freighter) {
-            try {
-                const publicKey = await window.freighter.getPublicKey();
-                window.parent.postMessage({ type: 'FREIGHTER_CONNECTED', publicKey: publicKey }, '*');
-            } catch (error) {
-                console.error("Freighter connection error:", error);
-                window.parent.postMessage({ type: 'FREIGHTER_ERROR', message: error.message }, '*');
-            }
-        } else {
-            window.parent.postMessage({ type: 'FREIGHTER_ERROR', message: 'Freighter wallet not found. Please install it.' }, '*');
-        }
-    }
-
-    async function signTransaction(xdr, networkPassphrase) {
-        if (window.freighter) {
-            try {
-                const signedXDR = await window.freighter.signTransaction(xdr, { networkPassphrase });
-                window.parent.postMessage({ type: 'TX_SIGNED', signedXDR: signedXDR }, '*');
-            } catch (error) {
-                console.error("Transaction signing error:", error);
-                window.parent.postMessage({ type: 'TX_SIGN_ERROR', message: error.message }, '*');
-            }
-        } else {
-            window.parent.postMessage({ type: 'FREIGHTER_ERROR', message: 'Freighter wallet not found.' }, '*');
-        }
-    }
-
-    // Listen for messages from Streamlit
-    window.addEventListener('message', event => {
-        if (event.data.type === 'CONNECT_FREIGHTER') {
-            connectFreighter();
-        } else if (event.data.type === 'SIGN_TX') {
-            signTransaction(event.data.xdr, event.data.networkPassphrase);
-        }
-    });
-</script>
-"""
-components.html(FREIGHTER_JS, height=0, width=0)
+inject_css(CUSTOM_CSS)
 
 # --- Helper Functions ---
 def get_horizon_server():
     """Returns the Stellar Horizon server instance based on the selected network."""
     if st.session_state.network == "testnet":
-        return Server(HORIZON_URL_TESTNET)
+        return get_server()
     # Add public network logic if needed later
     # elif st.session_state.network == "public":
     #     return Server(HORIZON_URL_PUBLIC)
-    return Server(HORIZON_URL_TESTNET) # Default to testnet
+    return get_server() # Default to testnet
 
 def get_network_passphrase():
     """Returns the Stellar network passphrase based on the selected network."""
@@ -325,139 +292,206 @@ def fetch_account_balances(public_key):
     """Fetches and updates account balances for a given public key."""
     if not public_key:
         return {}
-    try:
-        account = st.session_state.horizon_server.load_account(public_key)
-        st.session_state.balances[public_key] = {
-            bal.asset_code if hasattr(bal, 'asset_code') else 'XLM': float(bal.balance)
-            for bal in account.balances
-        }
-        return st.session_state.balances[public_key]
-    except NotFoundError:
+    balances = refresh_balances([public_key])
+    if public_key in balances and not balances[public_key]:
         st.error(f"Account {public_key} not found on the network. Please fund it (e.g., using Friendbot for Testnet).")
-        return {}
+    return balances.get(public_key, {})
+
+def refresh_balances(public_keys):
+    """Fetches balances for several accounts in one concurrent batch."""
+    try:
+        with priority(LOW):
+            balances = fetch_balances(public_keys)
     except Exception as e:
-        st.error(f"Error fetching account balances for {public_key}: {e}")
+        st.error(f"Error fetching account balances: {e}")
         return {}
-
-def send_message_to_js(message_type, **kwargs):
-    """Sends a message to the JavaScript component."""
-    message = {"type": message_type, **kwargs}
-    st.components.v1.html(
-        f"""
-        <script>
-            window.postMessage({json.dumps(message)}, '*');
-        </script>
-        """,
-        height=0, width=0
-    )
+    st.session_state.balances.update(balances)
+    return balances
 
 def handle_freighter_response():
-    """Listens for and processes messages from the JavaScript component."""
-    if st.session_state.get("freighter_response"):
-        response = st.session_state.freighter_response
-        response_type = response.get("type")
-
-        if response_type == "FREIGHTER_CONNECTED":
-            st.session_state.public_key = response.get("publicKey")
-            st.session_state.is_connected = True
-            st.session_state.freighter_response = None # Clear response
-            st.success(f"Connected to Freighter: {st.session_state.public_key[:8]}...")
-            st.rerun()
-        elif response_type == "FREIGHTER_ERROR":
-            st.error(f"Freighter Error: {response.get('message')}")
-            st.session_state.freighter_response = None
-        elif response_type == "TX_SIGNED":
-            signed_xdr = response.get("signedXDR")
-            try:
-                # Submit the signed transaction to Horizon
-                horizon = get_horizon_server()
-                tx_result = horizon.submit_transaction(signed_xdr)
-                st.success(f"Transaction successful! Hash: "
-                           f"<a href='https://testnet.stellarexplorer.org/tx/{tx_result['hash']}' target='_blank' class='tx-hash-link'>"
-                           f"{tx_result['hash'][:10]}...</a>", unsafe_allow_html=True)
-                # Clear pending transaction data
-                if "pending_tx_action" in st.session_state:
-                    action_data = st.session_state.pending_tx_action
-                    if action_data["action"] == "create_project_account":
-                        project_id = action_data["project_id"]
-                        for project in st.session_state.projects:
-                            if project["id"] == project_id:
-                                project["status"] = "open"
-                                fetch_account_balances(project["project_account_pk"])
-                                break
-                    elif action_data["action"] == "fund_milestone":
-                        project_id = action_data["project_id"]
-                        milestone_index = action_data["milestone_index"]
-                        for project in st.session_state.projects:
-                            if project["id"] == project_id:
-                                project["milestones"][milestone_index]["status"] = "funded"
-                                project["milestones"][milestone_index]["claimable_balance_id"] = tx_result['hash'] # Use tx hash as simple ID for demo
-                                fetch_account_balances(st.session_state.public_key)
-                                break
-                    elif action_data["action"] == "claim_milestone":
-                        project_id = action_data["project_id"]
-                        milestone_index = action_data["milestone_index"]
-                        for project in st.session_state.projects:
-                            if project["id"] == project_id:
-                                project["milestones"][milestone_index]["status"] = "claimed"
-                                fetch_account_balances(st.session_state.public_key)
-                                fetch_account_balances(project["project_account_pk"]) # For the funder
-                                break
-                    elif action_data["action"] == "archive_project":
-                        project_id = action_data["project_id"]
-                        for project in st.session_state.projects:
-                            if project["id"] == project_id:
-                                project["status"] = "archived"
-                                fetch_account_balances(st.session_state.public_key) # Funder's balance
-                                break
-                st.session_state.pending_tx_action = None
-                st.session_state.freighter_response = None
-                st.rerun() # Refresh UI to show updated status
-            except BadRequestError as e:
-                st.error(f"Transaction submission failed: {e.extras.get('result_codes', 'No result codes')}")
-            except Exception as e:
-                st.error(f"Error submitting transaction: {e}")
-            finally:
-                st.session_state.freighter_response = None
-        elif response_type == "TX_SIGN_ERROR":
-            st.error(f"Transaction signing cancelled or failed: {response.get('message')}")
-            st.session_state.freighter_response = None
-
-def listen_for_freighter_messages():
-    """A component to listen for messages from the JavaScript."""
-    # This component captures messages sent from the JavaScript and stores them in session state.
-    # It needs to be placed *once* in the app.
-    st.markdown(
-        """
-        <script>
-            window.addEventListener('message', event => {
-                if (event.source === window && event.data.type && 
-                    (event.data.type.startsWith('FREIGHTER_') || event.data.type.startsWith('TX_'))) {
-                    // Send to Streamlit
-                    window.parent.postMessage({
-                        streamlit: true,
-                        type: 'freighter_callback',
-                        payload: event.data
-                    }, '*');
-                }
-            });
-        </script>
-        """,
-        unsafe_allow_html=True
-    )
-    # Check for messages from the iframe (Streamlit's way to get JS output)
-    if st.runtime.exists():
-        query_params = query_params = st.query_params
-        if "freighter_callback" in query_params:
-            payload_str = query_params["freighter_callback"][0]
-            st.session_state.freighter_response = json.loads(base64.b64decode(payload_str).decode())
-            st.experimental_set_query_params(freighter_callback=None) # Clear to prevent re-processing
-
-listen_for_freighter_messages()
+    """Processes what the wallet bridge brought back from Freighter."""
+    response = wallet_result()
+    if response is None:
+        return
+    if response["action"] == CONNECT and "error" not in response:
+        st.session_state.public_key = response["public_key"]
+        st.session_state.is_connected = True
+        st.success(f"Connected to Freighter: {st.session_state.public_key[:8]}...")
+    elif response["action"] == CONNECT:
+        st.error(f"Freighter Error: {response['error']}")
+    elif "error" in response:
+        # core.wallet already gave the unsigned envelopes' sequence numbers back
+        st.error(f"Transaction signing cancelled or failed: {response['error']}")
+    elif response["action"] == SIGN_MANY:
+        try:
+            # One ticket per transaction; settle_pending_batch() applies the results
+            st.session_state.pending_submission = submit_batch(response["signed_xdrs"])
+        except Exception as e:
+            st.error(f"Error submitting transactions: {e}")
+    else:
+        try:
+            # Submitted in the background; settle_pending_submission() applies the result
+            st.session_state.pending_submission = submit_async(response["signed_xdr"])
+        except Exception as e:
+            st.error(f"Error submitting transaction: {e}")
+
+def settle_pending_submission():
+    """Applies the outcome of a background submission once Horizon has it."""
+    ticket = st.session_state.get("pending_submission")
+    if not ticket:
+        return
+    if isinstance(ticket, list):
+        settle_pending_batch(ticket)
+        return
+    outcome = submission_result(ticket)
+    if outcome is not None and outcome["status"] == PENDING:
+        watch(ticket)
+        return
+    st.session_state.pending_submission = None
+    if outcome is None or outcome["status"] != SUCCESS:
+        outcome = outcome or {}
+        st.error(f"Transaction submission failed: {outcome.get('result_codes') or outcome.get('detail', 'No result codes')}")
+        return
+    tx_result = outcome
+    st.success(f"Transaction successful! Hash: "
+               f"<a href='https://testnet.stellarexplorer.org/tx/{tx_result['hash']}' target='_blank' class='tx-hash-link'>"
+               f"{tx_result['hash'][:10]}...</a>", unsafe_allow_html=True)
+    # Clear pending transaction data
+    if "pending_tx_action" in st.session_state:
+        action_data = st.session_state.pending_tx_action
+        if action_data["action"] == "create_project_account":
+            project_id = action_data["project_id"]
+            for project in st.session_state.projects:
+                if project["id"] == project_id:
+                    project["status"] = "open"
+                    fetch_account_balances(project["project_account_pk"])
+                    break
+        elif action_data["action"] == "fund_milestone":
+            project_id = action_data["project_id"]
+            milestone_index = action_data["milestone_index"]
+            for project in st.session_state.projects:
+                if project["id"] == project_id:
+                    project["milestones"][milestone_index]["status"] = "funded"
+                    project["milestones"][milestone_index]["claimable_balance_id"] = tx_result['hash'] # Use tx hash as simple ID for demo
+                    fetch_account_balances(st.session_state.public_key)
+                    break
+        elif action_data["action"] == "claim_milestone":
+            project_id = action_data["project_id"]
+            milestone_index = action_data["milestone_index"]
+            for project in st.session_state.projects:
+                if project["id"] == project_id:
+                    project["milestones"][milestone_index]["status"] = "claimed"
+                    refresh_balances([st.session_state.public_key, project["project_account_pk"]])
+                    break
+        elif action_data["action"] == "archive_project":
+            project_id = action_data["project_id"]
+            for project in st.session_state.projects:
+                if project["id"] == project_id:
+                    project["status"] = "archived"
+                    fetch_account_balances(st.session_state.public_key) # Funder's balance
+                    break
+    st.session_state.pending_tx_action = None
+
+def settle_pending_batch(tickets):
+    """Applies the outcomes of transactions signed and submitted together, one per milestone."""
+    outcomes = [submission_result(ticket) for ticket in tickets]
+    for ticket, outcome in zip(tickets, outcomes):
+        if outcome is not None and outcome["status"] == PENDING:
+            watch(ticket, message=f"⏳ {len(tickets)} transactions submitted, waiting for the ledger...")
+            return
+    st.session_state.pending_submission = None
+    action_data = st.session_state.get("pending_tx_action") or {}
+    st.session_state.pending_tx_action = None
+    project = next((p for p in st.session_state.projects if p["id"] == action_data.get("project_id")), None)
+    if project is None or action_data.get("action") != "fund_milestones":
+        return
+    funded = 0
+    for milestone_index, outcome in zip(action_data["milestone_indexes"], outcomes):
+        milestone = project["milestones"][milestone_index]
+        if outcome is not None and outcome["status"] == SUCCESS:
+            milestone["status"] = "funded"
+            milestone["claimable_balance_id"] = outcome["hash"] # Use tx hash as simple ID for demo
+            funded += 1
+        else:
+            outcome = outcome or {}
+            st.error(f"Funding '{milestone['name']}' failed: {outcome.get('result_codes') or outcome.get('detail', 'No result codes')}")
+    if funded:
+        st.success(f"{funded} of {len(outcomes)} milestones funded.")
+        fetch_account_balances(st.session_state.public_key)
+
+def fund_milestones(project, milestone_indexes):
+    """Builds one claimable balance transaction per milestone and asks Freighter to sign them all at once."""
+    if not st.session_state.is_connected:
+        st.error("Please connect your Freighter wallet to fund milestones.")
+        return
+    with st.spinner(f"Preparing funding for {len(milestone_indexes)} milestones..."):
+        try:
+            transactions = []
+            for i in milestone_indexes:
+                milestone = project["milestones"][i]
+                # Each call hands out the next sequence number, so the batch can be submitted in order
+                funder_account = load_source_account(st.session_state.public_key)
+                transactions.append(
+                    TransactionBuilder(
+                        source_account=funder_account,
+                        network_passphrase=get_network_passphrase(),
+                        base_fee=base_fee(),
+                    )
+                    .append_operation(
+                        CreateClaimableBalance(
+                            asset=asset.Asset.native(), # XLM
+                            amount=str(milestone['amount']),
+                            claimants=[
+                                Claimant(
+                                    destination=project['contributor_account_pk'],
+                                    predicate=ClaimPredicate.predicate_unconditional()
+                                )
+                            ]
+                        )
+                    )
+                    .set_timeout(300)
+                    .build()
+                )
+            sign_many(transactions, tag="fund_milestones", network_passphrase=get_network_passphrase())
+            st.session_state.pending_tx_action = {
+                "action": "fund_milestones",
+                "project_id": project["id"],
+                "milestone_indexes": list(milestone_indexes)
+            }
+            st.info(f"Please approve the {len(transactions)} transactions in Freighter to fund these milestones.")
+        except NotFoundError:
+            st.error(f"Funder account {st.session_state.public_key} not found or insufficient balance.")
+        except Exception as e:
+            st.error(f"Error funding milestones: {e}")
+
+# Both run before any UI is drawn, so the sidebar and views already show their results without a rerun
 handle_freighter_response() # Process any new response
+settle_pending_submission()
+# Projects outlive the tab: restored for this wallet after a reload, once it signs a challenge (see core.persistence)
+persist(
+    st.session_state.public_key,
+    ("projects",),
+    namespace=f"projects_{st.session_state.network}",
+    exclude=("project_account_sk",), # Project secrets stay in this session only
+    network_passphrase=get_network_passphrase(),
+)
 
 # --- Streamlit UI Components ---
 
+@static_section # Same for every visitor: rendered once, replayed after that (see core.sections)
+def sidebar_footer():
+    st.sidebar.markdown("""
+        <div class="footer">
+            Built with Streamlit & Stellar SDK<br>
+            Powered by Freighter
+        </div>
+    """, unsafe_allow_html=True)
+    st.sidebar.markdown("""
+        <div class="disclaimer">
+            ⚠️ <strong>Disclaimer:</strong> This is a demo dApp. Project account secret keys are stored in session state for demonstration purposes only. This is HIGHLY INSECURE and NOT SUITABLE for production environments. A real dApp would use multi-sig, a secure backend, or Soroban smart contracts.
+        </div>
+    """, unsafe_allow_html=True)
+
 def sidebar():
     st.sidebar.image("https://www.stellar.org/img/logos/stellar-logo-white-mark.svg", width=50) # Placeholder logo
     st.sidebar.title("NexusFlow 🚀")
@@ -476,7 +510,7 @@ def sidebar():
     if selected_network != st.session_state.network:
         st.session_state.network = selected_network
         st.session_state.horizon_server = get_horizon_server()
-        st.session_state.balances = {} # Clear balances on network change
+        st.session_state.balances = LRUDict(MAX_CACHED_BALANCES) # Clear balances on network change
         st.info(f"Switched to {st.session_state.network.capitalize()}")
         st.rerun()
 
@@ -486,7 +520,7 @@ def sidebar():
     st.sidebar.subheader("Wallet Status")
     if not st.session_state.is_connected:
         if st.sidebar.button("Connect Freighter Wallet", key="connect_freighter_button"):
-            send_message_to_js("CONNECT_FREIGHTER")
+            connect()
             st.sidebar.info("Awaiting Freighter connection...")
     else:
         st.sidebar.success(f"Connected: {st.session_state.public_key[:8]}...")
@@ -522,17 +556,7 @@ def sidebar():
             st.rerun()
 
     st.sidebar.markdown("---")
-    st.sidebar.markdown("""
-        <div class="footer">
-            Built with Streamlit & Stellar SDK<br>
-            Powered by Freighter
-        </div>
-    """, unsafe_allow_html=True)
-    st.sidebar.markdown("""
-        <div class="disclaimer">
-            ⚠️ <strong>Disclaimer:</strong> This is a demo dApp. Project account secret keys are stored in session state for demonstration purposes only. This is HIGHLY INSECURE and NOT SUITABLE for production environments. A real dApp would use multi-sig, a secure backend, or Soroban smart contracts.
-        </div>
-    """, unsafe_allow_html=True)
+    sidebar_footer()
 
 def dashboard_view():
     st.title("NexusFlow Dashboard")
@@ -592,7 +616,7 @@ def dashboard_view():
                                 .build()
                             )
                             xdr = transaction.to_xdr()
-                            send_message_to_js("SIGN_TX", xdr=xdr, networkPassphrase=get_network_passphrase())
+                            sign(xdr, network_passphrase=get_network_passphrase())
                             st.session_state.pending_tx_action = {
                                 "action": "create_project_account",
                                 "project_id": new_project["id"]
@@ -615,15 +639,19 @@ def dashboard_view():
             active_projects = [p for p in st.session_state.projects if p["status"] not in ["completed", "archived"]]
             if not active_projects:
                 st.info("No active projects. All projects are either completed or archived.")
+            # One batched round trip for every project account on the dashboard
+            refresh_balances([p["project_account_pk"] for p in active_projects])
             for project in active_projects:
                 status_class = project["status"].replace("_", "-")
+                project_xlm = st.session_state.balances.get(project["project_account_pk"], {}).get("XLM", 0)
                 st.markdown(
                     f"""
                     <div class="project-card" onclick="window.parent.postMessage({{streamlit: true, type: 'streamlit_callback', payload: {{action: 'select_project', project_id: '{project['id']}'}}}}, '*')">
                         <h3>{project['name']} <span class="project-status status-{status_class}">{project['status'].replace('_', ' ').title()}</span></h3>
                         <p>{project['description'][:100]}...</p>
                         <small>Funder: {project['funder_account_pk'][:8]}...</small><br>
-                        <small>Contributor: {project['contributor_account_pk'][:8]}...</small>
+                        <small>Contributor: {project['contributor_account_pk'][:8]}...</small><br>
+                        <small>Project Account: {project_xlm:,.2f} XLM</small>
                     </div>
                     """,
                     unsafe_allow_html=True
@@ -707,6 +735,10 @@ def project_detail_view(project_id):
         if not project["milestones"]:
             st.info("No milestones defined for this project yet.")
         else:
+            pending_indexes = [i for i, m in enumerate(project["milestones"]) if m["status"] == "pending"]
+            if st.session_state.public_key == project['funder_account_pk'] and len(pending_indexes) > 1:
+                if st.button(f"Fund All {len(pending_indexes)} Pending Milestones", key="fund_all_milestones"):
+                    fund_milestones(project, pending_indexes)
             for i, milestone in enumerate(project["milestones"]):
                 milestone_status_class = milestone["status"].replace("_", "-")
                 st.markdown(
@@ -756,7 +788,7 @@ def project_detail_view(project_id):
                                     .build()
                                 )
                                 xdr = transaction.to_xdr()
-                                send_message_to_js("SIGN_TX", xdr=xdr, networkPassphrase=get_network_passphrase())
+                                sign(xdr, network_passphrase=get_network_passphrase())
                                 st.session_state.pending_tx_action = {
                                     "action": "fund_milestone",
                                     "project_id": project["id"],
@@ -831,7 +863,7 @@ def project_detail_view(project_id):
                                     .build()
                                 )
                                 xdr = transaction.to_xdr()
-                                send_message_to_js("SIGN_TX", xdr=xdr, networkPassphrase=get_network_passphrase())
+                                sign(xdr, network_passphrase=get_network_passphrase())
                                 st.session_state.pending_tx_action = {
                                     "action": "claim_milestone",
                                     "project_id": project["id"],
@@ -903,8 +935,7 @@ def project_detail_view(project_id):
                                        f"<a href='https://testnet.stellarexplorer.org/tx/{tx_result['hash']}' target='_blank' class='tx-hash-link'>"
                                        f"{tx_result['hash'][:10]}...</a>", unsafe_allow_html=True)
                             project["status"] = "archived"
-                            fetch_account_balances(funder_pk) # Update funder's balance
-                            fetch_account_balances(project['project_account_pk']) # Should be 0 after merge
+                            refresh_balances([funder_pk, project['project_account_pk']]) # Project account is gone after merge
                             st.rerun()
 
                         except NotFoundError:
@@ -946,6 +977,7 @@ def main():
             """,
             unsafe_allow_html=True
         )
+    bridge() # The Freighter wallet component, after every button that queues a request
 
 if __name__ == "__main__":
     main()
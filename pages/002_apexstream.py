@@ -17,13 +17,18 @@ from stellar_sdk.operation import (
     SetOptions
 )
 from stellar_sdk.exceptions import BadRequestError, BadSignatureError
+from core.horizon import get_server
+from core.memory import session_budget
+from core.sections import static_section
+from core.styles import inject_css
+from core.wallet import CONNECT, bridge, connect, sign, wallet_result
 import json
 import base64
 import asyncio
-import streamlit.components.v1 as components 
+
+session_budget(caps={"streamlit_messages": 50}) # Before anything reads st.session_state (see core.memory)
 
 # --- Configuration ---
-HORIZON_TESTNET = "https://horizon-testnet.stellar.org"
 HORIZON_PUBLIC = "https://horizon.stellar.org"
 NETWORK_PASSPHRASE_TESTNET = Network.TESTNET_NETWORK_PASSPHRASE
 NETWORK_PASSPHRASE_PUBLIC = Network.PUBLIC_NETWORK_PASSPHRASE
@@ -44,7 +49,7 @@ if 'query_params_processed' not in st.session_state:
 
 # --- Custom CSS for Minimalist, High-Contrast, Futuristic Style ---
 def apply_custom_css():
-    st.markdown("""
+    inject_css("""
     <style>
         @import url('https://fonts.googleapis.com/css2?family=IBM+Plex+Mono:wght@400;600&family=Orbitron:wght@400;600&display=swap');
 
@@ -262,12 +267,12 @@ def apply_custom_css():
         }
 
     </style>
-    """, unsafe_allow_html=True)
+    """)
 
 # --- Stellar Helper Functions ---
 def get_horizon_server():
     if st.session_state.network == 'Testnet':
-        return Server(HORIZON_TESTNET)
+        return get_server()
     else:
         return Server(HORIZON_PUBLIC)
 
@@ -303,73 +308,6 @@ async def fetch_account_balances(public_key):
         st.error(f"⚠️ Error fetching account balances: {e}")
         return {}
 
-# --- Freighter Integration (st.components.v1.html) ---
-# This component uses window.streamlitReportMessage which is how JS communicates back to Streamlit.
-# We embed the JS directly in the HTML component.
-FREIGHTER_JS = """
-<script>
-    window.onload = function() {
-        const connectButton = document.getElementById('connectFreighter');
-        if (connectButton) {
-            connectButton.onclick = async () => {
-                try {
-                    if (window.freighterApi) {
-                        const publicKey = await window.freighterApi.getPublicKey();
-                        window.streamlitReportMessage({ type: 'publicKey', data: publicKey });
-                    } else {
-                        window.streamlitReportMessage({ type: 'error', data: 'Freighter not detected! Please ensure Freighter wallet is installed and unlocked.' });
-                    }
-                } catch (error) {
-                    window.streamlitReportMessage({ type: 'error', data: error.message });
-                }
-            };
-        }
-
-        window.signTransaction = async (xdr, network) => {
-            try {
-                if (window.freighterApi) {
-                    const signedXdr = await window.freighterApi.signTransaction(xdr, { network: network });
-                    window.streamlitReportMessage({ type: 'signedXdr', data: signedXdr });
-                } else {
-                    window.streamlitReportMessage({ type: 'error', data: 'Freighter not detected! Please ensure Freighter wallet is installed and unlocked.' });
-                }
-            } catch (error) {
-                window.streamlitReportMessage({ type: 'error', data: error.message });
-            }
-        };
-
-        // This is important: tell Streamlit the component is ready
-        window.streamlitReportReady();
-    };
-</script>
-<button id="connectFreighter" style="display: none;"></button>
-"""
-
-def freighter_component_embed():
-    """
-    Renders a hidden component that allows JavaScript to interact with Freighter
-    and send messages back to Streamlit. This should be called once.
-    """
-    components.html(FREIGHTER_JS, height=0, width=0)
-
-# Function to call JS from Python
-def call_js_function(js_function_name, *args):
-    """
-    Injects JavaScript to call a function defined in the embedded component.
-    """
-    args_str = ', '.join(f"'{arg}'" if isinstance(arg, str) else str(arg) for arg in args)
-    js_code = f"""
-        <script>
-            if (window.{js_function_name}) {{
-                window.{js_function_name}({args_str});
-            }} else {{
-                console.error("JavaScript function {js_function_name} not found.");
-            }}
-        </script>
-    """
-    components.html(js_code, height=0, width=0)
-
-
 # --- Streamlit UI ---
 st.set_page_config(
     page_title="ApexStream dApp",
@@ -380,46 +318,36 @@ st.set_page_config(
 
 apply_custom_css()
 
-# Embed the Freighter component early to ensure its JS is loaded
-freighter_component_embed()
-
-# Process messages from JavaScript that might have come in previous reruns
-rerun_needed = False
+# Turn what the Freighter wallet bridge (rendered at the end of the page) brought back into messages
+response = wallet_result()
+if response is not None and "error" in response:
+    st.session_state.streamlit_messages.append({'type': 'error', 'data': response['error']})
+elif response is not None and response['action'] == CONNECT:
+    st.session_state.streamlit_messages.append({'type': 'publicKey', 'data': response['public_key']})
+elif response is not None:
+    st.session_state.streamlit_messages.append({'type': 'signedXdr', 'data': response['signed_xdr']})
+
+# Process messages from the bridge. This runs before anything that shows the
+# connection or the signed XDR is drawn, so the batch never needs a rerun.
 for message in st.session_state.streamlit_messages:
     if message['type'] == 'publicKey':
         st.session_state.public_key = message['data']
         st.success("Freighter connected successfully!")
-        rerun_needed = True
     elif message['type'] == 'signedXdr':
         st.session_state.signed_xdr = message['data']
         st.session_state.show_signed_xdr = True
         st.success("Transaction signed successfully by Freighter!")
-        rerun_needed = True # Rerun to display signed XDR
     elif message['type'] == 'error':
         st.error(f"Freighter Error: {message['data']}")
         st.session_state.public_key = None # Clear key on error
         st.session_state.signed_xdr = None
         st.session_state.show_signed_xdr = False
-        rerun_needed = True
 # Clear messages AFTER processing them for the current run
 st.session_state.streamlit_messages = []
 
-if rerun_needed:
-    st.rerun()
-
 
-# Sidebar for network selection and general info
-with st.sidebar:
-    st.markdown("## ⚙️ Settings")
-    st.session_state.network = st.radio(
-        "Select Network",
-        ('Testnet', 'Public'),
-        index=0 if st.session_state.network == 'Testnet' else 1,
-        key='network_selector',
-        help="Choose between Stellar Testnet and Public Network."
-    )
-
-    st.markdown("---")
+@static_section # Same for every visitor: rendered once, replayed after that (see core.sections)
+def about_apexstream():
     st.markdown("## 🛟 About ApexStream")
     st.markdown("""
         ApexStream is a decentralized financial automation platform.
@@ -437,6 +365,21 @@ with st.sidebar:
         - Manage Trustlines & Account Options
     """)
 
+
+# Sidebar for network selection and general info
+with st.sidebar:
+    st.markdown("## ⚙️ Settings")
+    st.session_state.network = st.radio(
+        "Select Network",
+        ('Testnet', 'Public'),
+        index=0 if st.session_state.network == 'Testnet' else 1,
+        key='network_selector',
+        help="Choose between Stellar Testnet and Public Network."
+    )
+
+    st.markdown("---")
+    about_apexstream()
+
 # Main Title
 st.markdown("<h1><span style='color:var(--accent-color);'>Apex</span>Stream 🧬</h1>", unsafe_allow_html=True)
 st.markdown("### Decentralized Financial Automation for Stellar")
@@ -455,21 +398,21 @@ with col1:
     else:
         st.warning("⚠️ Not connected to Freighter.")
         if st.button("🚀 Connect Freighter", key="connect_button"):
-            call_js_function('connectToFreighter')
+            connect()
             st.info("Awaiting Freighter connection...")
-            # No rerun here, waiting for JS to report back will trigger one if successful.
+            # No rerun here; the bridge's answer triggers one.
 
 
 # Function to encapsulate XDR signing and display
-# This function no longer needs to poll, as the message handler above will set session_state.signed_xdr and trigger a rerun.
+# This function does not need to poll: the bridge's answer becomes a message above, which sets session_state.signed_xdr.
 async def sign_and_display_xdr(transaction_xdr, network_name):
     # Clear previous signed XDR state
     st.session_state.signed_xdr = None
     st.session_state.show_signed_xdr = False
 
     st.info("Awaiting transaction signing by Freighter...")
-    call_js_function('signTransaction', transaction_xdr, network_name.lower())
-    # The next Streamlit rerun (triggered by JS message) will display the result
+    sign(transaction_xdr, network_passphrase=get_network_passphrase())
+    # The next Streamlit rerun (triggered by the bridge) will display the result
 
 # --- Account Balances ---
 if st.session_state.public_key:
@@ -941,3 +884,5 @@ st.markdown(
     """,
     unsafe_allow_html=True
 )
+
+bridge() # The Freighter wallet component, after every button that queues a request
@@ -2,13 +2,19 @@ import streamlit as st
 from streamlit.components.v1 import html
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset, ManageData, ChangeTrust, Payment, Clawback, CreateClaimableBalance, ClaimClaimableBalance, PathPaymentStrictReceive, Claimant, ClaimPredicate
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.balances import balance_metrics
+from core.horizon import HORIZON_URL as TESTNET_HORIZON_URL, get_server
+from core.memory import session_budget
+from core.styles import inject_css
 import json
 import time 
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- Configuration ---
 # Set to 'TESTNET' or 'PUBLIC'
 CURRENT_NETWORK = "TESTNET" 
-HORIZON_URL = "https://horizon-testnet.stellar.org" if CURRENT_NETWORK == "TESTNET" else "https://horizon.stellar.org"
+HORIZON_URL = TESTNET_HORIZON_URL if CURRENT_NETWORK == "TESTNET" else "https://horizon.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE if CURRENT_NETWORK == "TESTNET" else Network.PUBLIC_NETWORK_PASSPHRASE
 
 # Pre-defined issuer for demonstration purposes
@@ -18,11 +24,11 @@ ISSUER_PUBLIC_KEY = st.session_state.ISSUER_KEYPAIR.public_key
 ISSUER_SECRET_KEY = st.session_state.ISSUER_KEYPAIR.secret
 
 # Initialize Stellar server
-server = Server(horizon_url=HORIZON_URL)
+server = get_server() if CURRENT_NETWORK == "TESTNET" else Server(horizon_url=HORIZON_URL)
 
 # --- Custom CSS for Futuristic, High-Contrast, Minimalist Style ---
 def apply_custom_css():
-    st.markdown(
+    inject_css(
         """
         <style>
             @import url('https://fonts.googleapis.com/css2?family=Orbitron:wght@400;700&family=Fira+Code:wght@400;700&display=swap');
@@ -204,8 +210,7 @@ def apply_custom_css():
                 overflow-x: auto;
             }
         </style>
-        """,
-        unsafe_allow_html=True
+        """
     )
 
 # --- Freighter JavaScript Component ---
@@ -399,25 +404,12 @@ def main():
     account_info = get_account_details(user_pk)
 
     if account_info:
-        col1, col2, col3 = st.columns(3)
-        native_balance = "0 XLM"
-        funded_assets_count = 0
-        data_entry_count = 0
-
-        for balance in account_info.balances:
-            if balance.asset_type == "native":
-                native_balance = f"{float(balance.balance):,.2f} XLM"
-            else:
-                funded_assets_count += 1
-        
-        data_entry_count = len(account_info.data)
-
-        with col1:
-            st.metric("XLM Balance 💰", native_balance)
-        with col2:
-            st.metric("Funded Assets 💎", funded_assets_count)
-        with col3:
-            st.metric("Data Entries 📜", data_entry_count)
+        # Refreshes itself every few seconds; the rest of the dashboard does not rerun for it
+        balance_metrics(user_pk, [
+            ("XLM Balance 💰", "XLM", "{:,.2f} XLM"),
+            ("Funded Assets 💎", lambda account: sum(1 for b in account["balances"] if b["asset_type"] != "native"), "{}"),
+            ("Data Entries 📜", lambda account: len(account.get("data", {})), "{}"),
+        ])
 
         with st.expander("Full Account Details (JSON) 📝"):
             st.json(account_info._response)
@@ -2,19 +2,23 @@ import streamlit as st
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.horizon import get_server
+from core.memory import session_budget
+from core.styles import inject_css
 import json
 import time
 import uuid 
 import streamlit.components.v1 as components
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- Constants ---
-HORIZON_URL = "https://horizon-testnet.stellar.org" 
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
-SERVER = Server(HORIZON_URL)
+SERVER = get_server()
 
 # --- Custom CSS ---
 def apply_custom_css():
-    st.markdown(
+    inject_css(
         """
         <style>
         html, body, [class*="stApp"] { background-color: #0d1117; color: #e6edf3; font-family: 'Segoe UI', sans-serif; }
@@ -23,8 +27,7 @@ def apply_custom_css():
         .stTextInput>div>div>input { background-color: #1a1f26; color: #e6edf3; border: 1px solid #282c34; }
         .stAlert { background-color: #1a1f26; border: 1px solid #282c34; color: #e6edf3; border-radius: 6px; }
         </style>
-        """,
-        unsafe_allow_html=True
+        """
     )
 
 # --- Session State ---
@@ -2,21 +2,25 @@ import streamlit as st
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.horizon import get_server
+from core.memory import session_budget
+from core.styles import inject_css
 import json
 import time
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- Configuration ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 
 # --- Custom CSS ---
-st.markdown("""
+inject_css("""
 <style>
 body { font-family: 'Open Sans', sans-serif; background-color: #f0f8ff; }
 h1, h2 { font-family: 'Fredoka One', cursive; color: #4CAF50; }
 .stButton>button { background-color: #FFD700; color: #8B4513; border-radius: 25px; border: 2px solid #DAA520; }
 </style>
-""", unsafe_allow_html=True)
+""")
 
 # --- Sidebar Info ---
 st.sidebar.info("🌱 **Stellar Seedlings**\n\nNurture digital flora in a gamified garden.")
@@ -50,10 +54,6 @@ GROW_FUND_PUBLIC_KEY = GROW_FUND_KEYPAIR.public_key
 SEEDLING_ASSET = Asset("SEEDLING", SEEDLING_ISSUER_PUBLIC_KEY)
 
 # --- Helper Functions ---
-@st.cache_resource
-def get_server():
-    return Server(HORIZON_URL)
-
 def get_account_details(public_key):
     try:
         return get_server().load_account(public_key)
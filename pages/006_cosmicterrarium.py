@@ -1,9 +1,15 @@
 import streamlit as st
-import streamlit.components.v1 as components
 
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.horizon import get_server
+from core.memory import session_budget
+from core.styles import inject_css
+from core.wallet import bridge
+from core.wallet_flow import CONNECTED, FAILED, SIGNING, SUBMITTING, SUCCESS, WalletFlow
+
+session_budget() # Before anything reads st.session_state (see core.memory)
 
 # --- CRITICAL IMPORTS MANDATE CHECK ---
 # import stellar_sdk (DONE)
@@ -14,7 +20,6 @@ from stellar_sdk.exceptions import BadRequestError, NotFoundError
 # --- END MANDATE CHECK ---
 
 # --- CONFIGURATION ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 
 APP_NAME = "Cosmic_Terrarium 🌌"
@@ -22,8 +27,8 @@ APP_CONCEPT = "Cultivate unique, evolving digital flora (NFT-like assets) using
 # --- END CONFIGURATION ---
 
 # --- STELLAR SERVER RULES MANDATE CHECK ---
-# Use 'Server(HORIZON_URL)' only. NEVER pass 'timeout' to Server(). (DONE)
-server = Server(HORIZON_URL)
+# Use 'get_server()' only. NEVER pass 'timeout' to Server(). (DONE)
+server = get_server()
 # Access operations via module: 'stellar_sdk.ChangeTrust(...)'. (WILL DO IN OPERATIONS)
 # --- END MANDATE CHECK ---
 
@@ -130,7 +135,7 @@ custom_css = """
     }
 </style>
 """
-st.markdown(custom_css, unsafe_allow_html=True)
+inject_css(custom_css)
 
 # --- SESSION STATE INITIALIZATION ---
 if "freighter_connected" not in st.session_state:
@@ -159,6 +164,15 @@ except ValueError:
     st.stop()
 # --- END MANDATE CHECK ---
 
+# --- Freighter flow: advanced before the sidebar shows it, so no step needs a rerun ---
+flow = WalletFlow()
+flow_event = flow.advance()
+if flow_event is not None and flow_event["state"] == CONNECTED:
+    st.session_state.user_public_key = flow_event["public_key"]
+    st.session_state.freighter_connected = True
+elif flow_event is not None and flow_event["state"] == SUCCESS:
+    st.session_state.current_terrarium_status = flow_event["terrarium_status"]
+
 # --- SIDEBAR MANDATE CHECK ---
 # At the very top of the sidebar, display the App Name and Concept
 st.sidebar.info(f"### {APP_NAME}\n\n{APP_CONCEPT}")
@@ -178,10 +192,6 @@ st.sidebar.markdown(f"**Flora Issuer Key:** `{flora_keypair.public_key[:8]}...{f
 st.sidebar.markdown(f"**Current Terrarium Status:**\n_{st.session_state.current_terrarium_status}_")
 
 # --- HELPER FUNCTIONS ---
-def update_terrarium_status(message):
-    st.session_state.current_terrarium_status = message
-    st.experimental_rerun() # Rerun to update sidebar display
-
 def fetch_account_details(public_key):
     try:
         account = server.load_account(public_key)
@@ -193,80 +203,6 @@ def fetch_account_details(public_key):
         st.error(f"Error fetching account details: {e}")
         return None
 
-def submit_stellar_transaction(signed_xdr):
-    try:
-        tx_result = server.submit_transaction(signed_xdr)
-        st.success(f"Transaction successful! Hash: `{tx_result['hash']}`")
-        st.balloons()
-        return True
-    except BadRequestError as e:
-        st.error(f"Transaction failed (Bad Request): {e.extras.get('result_codes', 'No result codes available')}")
-        st.exception(e)
-        return False
-    except Exception as e:
-        st.error(f"An unexpected error occurred during transaction submission: {e}")
-        st.exception(e)
-        return False
-
-# --- FREIGHTER INTEGRATION ---
-# JS to interact with Freighter
-freighter_js = f"""
-<script src="https://unpkg.com/@stellar/freighter-api@latest/build/freighter.min.js"></script>
-<script>
-    async function connectFreighter() {{
-        if (window.freighterApi) {{
-            try {{
-                const publicKey = await window.freighterApi.getPublicKey();
-                window.parent.postMessage({{
-                    type: "streamlit:setComponentValue",
-                    args: {{ publicKey: publicKey }}
-                }}, "*");
-            }} catch (error) {{
-                console.error("Freighter connection error:", error);
-                window.parent.postMessage({{
-                    type: "streamlit:setComponentValue",
-                    args: {{ publicKeyError: error.message }}
-                }}, "*");
-            }}
-        }} else {{
-            window.parent.postMessage({{
-                type: "streamlit:setComponentValue",
-                args: {{ publicKeyError: "Freighter not detected. Please install it." }}
-            }}, "*");
-        }}
-    }}
-
-    async function signTransaction(xdr, network, public_key) {{
-        if (window.freighterApi) {{
-            try {{
-                const signedXDR = await window.freighterApi.signTransaction(xdr, {{ network, accountToSign: public_key }});
-                window.parent.postMessage({{
-                    type: "streamlit:setComponentValue",
-                    args: {{ signedXDR: signedXDR }}
-                }}, "*");
-            }} catch (error) {{
-                console.error("Freighter signing error:", error);
-                window.parent.postMessage({{
-                    type: "streamlit:setComponentValue",
-                    args: {{ signedXDRError: error.message }}
-                }}, "*");
-            }}
-        }} else {{
-            window.parent.postMessage({{
-                type: "streamlit:setComponentValue",
-                args: {{ signedXDRError: "Freighter not detected." }}
-            }}, "*");
-        }}
-    }}
-</script>
-"""
-# --- HTML COMPONENT RULES MANDATE CHECK ---
-# ALWAYS use: 'import streamlit.components.v1 as components' (DONE)
-# ALWAYS call: 'components.html(...)'.
-# NEVER call 'html(...)' directly from 'streamlit'. (DONE)
-components.html(freighter_js, height=0)
-# --- END MANDATE CHECK ---
-
 # --- MAIN APP LAYOUT ---
 st.title(f"{APP_NAME} 🪴")
 st.markdown("---")
@@ -278,26 +214,18 @@ st.write("Connect your Stellar wallet via Freighter to interact with your Cosmic
 col1_conn, col2_conn = st.columns([1, 2])
 with col1_conn:
     if st.button("Connect Freighter Wallet"):
-        components.html("<script>connectFreighter();</script>", height=0)
+        flow.connect() # Answered by the wallet bridge at the end of the page
 
-# --- STRICTLY USE 'st.query_params' MANDATE CHECK ---
-# NO 'st.experimental_get_query_params' (DONE, using st.query_params directly)
-query_params = st.query_params
-# --- END MANDATE CHECK ---
-
-if "publicKey" in query_params:
-    st.session_state.user_public_key = query_params["publicKey"]
-    st.session_state.freighter_connected = True
+# --- Freighter results, applied by the wallet flow before the sidebar rendered ---
+if flow_event is not None and flow_event["state"] == CONNECTED:
     st.success(f"Connected with Public Key: `{st.session_state.user_public_key}`")
-    # Clear the query param to avoid re-processing on refresh
-    del query_params["publicKey"]
-    st.experimental_set_query_params(**query_params) # Clear from URL
-    st.experimental_rerun() # Rerun to update the session state and UI
-
-if "publicKeyError" in query_params:
-    st.error(f"Freighter Connection Error: {query_params['publicKeyError']}")
-    del query_params["publicKeyError"]
-    st.experimental_set_query_params(**query_params) # Clear from URL
+elif flow_event is not None and flow_event["state"] == SUCCESS:
+    st.success(f"Transaction successful! Hash: `{flow_event['hash']}`")
+    st.balloons()
+elif flow_event is not None and flow_event["state"] == FAILED and flow_event.get("tickets"):
+    st.error(f"Transaction failed: {flow_event['error']}")
+elif flow_event is not None and flow_event["state"] == FAILED:
+    st.error(f"Freighter Error: {flow_event['error']}")
 
 st.markdown("---")
 
@@ -336,8 +264,10 @@ if st.session_state.freighter_connected and st.session_state.user_public_key:
                             .build()
                         )
                         xdr = transaction.to_xdr()
-                        components.html(f"<script>signTransaction('{xdr}', '{Network.TESTNET_NETWORK_PASSPHRASE}', '{st.session_state.user_public_key}');</script>", height=0)
-                        st.session_state.tx_in_progress = "nourish"
+                        flow.sign(
+                            xdr, tag="nourish", address=st.session_state.user_public_key,
+                            terrarium_status=f"Your flora received {nourish_amount} XLM! It's thriving! 📈",
+                        )
                         st.info("Awaiting Freighter signature for nourishment...")
                     except Exception as e:
                         st.error(f"Failed to build nourishment transaction: {e}")
@@ -378,8 +308,10 @@ if st.session_state.freighter_connected and st.session_state.user_public_key:
                         .build()
                     )
                     xdr = transaction.to_xdr()
-                    components.html(f"<script>signTransaction('{xdr}', '{Network.TESTNET_NETWORK_PASSPHRASE}', '{st.session_state.user_public_key}');</script>", height=0)
-                    st.session_state.tx_in_progress = "changetrust"
+                    flow.sign(
+                        xdr, tag="changetrust", address=st.session_state.user_public_key,
+                        terrarium_status=f"New {selected_spore_name} spores successfully transplanted! Watch them grow! ✨",
+                    )
                     st.info(f"Awaiting Freighter signature to transplant {selected_spore_name}...")
                 except Exception as e:
                     st.error(f"Failed to build ChangeTrust transaction: {e}")
@@ -412,8 +344,10 @@ if st.session_state.freighter_connected and st.session_state.user_public_key:
                             .build()
                         )
                         xdr = transaction.to_xdr()
-                        components.html(f"<script>signTransaction('{xdr}', '{Network.TESTNET_NETWORK_PASSPHRASE}', '{st.session_state.user_public_key}');</script>", height=0)
-                        st.session_state.tx_in_progress = "setoptions_home_domain"
+                        flow.sign(
+                            xdr, tag="setoptions_home_domain", address=st.session_state.user_public_key,
+                            terrarium_status="Terrarium environment successfully terraformed! 🏗️",
+                        )
                         st.info("Awaiting Freighter signature to set home domain...")
                     except Exception as e:
                         st.error(f"Failed to build Set Home Domain transaction: {e}")
@@ -441,39 +375,18 @@ if st.session_state.freighter_connected and st.session_state.user_public_key:
                                 .build()
                             )
                             xdr = transaction.to_xdr()
-                            components.html(f"<script>signTransaction('{xdr}', '{Network.TESTNET_NETWORK_PASSPHRASE}', '{st.session_state.user_public_key}');</script>", height=0)
-                            st.session_state.tx_in_progress = "setoptions_data_entry"
+                            flow.sign(
+                                xdr, tag="setoptions_data_entry", address=st.session_state.user_public_key,
+                                terrarium_status="Terrarium environment successfully terraformed! 🏗️",
+                            )
                             st.info(f"Awaiting Freighter signature to add data entry '{data_name}'...")
                         except Exception as e:
                             st.error(f"Failed to build Manage Data transaction: {e}")
                     else:
                         st.warning("Please provide both data entry name and value.")
 
-        # --- Process Signed Transaction Results from Freighter ---
-        if "signedXDR" in query_params and st.session_state.tx_in_progress:
-            signed_xdr = query_params["signedXDR"]
-            operation_type = st.session_state.tx_in_progress
-
-            st.write(f"Freighter signed the transaction! Submitting {operation_type}...")
-            if submit_stellar_transaction(signed_xdr):
-                if operation_type == "nourish":
-                    update_terrarium_status(f"Your flora received {nourish_amount} XLM! It's thriving! 📈")
-                elif operation_type == "changetrust":
-                    update_terrarium_status(f"New {selected_spore_name} spores successfully transplanted! Watch them grow! ✨")
-                elif operation_type.startswith("setoptions"):
-                    update_terrarium_status(f"Terrarium environment successfully terraformed! 🏗️")
-            
-            # Clear query params and state
-            del query_params["signedXDR"]
-            st.session_state.tx_in_progress = None
-            st.experimental_set_query_params(**query_params)
-            st.experimental_rerun() # Rerun to update the terrarium status and clear info message
-
-        if "signedXDRError" in query_params:
-            st.error(f"Freighter Signing Error: {query_params['signedXDRError']}")
-            st.session_state.tx_in_progress = None # Clear any pending tx state
-            del query_params["signedXDRError"]
-            st.experimental_set_query_params(**query_params)
+        # --- Transaction progress; only this region reruns while the ledger closes ---
+        flow.progress(messages={SIGNING: None, SUBMITTING: "⏳ Submitting your transaction to the Stellar network..."})
 
         st.markdown("---")
         st.subheader("Your Flora's Current Balances 🌿")
@@ -493,4 +406,5 @@ else:
     st.info("Please connect your Freighter wallet to start cultivating your Cosmic Terrarium.")
 
 st.markdown("---")
-st.caption(f"Powered by Stellar & Streamlit. Developed for educational purposes. All transactions on Testnet.")
\ No newline at end of file
+st.caption(f"Powered by Stellar & Streamlit. Developed for educational purposes. All transactions on Testnet.")
+bridge() # The Freighter wallet component, after every button that queues a request
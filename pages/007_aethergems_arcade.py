@@ -10,9 +10,17 @@ import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.demo import lease_demo_secret
+from core.flows import FlowPlan
+from core.horizon import FRIENDBOT_URL, get_server
+from core.memory import session_budget
+from core.sequences import load_source_account, submit_transaction as submit_to_horizon
+from core.styles import inject_css
+from core.templates import template
+
+session_budget() # Before anything reads st.session_state (see core.memory)
 
 # --- CONFIGURATION ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 
 # AetherGem Asset details
@@ -22,8 +30,8 @@ AETHERGEM_CODE = "AGEM" # The code for the AetherGem custom asset
 
 def load_stellar_server():
     """Loads and returns the Stellar Horizon server instance."""
-    # STELLAR SERVER RULES: Use 'Server(HORIZON_URL)' only. NEVER pass 'timeout' to Server().
-    return Server(HORIZON_URL)
+    # STELLAR SERVER RULES: Use 'get_server()' only. NEVER pass 'timeout' to Server().
+    return get_server()
 
 def get_issuer_keypair():
     """
@@ -37,22 +45,11 @@ def get_issuer_keypair():
         key = st.secrets["ISSUER_KEY"]
     else:
         if "demo_key" not in st.session_state:
-            st.session_state.demo_key = Keypair.random().secret
-            # --- Friendbot Funding for Demo Key (Essential for functional demo) ---
-            # Note: This is a network request and might take a moment.
-            # In a production app, this would be managed differently.
-            try:
-                friendbot_url = f"https://friendbot.stellar.org/?addr={Keypair.from_secret(st.session_state.demo_key).public_key}"
-                import requests
-                response = requests.get(friendbot_url)
-                if response.status_code != 200:
-                    st.error(f"Friendbot funding failed for demo key: {response.text}")
-            except Exception as e:
-                st.error(f"Friendbot funding exception: {e}")
+            # Pre-funded, from the demo account pool (no friendbot wait)
+            st.session_state.demo_key = lease_demo_secret()
 
         key = st.session_state.demo_key
         st.sidebar.warning("⚠️ Using Ephemeral Demo Keys for AetherGem Issuer/Collector.")
-        st.sidebar.caption("💡 Friendbot funding might be requested for the demo key upon first load.")
     return Keypair.from_secret(key)
 
 # Initialize issuer keypair and public key once
@@ -66,7 +63,7 @@ st.set_page_config(layout="wide", page_title="AetherGems Arcade 👾")
 
 # Custom CSS for style "Retro/Pixel-Art"
 # MANDATE 3: Custom CSS for style "Retro/Pixel-Art"
-st.markdown(
+inject_css(
     """
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Press+Start+2P&display=swap');
@@ -230,8 +227,7 @@ st.markdown(
         transform: translate(2px, 2px);
     }
     </style>
-    """,
-    unsafe_allow_html=True
+    """
 )
 
 # MANDATE 10: SIDEBAR MANDATE: App Name and Concept at the very top.
@@ -276,7 +272,7 @@ components.html(FREIGHTER_COMPONENT_JS, height=0, width=0) # Hidden component
 
 # --- Stellar Helper Functions ---
 
-# MANDATE 8: STELLAR SERVER RULES: Server(HORIZON_URL) only.
+# MANDATE 8: STELLAR SERVER RULES: get_server() only.
 server = load_stellar_server()
 
 def get_account_data(public_key):
@@ -324,7 +320,7 @@ def get_account_data(public_key):
 def submit_transaction(transaction_xdr):
     """Submits a signed transaction to the Stellar network."""
     try:
-        response = server.submit_transaction(transaction_xdr)
+        response = submit_to_horizon(transaction_xdr)
         st.session_state.tx_status = f"✅ Transaction successful! Hash: {response['hash']}"
         st.success(f"Transaction successful! Hash: {response['hash']}")
         st.expander("Transaction Details").json(response) # MANDATE 6: Use st.expander
@@ -346,88 +342,37 @@ def submit_transaction(transaction_xdr):
 # --- Transaction Builders ---
 # MANDATE 8: Access operations via module: 'stellar_sdk.ChangeTrust(...)'.
 
-def build_trustline_tx(user_public_key):
-    """Builds an XDR for establishing a trustline to AetherGem asset."""
-    try:
-        account = server.load_account(user_public_key)
-        op = stellar_sdk.ChangeTrust(
-            asset=AETHERGEM_ASSET,
-            limit="1000000000", # Arbitrarily high limit for custom asset
-            source=user_public_key
-        )
-        transaction = TransactionBuilder(
-            source_account=account,
-            network_passphrase=NETWORK_PASSPHRASE,
-            base_fee=100
-        ).add_operation(op).set_timeout(100).build()
-        return transaction.to_xdr()
-    except Exception as e:
-        st.error(f"Error building trustline transaction: {e}")
-        return None
-
-def build_initial_gem_data_tx(user_public_key):
-    """Builds an XDR for the user to set their initial AetherGem level and sprite."""
+def build_adopt_gem_tx(user_public_key, has_trustline):
+    """Builds one XDR that adopts an AetherGem: trustline (if missing), 1 AGEM from the
+    issuer and the initial gem data. The issuer co-signs; the user signs once."""
     try:
-        account = server.load_account(user_public_key)
-        initial_level_op = stellar_sdk.ManageData(
-            data_name="aethergem_level",
-            data_value="1".encode('utf-8'),
-            source=user_public_key
-        )
-        initial_sprite_op = stellar_sdk.ManageData(
-            data_name="aethergem_sprite",
-            data_value="🥚".encode('utf-8'),
-            source=user_public_key
-        )
-        transaction = TransactionBuilder(
-            source_account=account,
-            network_passphrase=NETWORK_PASSPHRASE,
-            base_fee=100
-        ).add_operation(initial_level_op).add_operation(initial_sprite_op).set_timeout(100).build()
-        return transaction.to_xdr()
-    except Exception as e:
-        st.error(f"Error building initial gem data transaction: {e}")
-        return None
-
-def build_issuer_mint_gem_tx(user_public_key):
-    """Builds and signs an XDR for the issuer to send 1 AetherGem to the user."""
-    try:
-        issuer_account = server.load_account(ISSUER_PUBLIC_KEY)
-        payment_op = stellar_sdk.Payment(
-            destination=user_public_key,
-            asset=AETHERGEM_ASSET,
-            amount="1",
-            source=ISSUER_PUBLIC_KEY
+        plan = FlowPlan(user_public_key, NETWORK_PASSPHRASE)
+        if not has_trustline:
+            plan.trust(AETHERGEM_ASSET, "1000000000") # Arbitrarily high limit for custom asset
+        plan.add(
+            stellar_sdk.Payment(destination=user_public_key, asset=AETHERGEM_ASSET, amount="1"),
+            f"Receive 1 {AETHERGEM_CODE}",
+            signer=ISSUER_KEYPAIR,
         )
-        tx_builder = TransactionBuilder(
-            source_account=issuer_account,
-            network_passphrase=NETWORK_PASSPHRASE,
-            base_fee=100
-        ).add_operation(payment_op).set_timeout(100)
-        
-        tx = tx_builder.build()
-        tx.sign(ISSUER_KEYPAIR) # Issuer signs this transaction
-        return tx.to_xdr()
+        plan.add(stellar_sdk.ManageData(data_name="aethergem_level", data_value="1".encode('utf-8')), "Set level 1")
+        plan.add(stellar_sdk.ManageData(data_name="aethergem_sprite", data_value="🥚".encode('utf-8')), "Set sprite")
+        return plan.to_xdr(reserve=False) # Signed through a redirect: a cancel never comes back
     except Exception as e:
-        st.error(f"Error building issuer mint transaction: {e}")
+        st.error(f"Error building adopt transaction: {e}")
         return None
 
 def build_feed_gem_tx(user_public_key, amount_xlm="0.1"):
     """Builds an XDR for feeding the AetherGem (sends XLM to collector)."""
     try:
-        account = server.load_account(user_public_key)
-        op = stellar_sdk.Payment(
-            destination=ISSUER_PUBLIC_KEY, # Collector account is the issuer account
-            asset=Asset.native(), # XLM
-            amount=amount_xlm,
-            source=user_public_key
-        )
-        transaction = TransactionBuilder(
-            source_account=account,
-            network_passphrase=NETWORK_PASSPHRASE,
-            base_fee=100
-        ).add_operation(op).set_timeout(100).build()
-        return transaction.to_xdr()
+        account = load_source_account(user_public_key, reserve=False) # Signed through a redirect: a cancel never comes back
+        feed_gem = template(("feed_gem", ISSUER_PUBLIC_KEY, amount_xlm), lambda: [
+            stellar_sdk.Payment(
+                destination=ISSUER_PUBLIC_KEY, # Collector account is the issuer account
+                asset=Asset.native(), # XLM
+                amount=amount_xlm,
+            )
+        ], timeout=100)
+        return feed_gem.build(account).to_xdr()
     except Exception as e:
         st.error(f"Error building feed gem transaction: {e}")
         return None
@@ -578,7 +523,7 @@ if st.session_state.freighter_connected:
     user_account = get_account_data(st.session_state.public_key)
     if user_account is None:
         st.warning("Your account does not exist on the Stellar Testnet. Please fund it using Friendbot.")
-        st.markdown(f"Click here to fund your account: [Friendbot](https://friendbot.stellar.org/?addr={st.session_state.public_key}) 🚀")
+        st.markdown(f"Click here to fund your account: [Friendbot]({FRIENDBOT_URL}/?addr={st.session_state.public_key}) 🚀")
         st.stop()
     
     # Refresh button
@@ -602,12 +547,17 @@ if st.session_state.freighter_connected:
                 has_trustline = True
                 break
 
-        if not has_trustline:
-            st.warning("You need to establish a trustline to adopt an AetherGem.")
-            if st.button(f"Set Trustline for {AETHERGEM_CODE} 🛡️"):
-                xdr = build_trustline_tx(st.session_state.public_key)
+        if not has_trustline or (st.session_state.aethergem_balance < 1 and st.session_state.aethergem_level == 0):
+            if not has_trustline:
+                st.warning("You need to establish a trustline to adopt an AetherGem.")
+                label = f"Set Trustline for {AETHERGEM_CODE} & Adopt Your AetherGem 🧬"
+            else:
+                st.success("Trustline established! Now, adopt your AetherGem!")
+                label = "Adopt Your AetherGem 🧬"
+            if st.button(label):
+                # Trustline, the Arcade's AGEM transfer and the gem data in a single signature
+                xdr = build_adopt_gem_tx(st.session_state.public_key, has_trustline)
                 if xdr:
-                    # JavaScript to sign XDR and then redirect with signed XDR
                     js_sign_script = f"""
                         <script>
                             window.FreighterApi.signTransaction('{xdr}', {{ network: 'TESTNET' }}).then(signedXDR => {{
@@ -618,34 +568,8 @@ if st.session_state.freighter_connected:
                         </script>
                         """
                     components.html(js_sign_script, height=0) # MANDATE 9: components.html
-                    st.session_state.tx_status = "⏳ Awaiting Freighter signature for Trustline..."
+                    st.session_state.tx_status = "⏳ Awaiting Freighter signature to adopt your AetherGem..."
                     st.experimental_rerun()
-        elif st.session_state.aethergem_balance < 1 and st.session_state.aethergem_level == 0:
-            st.success("Trustline established! Now, adopt your AetherGem!")
-            if st.button("Adopt Your AetherGem 🧬"):
-                # First, issuer sends 1 AGEM to user
-                issuer_mint_xdr = build_issuer_mint_gem_tx(st.session_state.public_key)
-                if issuer_mint_xdr:
-                    st.session_state.tx_status = "⏳ Initiating AetherGem transfer from Arcade..."
-                    if submit_transaction(issuer_mint_xdr):
-                        st.session_state.tx_status = "✅ AetherGem transferred! Now, please sign to activate your gem."
-                        # Second, user signs to set their initial gem data
-                        user_initial_data_xdr = build_initial_gem_data_tx(st.session_state.public_key)
-                        if user_initial_data_xdr:
-                            js_sign_script = f"""
-                                <script>
-                                    window.FreighterApi.signTransaction('{user_initial_data_xdr}', {{ network: 'TESTNET' }}).then(signedXDR => {{
-                                        window.location.href = window.location.origin + window.location.pathname + '?signed_xdr=' + signedXDR;
-                                    }}).catch(error => {{
-                                        window.location.href = window.location.origin + window.location.pathname + '?freighter_error=' + (error.message || 'Signing failed');
-                                    }});
-                                </script>
-                                """
-                            components.html(js_sign_script, height=0) # MANDATE 9: components.html
-                            st.session_state.tx_status = "⏳ Awaiting Freighter signature to initialize your AetherGem data..."
-                            st.experimental_rerun()
-                else:
-                    st.error("Could not build transaction to mint AetherGem. Please check logs.")
         else: # User has an AetherGem (balance >= 1 and level is initialized)
             st.markdown("### Nurture & Evolve!")
             
@@ -3,15 +3,18 @@ import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.horizon import friendbot_url, get_server
+from core.memory import session_budget
+from core.styles import inject_css
 import json
 import time
 import hashlib
 import urllib.parse
 
-# FIXED: Removed markdown formatting from the URL string
-HORIZON_URL = "[https://horizon-testnet.stellar.org](https://horizon-testnet.stellar.org)"
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
-SERVER = Server(HORIZON_URL)
+SERVER = get_server()
 
 if "ISSUER_SECRET_KEY" in st.secrets:
     ISSUER_SECRET_KEY = st.secrets["ISSUER_SECRET_KEY"]
@@ -32,7 +35,7 @@ if 'account_balances' not in st.session_state: st.session_state.account_balances
 if 'pending_tx_purpose' not in st.session_state: st.session_state.pending_tx_purpose = None
 if 'pending_whisper_content' not in st.session_state: st.session_state.pending_whisper_content = None
 
-st.markdown("""<style> body { background-color: #0d0d0d; color: #00ff00; } </style>""", unsafe_allow_html=True)
+inject_css("""<style> body { background-color: #0d0d0d; color: #00ff00; } </style>""")
 
 FREIGHTER_HTML = f"""
 <script src="[https://unpkg.com/@stellar/freighter-api@1.2.0/build/freighter.min.js](https://unpkg.com/@stellar/freighter-api@1.2.0/build/freighter.min.js)"></script>
@@ -112,7 +115,7 @@ def create_whisper_asset_and_account():
     except NotFoundError:
         import requests
         # FIXED: Removed Markdown syntax from friendbot URL
-        requests.get(f"[https://friendbot.stellar.org/?addr=](https://friendbot.stellar.org/?addr=){ISSUER_PUBLIC_KEY}")
+        requests.get(friendbot_url(ISSUER_PUBLIC_KEY))
 
 def submit_signed_xdr(signed_xdr):
     try:
@@ -153,7 +156,7 @@ if st.session_state.freighter_connected:
     if not acc:
         import requests
         if st.button("Fund Testnet Account"): 
-            requests.get(f"[https://friendbot.stellar.org/?addr=](https://friendbot.stellar.org/?addr=){st.session_state.freighter_public_key}")
+            requests.get(friendbot_url(st.session_state.freighter_public_key))
             st.rerun()
     else:
         st.write("Balances:", st.session_state.account_balances.get(st.session_state.freighter_public_key, {}))
@@ -1,13 +1,20 @@
 import streamlit as st
-import streamlit.components.v1 as components
 import stellar_sdk # Mandate 7
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset # Mandate 7
 from stellar_sdk.exceptions import BadRequestError, NotFoundError # Mandate 7
+from core.balances import asset_balance, live_account
+from core.demo import lease_demo_secret
+from core.horizon import HORIZON_URL, FRIENDBOT_URL, get_server
+from core.memory import session_budget
+from core.styles import inject_css
+from core.submission import submit_once
+from core.wallet import CONNECT, SIGN, bridge, connect, sign, wallet_result
+
+session_budget() # Before anything reads st.session_state (see core.memory)
 # Mandate 7: NEVER import 'Ed25519PublicKeyInvalidError'. Use 'ValueError'.
 # Mandate 7: NEVER import 'AssetType'.
 
 # --- Configuration ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 
 # --- Mandate 11: Secret Key Handling ---
@@ -15,7 +22,7 @@ if "ISSUER_KEY" in st.secrets:
     CRUCIBLE_MASTER_SECRET = st.secrets["ISSUER_KEY"]
 else:
     if "demo_key" not in st.session_state:
-        st.session_state.demo_key = Keypair.random().secret
+        st.session_state.demo_key = lease_demo_secret() # Pre-funded, from the demo account pool
     CRUCIBLE_MASTER_SECRET = st.session_state.demo_key
     st.warning("🔮 Using Ephemeral Demo Keys for Crucible Master! Changes will be lost on refresh.")
     
@@ -23,7 +30,7 @@ else:
     if "demo_key_funded" not in st.session_state:
         try:
             temp_keypair = Keypair.from_secret(CRUCIBLE_MASTER_SECRET)
-            server = Server(HORIZON_URL) # Mandate 8
+            server = get_server() # Mandate 8
             server.load_account(temp_keypair.public_key)
             st.session_state.demo_key_funded = True # Mark as existing
         except NotFoundError:
@@ -135,90 +142,34 @@ custom_css = f"""
     }}
 </style>
 """
-st.markdown(custom_css, unsafe_allow_html=True)
-
-# --- Freighter Integration JS (Mandate 1, 9) ---
-freighter_js = f"""
-<script>
-    async function connectWallet() {{
-        if (!window.freighterApi) {{
-            alert("Freighter not detected. Please install Freighter to use this dApp.");
-            return;
-        }}
-        try {{
-            const publicKey = await window.freighterApi.getPublicKey();
-            const currentUrl = new URL(window.location.href);
-            currentUrl.searchParams.set('freighter_pk', publicKey); // Use a specific param for public key
-            // Mandate 4: Strictly use st.query_params. We modify URL here.
-            // history.replaceState keeps the browser history clean by not adding to history.
-            window.history.replaceState({{}}, '', currentUrl.toString());
-            window.location.reload(); // Reload Streamlit to pick up query param
-        }} catch (error) {{
-            alert("Freighter connection failed: " + error.message);
-        }}
-    }}
-
-    async function signAndSubmitTransaction(xdr, networkPassphrase) {{
-        if (!window.freighterApi) {{
-            alert("Freighter not detected. Please install Freighter to use this dApp.");
-            return;
-        }}
-        try {{
-            const signedXDR = await window.freighterApi.signTransaction(xdr, {{ network: networkPassphrase }});
-            const currentUrl = new URL(window.location.href);
-            currentUrl.searchParams.set('signed_xdr', signedXDR); // Use a specific param for signed XDR
-            // Mandate 4: Strictly use st.query_params. We modify URL here.
-            window.history.replaceState({{}}, '', currentUrl.toString());
-            window.location.reload(); // Reload Streamlit to pick up query param
-        }} catch (error) {{
-            alert("Transaction signing failed: " + error.message);
-        }}
-    }}
-</script>
-"""
-components.html(freighter_js, height=0, width=0) # Mandate 9
+inject_css(custom_css)
 
 # --- Helper Functions ---
-def get_account_balance(public_key):
-    server = Server(HORIZON_URL) # Mandate 8
-    try:
-        account = server.load_account(public_key)
-        for balance in account.balances:
-            if balance.asset_type == 'native':
-                return float(balance.balance)
-        return 0.0 # Should not happen for native, but good fallback
-    except NotFoundError:
+def show_account_balance(account):
+    """XLM balance of the connected account; live_account re-renders it on its own."""
+    if account is None:
         st.error("Account not found on the network. Please fund it using a friendbot.")
-        return 0.0
-    except Exception as e:
-        st.error(f"Error loading account: {e}")
-        return 0.0
-
-# --- Process Query Params (Mandate 4) ---
-# Initialize session state for tracking processed query params
-if 'freighter_pk_processed' not in st.session_state:
-    st.session_state.freighter_pk_processed = None
-if 'signed_xdr_processed' not in st.session_state:
-    st.session_state.signed_xdr_processed = None
+        st.session_state.balance = 0.0
+    else:
+        st.session_state.balance = asset_balance(account) or 0.0
+    st.metric(label="XLM Balance", value=f"{st.session_state.balance:,.2f} XLM 💰") # Mandate 6
+    if st.session_state.balance < 5:
+        st.warning("Low XLM balance. Use a friendbot to fund your account if needed for transactions.")
+        st.link_button("Fund Account (Testnet Friendbot)", f"{FRIENDBOT_URL}/?addr={st.session_state.public_key}", help="Get free testnet XLM")
 
-# Check for public key from Freighter
-if 'freighter_pk' in st.query_params and st.query_params['freighter_pk'] != st.session_state.freighter_pk_processed:
-    st.session_state.public_key = st.query_params['freighter_pk']
-    st.session_state.freighter_pk_processed = st.query_params['freighter_pk'] # Mark as processed
+# --- Freighter Results (Mandate 1) ---
+# The wallet bridge hands back what Freighter returned; no page reload involved.
+wallet = wallet_result()
+if wallet is not None and "error" in wallet:
+    st.error(f"Freighter request failed: {wallet['error']}")
+elif wallet is not None and wallet["action"] == CONNECT:
+    st.session_state.public_key = wallet["public_key"]
     st.success(f"Connected to Freighter! Public Key: `{st.session_state.public_key}`")
-    # Clean up query param from Streamlit's internal representation for this run
-    # The JS handles the browser URL, but this helps Streamlit's internal state.
-    if 'freighter_pk' in st.query_params: 
-        del st.query_params['freighter_pk'] 
-
-# Check for signed XDR from Freighter
-if 'signed_xdr' in st.query_params and st.query_params['signed_xdr'] != st.session_state.signed_xdr_processed:
-    signed_xdr = st.query_params['signed_xdr']
-    st.session_state.signed_xdr_processed = signed_xdr # Mark as processed
+elif wallet is not None and wallet["action"] == SIGN:
+    signed_xdr = wallet["signed_xdr"]
     st.info("Submitting transaction to Horizon...")
-    server = Server(HORIZON_URL) # Mandate 8
     try:
-        response = server.submit_transaction(signed_xdr)
+        response = submit_once(signed_xdr)
         st.success(f"🌌 Transaction successful! Hash: `{response['hash']}`")
         st.toast("Transaction confirmed!", icon="✨")
     except BadRequestError as e:
@@ -228,9 +179,6 @@ if 'signed_xdr' in st.query_params and st.query_params['signed_xdr'] != st.sessi
         st.error(f"🔥 Transaction failed: {op_codes[0]}. Details: {e.message}")
     except Exception as e:
         st.error(f"⚡ An unexpected error occurred: {e}")
-    # Clean up query param from Streamlit's internal representation
-    if 'signed_xdr' in st.query_params:
-        del st.query_params['signed_xdr']
 
 # --- Sidebar (Mandate 10) ---
 with st.sidebar:
@@ -254,16 +202,12 @@ st.header("🔑 Attune Your Temporal Conduit")
 col1, col2 = st.columns([1, 2])
 with col1:
     if st.button("Connect Freighter 🔗", key="connect_freighter"):
-        components.html("<script>connectWallet();</script>", height=0, width=0) # Mandate 9
+        connect() # Mandate 1
 
 with col2:
     if 'public_key' in st.session_state:
         st.markdown(f"**Connected as:** `{st.session_state.public_key}`")
-        st.session_state.balance = get_account_balance(st.session_state.public_key)
-        st.metric(label="XLM Balance", value=f"{st.session_state.balance:,.2f} XLM 💰") # Mandate 6
-        if st.session_state.balance < 5:
-            st.warning("Low XLM balance. Use a friendbot to fund your account if needed for transactions.")
-            st.link_button("Fund Account (Testnet Friendbot)", f"https://friendbot.stellar.org/?addr={st.session_state.public_key}", help="Get free testnet XLM")
+        live_account(st.session_state.public_key, show_account_balance) # Refreshes itself, not the page
     else:
         st.info("Connect your Freighter wallet to begin your Chronomancy journey.")
 
@@ -284,7 +228,7 @@ if 'public_key' in st.session_state:
         
         if st.button("Submit Prophecy ✨", key="submit_forecast_btn", disabled=not forecast_message):
             try:
-                server = Server(HORIZON_URL) # Mandate 8
+                server = get_server() # Mandate 8
                 source_account = server.load_account(player_pk)
                 
                 # Build ManageData operation
@@ -310,7 +254,7 @@ if 'public_key' in st.session_state:
                 
                 unsigned_xdr = transaction.to_xdr()
                 st.info(f"Generated unsigned XDR for prophecy. Asking Freighter to sign...")
-                components.html(f"<script>signAndSubmitTransaction('{unsigned_xdr}', '{NETWORK_PASSPHRASE}');</script>", height=0, width=0) # Mandate 9
+                sign(unsigned_xdr, tag="prophecy", network_passphrase=NETWORK_PASSPHRASE) # Mandate 1
 
             except NotFoundError:
                 st.error("Account not found. Please ensure your account is funded.")
@@ -332,7 +276,7 @@ if 'public_key' in st.session_state:
         # Check if user already trusts this asset
         has_trustline = False
         try:
-            server = Server(HORIZON_URL) # Mandate 8
+            server = get_server() # Mandate 8
             account_details = server.load_account(player_pk)
             for balance in account_details.balances:
                 if balance.asset_code == ARTIFACT_CODE and balance.asset_issuer == CRUCIBLE_MASTER_KEYPAIR.public_key:
@@ -351,7 +295,7 @@ if 'public_key' in st.session_state:
             st.warning("You do not yet possess Arcane Fragments. Establish a trustline to acquire them.")
             if st.button(f"Acquire {ARTIFACT_CODE} Fragment (Set Trustline) 🛡️", key="acquire_artifact_btn"):
                 try:
-                    server = Server(HORIZON_URL) # Mandate 8
+                    server = get_server() # Mandate 8
                     source_account = server.load_account(player_pk)
                     
                     # Build ChangeTrust operation
@@ -373,7 +317,7 @@ if 'public_key' in st.session_state:
                     
                     unsigned_xdr = transaction.to_xdr()
                     st.info(f"Generated unsigned XDR for artifact trustline. Asking Freighter to sign...")
-                    components.html(f"<script>signAndSubmitTransaction('{unsigned_xdr}', '{NETWORK_PASSPHRASE}');</script>", height=0, width=0) # Mandate 9
+                    sign(unsigned_xdr, tag="artifact", network_passphrase=NETWORK_PASSPHRASE) # Mandate 1
 
                 except NotFoundError:
                     st.error("Account not found. Please ensure your account is funded.")
@@ -384,4 +328,6 @@ else:
     st.info("Connect your wallet to participate in Chronomancy.")
 
 st.markdown("---")
-st.caption("Powered by Stellar 🌟")
\ No newline at end of file
+st.caption("Powered by Stellar 🌟")
+
+bridge() # Mandate 1: the Freighter wallet component, after every button that queues a request
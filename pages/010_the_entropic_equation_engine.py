@@ -2,15 +2,25 @@ import streamlit as st
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
-import streamlit.components.v1 as components
+from core.demo import lease_demo_secret
+from core.horizon import friendbot_url, get_server
+from core.batching import payout_async, payout_result, watch_payout
+from core.flows import FlowPlan
+from core.memory import session_budget
+from core.sequences import load_source_account
+from core.styles import inject_css
+from core.submission import PENDING, SUCCESS, submit_once
+from core.templates import trustline_template
+from core.wallet import CONNECT, bridge, connect, sign, wallet_result
 import asyncio
 import json
 import requests
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- Configuration ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
-SERVER = Server(HORIZON_URL)
+SERVER = get_server()
 
 # --- Session State Initialization ---
 if "freighter_public_key" not in st.session_state:
@@ -37,7 +47,7 @@ async def fetch_account_details(public_key):
 
 def submit_transaction_to_horizon(xdr_signed):
     try:
-        response = SERVER.submit_transaction(xdr_signed)
+        response = submit_once(xdr_signed)
         return response
     except BadRequestError as e:
         st.error(f"Stellar transaction error: {json.dumps(e.extras, indent=2)}")
@@ -46,53 +56,26 @@ def submit_transaction_to_horizon(xdr_signed):
         st.error(f"Failed to submit transaction: {e}")
         return None
 
-# --- Freighter JavaScript Component ---
-FREIGHTER_JS_COMPONENT = """
-<script src="https://unpkg.com/@stellar/freighter-api@latest/build/index.js"></script>
-<script>
-    const streamlit = window.parent.streamlit; 
-
-    async function connectFreighter() {
-        try {
-            if (!(await window.freighterApi.isConnected())) {
-                await window.freighterApi.connect();
-            }
-            const publicKey = await window.freighterApi.getPublicKey();
-            streamlit.send({ type: 'freighter_connected', publicKey: publicKey });
-        } catch (error) {
-            streamlit.send({ type: 'freighter_error', message: error.message });
-        }
-    }
-
-    async function signTransaction(xdr, networkPassphrase) {
-        try {
-            const signedXDR = await window.freighterApi.signTransaction(xdr, { networkPassphrase });
-            streamlit.send({ type: 'transaction_signed', signedXDR: signedXDR });
-        } catch (error) {
-            streamlit.send({ type: 'freighter_error', message: error.message });
-        }
-    }
-
-    window.addEventListener('message', async (event) => {
-        if (event.source === window.parent && event.data && event.data.streamlitMessage) {
-            const message = event.data.streamlitMessage;
-            if (message.type === 'connect') {
-                await connectFreighter();
-            } else if (message.type === 'sign') {
-                await signTransaction(message.xdr, message.networkPassphrase);
-            }
-        }
-    });
-
-    window.freighterApi.isConnected().then(connected => {
-        if (connected) {
-            window.freighterApi.getPublicKey().then(publicKey => {
-                streamlit.send({ type: 'freighter_connected', publicKey: publicKey });
-            });
-        }
-    });
-</script>
-"""
+def request_fragments(destination, asset):
+    """Issuer sends 10 of ``asset``; batched with other sessions' requests. show_fragment_payout() reports it."""
+    st.session_state.fragment_payout = (payout_async(ISSUER_KEYPAIR, stellar_sdk.Payment(destination=destination, asset=asset, amount="10")), asset.code)
+
+def show_fragment_payout():
+    """Waits on the queued fragment payout without blocking the page, then reports it once."""
+    if not st.session_state.get("fragment_payout"):
+        return
+    ticket, code = st.session_state.fragment_payout
+    outcome = payout_result(ticket)
+    if outcome is not None and outcome["status"] == PENDING:
+        watch_payout(ticket, message=f"⏳ Sending 10 {code}...")
+        return
+    st.session_state.fragment_payout = None
+    if outcome is not None and outcome["status"] == SUCCESS:
+        st.success(f"10 {code} received!")
+    elif outcome is not None and outcome["code"]:
+        st.error(f"Stellar transaction error: {outcome['code']}")
+    else:
+        st.error(f"Failed to submit transaction: {outcome['error'] if outcome else 'the result was lost'}")
 
 # --- Custom CSS ---
 CUSTOM_CSS = """
@@ -107,53 +90,28 @@ CUSTOM_CSS = """
     div[data-testid="stMetricValue"] { color: #58a6ff; font-family: 'Roboto Mono', monospace; font-size: 2.5em; text-shadow: 0px 0px 10px rgba(88, 166, 255, 0.8); }
 </style>
 """
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
-
-# --- Freighter Bridge Setup ---
-components.html(FREIGHTER_JS_COMPONENT, height=0, width=0)
-
-def send_to_freighter_component(message):
-    components.html(
-        f"""
-        <script>
-            const iframe = document.querySelector('iframe[title="st.html"]');
-            if (iframe && iframe.contentWindow) {{
-                iframe.contentWindow.postMessage({{ streamlitMessage: {json.dumps(message)} }}, '*');
-            }}
-        </script>
-        """,
-        height=0, width=0
-    )
+inject_css(CUSTOM_CSS)
 
-if "streamlit_msg" in st.query_params:
-    try:
-        message_str = st.query_params["streamlit_msg"]
-        message_data = json.loads(message_str)
-        if message_data.get("type") == "freighter_connected":
-            st.session_state.freighter_public_key = message_data["publicKey"]
-            st.success(f"Freighter Connected! Public Key: `{message_data['publicKey'][:10]}...`")
-            st.session_state.tx_in_progress = False
-            st.query_params.pop("streamlit_msg")
-            st.rerun()
-        elif message_data.get("type") == "transaction_signed":
-            st.session_state.signed_xdr = message_data["signedXDR"]
-            st.success("Transaction signed by Freighter!")
-            st.query_params.pop("streamlit_msg")
-            st.rerun()
-        elif message_data.get("type") == "freighter_error":
-            st.session_state.tx_in_progress = False
-            st.error(f"Freighter Error: {message_data['message']}")
-            st.query_params.pop("streamlit_msg")
-            st.rerun()
-    except Exception as e:
-        pass
+# --- Freighter Bridge ---
+# One wallet iframe per session; it is rendered once, at the end of the page.
+wallet = wallet_result()
+if wallet is not None and "error" in wallet:
+    st.session_state.tx_in_progress = False
+    st.error(f"Freighter Error: {wallet['error']}")
+elif wallet is not None and wallet["action"] == CONNECT:
+    st.session_state.freighter_public_key = wallet["public_key"]
+    st.success(f"Freighter Connected! Public Key: `{wallet['public_key'][:10]}...`")
+    st.session_state.tx_in_progress = False
+elif wallet is not None:
+    st.session_state.signed_xdr = wallet["signed_xdr"]
+    st.success("Transaction signed by Freighter!")
 
 # --- Secret Key Handling ---
 if "ISSUER_KEY" in st.secrets:
     ISSUER_SECRET = st.secrets["ISSUER_KEY"]
 else:
     if "demo_key" not in st.session_state:
-        st.session_state.demo_key = Keypair.random().secret
+        st.session_state.demo_key = lease_demo_secret() # Pre-funded, from the demo account pool
     ISSUER_SECRET = st.session_state.demo_key
     st.sidebar.warning("Using Ephemeral Demo Keys for Issuer.")
 
@@ -202,7 +160,7 @@ st.subheader("Orchestrating Solution Fragments for System Stabilization")
 st.header("1. Connect Your Equation Account (Freighter) 🔗")
 if not st.session_state.freighter_public_key:
     if st.button("Connect Freighter Wallet"):
-        send_to_freighter_component({"type": "connect"})
+        connect()
         st.session_state.tx_in_progress = True 
         st.info("Awaiting Freighter connection...")
 else:
@@ -221,7 +179,7 @@ if st.session_state.freighter_public_key:
         if st.button("Fund Equation Account (XLM via Friendbot)"):
             try:
                 # FIXED: Uses requests for Friendbot instead of SERVER.friendbot()
-                requests.get(f"https://friendbot.stellar.org/?addr={st.session_state.freighter_public_key}")
+                requests.get(friendbot_url(st.session_state.freighter_public_key))
                 st.success("Equation Account funded by Friendbot!")
                 st.rerun()
             except Exception as e:
@@ -245,9 +203,9 @@ else:
         with col1:
             if not has_trust_a:
                 if st.button(f"Trust FRAGA"):
-                    source_account = asyncio.run(fetch_account_details(equation_pk))
-                    transaction = TransactionBuilder(source_account=source_account, network_passphrase=NETWORK_PASSPHRASE).append_change_trust_op(asset=FRAGMENT_A, limit="100000000000").set_timeout(300).build()
-                    send_to_freighter_component({"type": "sign", "xdr": transaction.to_xdr(), "networkPassphrase": NETWORK_PASSPHRASE})
+                    source_account = load_source_account(equation_pk)
+                    transaction = trustline_template(FRAGMENT_A, "100000000000").build(source_account)
+                    sign(transaction.to_xdr(), network_passphrase=NETWORK_PASSPHRASE)
                     st.session_state.tx_in_progress = True
             else:
                 st.success("✅ Trustline for FRAGA established.")
@@ -255,13 +213,23 @@ else:
         with col2:
             if not has_trust_b:
                 if st.button(f"Trust FRAGB"):
-                    source_account = asyncio.run(fetch_account_details(equation_pk))
-                    transaction = TransactionBuilder(source_account=source_account, network_passphrase=NETWORK_PASSPHRASE).append_change_trust_op(asset=FRAGMENT_B, limit="100000000000").set_timeout(300).build()
-                    send_to_freighter_component({"type": "sign", "xdr": transaction.to_xdr(), "networkPassphrase": NETWORK_PASSPHRASE})
+                    source_account = load_source_account(equation_pk)
+                    transaction = trustline_template(FRAGMENT_B, "100000000000").build(source_account)
+                    sign(transaction.to_xdr(), network_passphrase=NETWORK_PASSPHRASE)
                     st.session_state.tx_in_progress = True
             else:
                 st.success("✅ Trustline for FRAGB established.")
 
+        if not (has_trust_a and has_trust_b):
+            if st.button("⚡ Trust & Receive 10 FRAGA + 10 FRAGB (one signature)"):
+                plan = FlowPlan(equation_pk, NETWORK_PASSPHRASE)
+                for fragment, trusted in ((FRAGMENT_A, has_trust_a), (FRAGMENT_B, has_trust_b)):
+                    if not trusted:
+                        plan.trust(fragment, "100000000000")
+                    plan.add(stellar_sdk.Payment(destination=equation_pk, asset=fragment, amount="10"), f"Receive 10 {fragment.code}", signer=ISSUER_KEYPAIR)
+                sign(plan.to_xdr(), network_passphrase=NETWORK_PASSPHRASE)
+                st.session_state.tx_in_progress = True
+
         if st.session_state.tx_in_progress and st.session_state.signed_xdr:
             response = submit_transaction_to_horizon(st.session_state.signed_xdr)
             if response: st.success("Trustline established!")
@@ -273,20 +241,11 @@ else:
         c1, c2 = st.columns(2)
         with c1:
             if st.button("Request 10 FRAGA"):
-                issuer_account = asyncio.run(fetch_account_details(ISSUER_PUBLIC_KEY))
-                tx = TransactionBuilder(source_account=issuer_account, network_passphrase=NETWORK_PASSPHRASE).append_payment_op(destination=equation_pk, asset=FRAGMENT_A, amount="10").set_timeout(300).build()
-                tx.sign(ISSUER_KEYPAIR)
-                submit_transaction_to_horizon(tx.to_xdr())
-                st.success("10 FRAGA received!")
-                st.rerun()
+                request_fragments(equation_pk, FRAGMENT_A)
         with c2:
             if st.button("Request 10 FRAGB"):
-                issuer_account = asyncio.run(fetch_account_details(ISSUER_PUBLIC_KEY))
-                tx = TransactionBuilder(source_account=issuer_account, network_passphrase=NETWORK_PASSPHRASE).append_payment_op(destination=equation_pk, asset=FRAGMENT_B, amount="10").set_timeout(300).build()
-                tx.sign(ISSUER_KEYPAIR)
-                submit_transaction_to_horizon(tx.to_xdr())
-                st.success("10 FRAGB received!")
-                st.rerun()
+                request_fragments(equation_pk, FRAGMENT_B)
+        show_fragment_payout()
 
 st.header("4. Create Entropic Offers 🔄")
 if st.session_state.freighter_public_key and equation_account_details:
@@ -307,5 +266,7 @@ if st.session_state.freighter_public_key and equation_account_details:
         sell_ass = get_asset(selling_asset_choice)
         buy_ass = get_asset(buying_asset_choice)
         tx = TransactionBuilder(source_account=equation_account_details, network_passphrase=NETWORK_PASSPHRASE).append_manage_buy_offer_op(selling=sell_ass, buying=buy_ass, amount=amount, price=price, offer_id=0).set_timeout(300).build()
-        send_to_freighter_component({"type": "sign", "xdr": tx.to_xdr(), "networkPassphrase": NETWORK_PASSPHRASE})
+        sign(tx.to_xdr(), network_passphrase=NETWORK_PASSPHRASE)
         st.session_state.tx_in_progress = True
+
+bridge()
@@ -2,20 +2,24 @@ import streamlit as st
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
-import streamlit.components.v1 as components
+from core.horizon import friendbot_url, get_server
+from core.memory import session_budget
+from core.styles import inject_css
+from core.wallet import CONNECT, bridge, connect, sign, wallet_result
 import json
 import time
 import requests
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- Configuration ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 # FIXED: Network Passphrase Typo
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE 
 INITIAL_ISSUER_BALANCE = "10000"
 ADOPTION_FEE_SDU = 5
 SDU_INITIAL_SUPPLY = 1_000_000
 
-server = Server(HORIZON_URL)
+server = get_server()
 
 # --- Session State Initialization ---
 if "public_key" not in st.session_state: st.session_state.public_key = None
@@ -58,7 +62,7 @@ CREATURE_ASSETS = [Asset(c["code"], issuer_public_key) for c in CREATURE_ASSETS_
 
 # --- Custom CSS ---
 def apply_custom_css():
-    st.markdown(
+    inject_css(
         """
         <style>
         @import url('https://fonts.googleapis.com/css2?family=Cinzel+Decorative:wght@400;700&family=Orbitron:wght@400;700&display=swap');
@@ -71,34 +75,24 @@ def apply_custom_css():
         .stMetric div[data-testid="stMetricValue"] { color: #c4b5fd !important; font-family: 'Orbitron', sans-serif; font-size: 1.8em; }
         .stSidebar .st-emotion-cache-1pxx9r9 { background-color: #1a0a2a; }
         </style>
-        """, unsafe_allow_html=True
+        """
     )
 
-# --- Freighter HTML Component ---
-def freighter_integration_html(action, xdr_to_sign=None):
-    script_content = f"""
-    <script src="https://unpkg.com/@stellar/freighter-api@latest/build/index.js"></script>
-    <script>
-        const ACTION = "{action}";
-        const XDR_TO_SIGN = "{xdr_to_sign if xdr_to_sign else ''}";
-        const NETWORK_PASSPHRASE = "{NETWORK_PASSPHRASE}";
-
-        async function initFreighterAction() {{
-            if (!window.freighterApi) return;
-            if (ACTION === 'connect') {{
-                const {{"publicKey"}} = await window.freighterApi.getPublicKey();
-                window.parent.streamlit.setComponentValue('freighter_public_key', publicKey);
-                window.parent.streamlit.setComponentValue('freighter_status', 'CONNECTED');
-            }} else if (ACTION === 'sign' && XDR_TO_SIGN) {{
-                const signedXdr = await window.freighterApi.signTransaction(XDR_TO_SIGN, {{networkPassphrase: NETWORK_PASSPHRASE}});
-                window.parent.streamlit.setComponentValue('freighter_tx_signed_xdr', signedXdr);
-            }}
-        }}
-        initFreighterAction(); 
-    </script>
-    """
-    # FIXED: Removed `key` from components.html
-    components.html(script_content, height=0, width=0)
+# --- Freighter Wallet Component ---
+def receive_freighter_result():
+    """Copies what the wallet bridge brought back into session state."""
+    wallet = wallet_result()
+    if wallet is None:
+        return
+    if "error" in wallet:
+        st.session_state.freighter_tx_error = wallet["error"]
+        st.session_state.tx_in_progress = False
+        st.error(f"Freighter: {wallet['error']}")
+    elif wallet["action"] == CONNECT:
+        st.session_state.freighter_public_key = wallet["public_key"]
+        st.session_state.freighter_status = 'CONNECTED'
+    else:
+        st.session_state.freighter_tx_signed_xdr = wallet["signed_xdr"]
 
 def create_change_trust_op(asset, limit=None):
     return stellar_sdk.ChangeTrust(asset=asset, limit=str(limit) if limit is not None else None)
@@ -130,7 +124,7 @@ def get_account_data(public_key):
 def fund_account_with_friendbot(public_key):
     try:
         # FIXED: Use requests for Friendbot
-        requests.get(f"https://friendbot.stellar.org/?addr={public_key}")
+        requests.get(friendbot_url(public_key))
         st.success(f"Account funded successfully by Friendbot!")
         return True
     except Exception as e:
@@ -145,13 +139,11 @@ def main():
     st.markdown("<h1>The Astral Menagerie ✨🔮</h1>", unsafe_allow_html=True)
     st.markdown("### A celestial sanctuary for unique digital companions.")
     st.markdown("---")
+    receive_freighter_result()
 
     if not st.session_state.public_key:
         if st.button("Connect Freighter Wallet ✨", disabled=st.session_state.tx_in_progress):
-            st.session_state.tx_in_progress = True 
-            freighter_integration_html("connect")
-            time.sleep(1)
-            st.rerun()
+            connect()
         if st.session_state.get('freighter_status') == 'CONNECTED':
             st.session_state.public_key = st.session_state.freighter_public_key
             st.session_state.tx_in_progress = False
@@ -180,7 +172,7 @@ def main():
                     xdr = create_raw_tx(st.session_state.public_key, [create_change_trust_op(STARDUST_ASSET)])
                     if xdr:
                         st.session_state.tx_in_progress = True
-                        freighter_integration_html("sign", xdr_to_sign=xdr)
+                        sign(xdr, network_passphrase=NETWORK_PASSPHRASE)
             
             if st.session_state.tx_in_progress and st.session_state.get('freighter_tx_signed_xdr'):
                 submit_signed_xdr(st.session_state.freighter_tx_signed_xdr)
@@ -202,8 +194,12 @@ def main():
                     elif has_stardust_trustline:
                         if st.button(f"Adopt {creature_asset.code}", key=f"adopt_{creature_asset.code}"):
                             xdr = create_raw_tx(st.session_state.public_key, [create_change_trust_op(creature_asset), create_payment_op(issuer_public_key, STARDUST_ASSET, ADOPTION_FEE_SDU)])
-                            if xdr: freighter_integration_html("sign", xdr_to_sign=xdr)
+                            if xdr:
+                                st.session_state.tx_in_progress = True
+                                sign(xdr, network_passphrase=NETWORK_PASSPHRASE)
                 st.markdown("---")
 
+    bridge() # The Freighter wallet component, after every button that queues a request
+
 if __name__ == "__main__":
     main()
@@ -7,11 +7,16 @@ import time
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.horizon import fund_with_friendbot, get_server
+from core.memory import session_budget
+from core.persistence import persist
+from core.styles import inject_css
+
+session_budget(cold=("kraftwerk_components",)) # Before anything reads st.session_state (see core.memory)
 
 # Configuration
 APP_NAME = "The Kinetic Keystone Kraftwerk ⚙️"
 APP_CONCEPT = "A decentralized, industrial-themed art engine where users collaborate to construct intricate, self-sustaining Rube Goldberg-esque contraptions by linking asset-based components and triggering chain reactions via sequence manipulations."
-HORIZON_URL = "https://horizon-testnet.stellar.org/"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 KRAFTWERK_ASSET_CODE = "KWC" # Kinetic Kraftwerk Component
 
@@ -29,7 +34,7 @@ ISSUER_KEYPAIR = Keypair.from_secret(ISSUER_SECRET_KEY)
 ISSUER_PUBLIC_KEY = ISSUER_KEYPAIR.public_key
 
 # --- Mandate #8: Stellar Server Rules ---
-server = Server(HORIZON_URL)
+server = get_server()
 
 # --- Session State Initialization ---
 if "freighter_pk" not in st.session_state:
@@ -236,7 +241,7 @@ custom_css = """
     }
 </style>
 """
-st.markdown(custom_css, unsafe_allow_html=True)
+inject_css(custom_css)
 
 # --- Mandate #1 & #9: Freighter Integration (st.components.v1.html) ---
 # JavaScript to connect to Freighter and return public key / sign transaction
@@ -326,7 +331,7 @@ def fetch_account_details(public_key):
 
 def fund_account(public_key):
     try:
-        response = server.friendbot(public_key).call()
+        fund_with_friendbot(public_key)
         st.success(f"🤖 Account funded by Friendbot!", icon="✅")
         time.sleep(2) # Give Horizon time to update
         fetch_account_details(public_key) # Refresh account details
@@ -395,6 +400,9 @@ if "freighterError" in query_params:
     st.query_params.clear()
     st.rerun()
 
+# The redirects above start a new session; the graph is restored for this wallet (see core.persistence)
+persist(st.session_state.freighter_pk, ("kraftwerk_components",))
+
 # Handle Freighter response after signing
 if st.session_state.freighter_tx_result:
     if st.session_state.freighter_tx_result["status"] == "signed":
@@ -1,20 +1,29 @@
 import streamlit as st
-import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.demo import lease_demo_secret
+from core.horizon import fund_with_friendbot, get_server
+from core.memory import session_budget
+from core.persistence import persist
+from core.sections import static_section
+from core.sequences import load_source_account
+from core.styles import inject_css
+from core.submission import submit_once
+from core.wallet import CONNECT, SIGN, bridge, connect, sign, wallet_result
 import time
 import json
 import base64
 
+session_budget(cold=("cultivated_networks",)) # Before anything reads st.session_state (see core.memory)
+
 # --- 0. Constants and Initial Setup ---
 APP_NAME = "The Mycelial Bloom 🍄🌱"
-HORIZON_URL = "https://horizon-testnet.stellar.org" # Using Testnet for demo purposes
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 SPORE_ASSET_CODE = "SPOR" # Max 12 chars for asset code
 XLM_TO_SPORE_RATE = 100 # 1 XLM = 100 SPORs
 
-server = Server(HORIZON_URL)
+server = get_server()
 
 # --- 1. Custom Organic/Nature-Inspired CSS ---
 custom_css = """
@@ -168,7 +177,7 @@ custom_css = """
 
 </style>
 """
-st.markdown(custom_css, unsafe_allow_html=True)
+inject_css(custom_css)
 
 # --- 2. Session State Initialization ---
 if "public_key" not in st.session_state:
@@ -190,7 +199,7 @@ if "ISSUER_KEY" in st.secrets:
     ISSUER_KEY = Keypair.from_secret(st.secrets["ISSUER_KEY"])
 else:
     if "demo_issuer_key" not in st.session_state:
-        st.session_state.demo_issuer_key = Keypair.random().secret
+        st.session_state.demo_issuer_key = lease_demo_secret() # Pre-funded, from the demo account pool
     ISSUER_KEY = Keypair.from_secret(st.session_state.demo_issuer_key)
     st.warning("Using Ephemeral Demo Keys for App's Issuer. Transactions requiring the issuer's signature will use this key. Your demo session will reset if you close the browser.")
 
@@ -221,21 +230,15 @@ def fetch_account_details(public_key: str):
         st.error(f"Error fetching account details: {e}")
         st.session_state.balances = {"XLM": 0, SPORE_ASSET_CODE: 0}
 
-def clear_query_params():
-    """Clears transaction-related query parameters."""
-    for param in ["signed_xdr", "freighter_error", "tx_type"]:
-        if param in st.query_params:
-            del st.query_params[param]
-
 def submit_signed_transaction(signed_xdr: str):
     """Submits a signed XDR to the Stellar network."""
     try:
-        response = server.submit_transaction(signed_xdr)
+        response = submit_once(signed_xdr)
         st.session_state.latest_tx_hash = response["hash"]
         st.success(f"Transaction submitted successfully! Hash: {st.session_state.latest_tx_hash}")
         st.session_state.tx_in_progress = False
         fetch_account_details(st.session_state.public_key)
-        st.rerun() # Rerun to clear query params and update UI
+        st.rerun() # Rerun to update the sidebar balances
     except BadRequestError as e:
         error_msg = e.response.text
         st.error(f"Transaction submission failed (Horizon): {error_msg}")
@@ -247,87 +250,43 @@ def submit_signed_transaction(signed_xdr: str):
         st.session_state.latest_tx_hash = None
 
 
-# --- 5. Freighter Integration (HTML Component) ---
-FREIGHTER_JS = f"""
-<script>
-    async function connectFreighter() {{
-        const currentUrl = new URL(window.location.href);
-        try {{
-            if (!window.freighter) {{
-                currentUrl.searchParams.set("freighter_error", "Freighter not detected. Please install and connect.");
-                window.location.href = currentUrl.toString();
-                return;
-            }}
-            const publicKey = await window.freighter.getPublicKey();
-            currentUrl.searchParams.set("public_key", publicKey);
-            currentUrl.searchParams.delete("freighter_error");
-        }} catch (error) {{
-            currentUrl.searchParams.set("freighter_error", error.message || "Failed to connect Freighter.");
-            currentUrl.searchParams.delete("public_key");
-        }}
-        window.location.href = currentUrl.toString();
-    }}
-
-    async function signAndSubmit(xdr, transactionType) {{
-        const currentUrl = new URL(window.location.href);
-        try {{
-            if (!window.freighter) {{
-                currentUrl.searchParams.set("freighter_error", "Freighter not detected. Please install and connect.");
-                currentUrl.searchParams.set("tx_type", transactionType);
-                window.location.href = currentUrl.toString();
-                return;
-            }}
-            const signedXDR = await window.freighter.signTransaction(xdr, "{NETWORK_PASSPHRASE}");
-            currentUrl.searchParams.set("signed_xdr", signedXDR);
-            currentUrl.searchParams.set("tx_type", transactionType);
-            currentUrl.searchParams.delete("freighter_error");
-        }} catch (error) {{
-            currentUrl.searchParams.set("freighter_error", error.message || "An unknown error occurred with Freighter.");
-            currentUrl.searchParams.set("tx_type", transactionType);
-            currentUrl.searchParams.delete("signed_xdr");
-        }}
-        window.location.href = currentUrl.toString();
-    }}
-</script>
-"""
-
-# Render the Freighter JS in a hidden component, or trigger actions based on buttons
-components.html(FREIGHTER_JS, height=0, width=0)
-
-# --- 6. Query Params Handling (Mandate 4) ---
-# Check for incoming data from Freighter (after redirect)
-if "public_key" in st.query_params and not st.session_state.public_key:
-    st.session_state.public_key = st.query_params["public_key"]
+# --- 5. Freighter Integration (Wallet Component) ---
+# Results come back from the wallet bridge rendered at the end of the page.
+wallet = wallet_result()
+if wallet is not None and "error" in wallet:
+    st.error(f"Freighter Error: {wallet['error']}")
+    st.session_state.tx_in_progress = False
+elif wallet is not None and wallet["action"] == CONNECT:
+    st.session_state.public_key = wallet["public_key"]
     st.success(f"Connected with Freighter: {st.session_state.public_key[:8]}...")
     fetch_account_details(st.session_state.public_key)
-    clear_query_params()
-    st.rerun()
-elif "freighter_error" in st.query_params:
-    st.error(f"Freighter Error: {st.query_params['freighter_error']}")
-    st.session_state.tx_in_progress = False
-    clear_query_params()
-    st.rerun()
-elif "signed_xdr" in st.query_params and st.session_state.tx_in_progress:
+elif wallet is not None and wallet["action"] == SIGN and st.session_state.tx_in_progress:
     st.session_state.tx_in_progress = False # Mark as no longer in progress after receiving XDR
-    signed_xdr = st.query_params["signed_xdr"]
-    submit_signed_transaction(signed_xdr) # This will rerender and clear query params
+    submit_signed_transaction(wallet["signed_xdr"])
+
+# Networks outlive the tab: restored for this wallet after a reload (see core.persistence)
+persist(st.session_state.public_key, ("cultivated_networks",))
 
 
 # --- 7. Sidebar (Mandate 10) ---
-with st.sidebar:
-    st.info(f"### {APP_NAME}\n"
+@static_section # Same for every visitor: rendered once, replayed after that (see core.sections)
+def concept_blurb(app_name):
+    st.info(f"### {app_name}\n"
             f"**Concept:** A decentralized ecosystem where users cultivate unique digital mycelial networks, "
             f"sponsoring their growth to generate tradable 'spores' (assets) and participating in a "
             f"self-sustaining cycle of network expansion and resource decomposition.")
     st.caption("✨ Visual Style: Organic/Nature-Inspired")
 
+with st.sidebar:
+    concept_blurb(APP_NAME)
+
     st.markdown("---")
     st.subheader("Freighter Connection")
     if st.session_state.public_key:
         st.success(f"Connected: `{st.session_state.public_key[:10]}...`")
         st.button("Disconnect", on_click=lambda: st.session_state.update(public_key=None, balances={"XLM":0, SPORE_ASSET_CODE:0}), key="disconnect_freighter")
     else:
-        st.button("Connect with Freighter 🚀", on_click=lambda: components.html("<script>connectFreighter();</script>", height=0, width=0), key="connect_freighter")
+        st.button("Connect with Freighter 🚀", on_click=connect, key="connect_freighter")
     st.markdown("---")
 
     if st.session_state.public_key:
@@ -363,7 +322,7 @@ else:
         if st.button(f"Establish Trustline for {SPORE_ASSET_CODE} 🤝"):
             if not st.session_state.tx_in_progress:
                 try:
-                    source_account = server.load_account(st.session_state.public_key)
+                    source_account = load_source_account(st.session_state.public_key)
                     transaction = (
                         TransactionBuilder(
                             source_account=source_account,
@@ -376,7 +335,7 @@ else:
                     xdr = transaction.to_xdr()
                     st.session_state.tx_in_progress = True
                     st.session_state.transaction_type = "change_trust"
-                    components.html(f"<script>signAndSubmit('{xdr}', '{st.session_state.transaction_type}');</script>", height=0, width=0)
+                    sign(xdr, tag=st.session_state.transaction_type, network_passphrase=NETWORK_PASSPHRASE)
                     st.info("Awaiting Freighter signature for trustline...")
                 except Exception as e:
                     st.error(f"Error building trustline transaction: {e}")
@@ -428,7 +387,7 @@ else:
                         st.error(f"You need a trustline for {SPORE_ASSET_CODE} to receive spores (even conceptually). Please establish it first.")
                     else:
                         try:
-                            source_account = server.load_account(st.session_state.public_key)
+                            source_account = load_source_account(st.session_state.public_key)
                             transaction = (
                                 TransactionBuilder(
                                     source_account=source_account,
@@ -447,7 +406,7 @@ else:
                             xdr = transaction.to_xdr()
                             st.session_state.tx_in_progress = True
                             st.session_state.transaction_type = "sponsor_payment"
-                            components.html(f"<script>signAndSubmit('{xdr}', '{st.session_state.transaction_type}');</script>", height=0, width=0)
+                            sign(xdr, tag=st.session_state.transaction_type, network_passphrase=NETWORK_PASSPHRASE)
                             st.info("Awaiting Freighter signature for sponsorship payment...")
                             # In a real dApp, the ISSUER_KEY (server-side) would now send SPOREs back.
                             # For this demo, we assume the SPOREs are earned and available.
@@ -480,7 +439,7 @@ else:
                     st.error(f"Insufficient {SPORE_ASSET_CODE} balance.")
                 else:
                     try:
-                        source_account = server.load_account(st.session_state.public_key)
+                        source_account = load_source_account(st.session_state.public_key)
                         transaction = (
                             TransactionBuilder(
                                 source_account=source_account,
@@ -499,7 +458,7 @@ else:
                         xdr = transaction.to_xdr()
                         st.session_state.tx_in_progress = True
                         st.session_state.transaction_type = "spore_payment"
-                        components.html(f"<script>signAndSubmit('{xdr}', '{st.session_state.transaction_type}');</script>", height=0, width=0)
+                        sign(xdr, tag=st.session_state.transaction_type, network_passphrase=NETWORK_PASSPHRASE)
                         st.info(f"Awaiting Freighter signature to transfer {spore_amount_to_send} {SPORE_ASSET_CODE}...")
                     except Exception as e:
                         st.error(f"Error building {SPORE_ASSET_CODE} transfer transaction: {e}")
@@ -519,16 +478,7 @@ else:
                 st.error(f"You need a trustline for {SPORE_ASSET_CODE} to receive spores. Please establish it first.")
             else:
                 try:
-                    # Fund issuer if necessary (only for ephemeral demo key)
-                    if "demo_issuer_key" in st.session_state:
-                        try:
-                            server.load_account(ISSUER_PUBLIC_KEY)
-                        except NotFoundError:
-                            st.warning("Funding demo issuer account...")
-                            server.friendbot(ISSUER_PUBLIC_KEY)
-                            time.sleep(5) # Wait for friendbot
-
-                    issuer_account = server.load_account(ISSUER_PUBLIC_KEY)
+                    issuer_account = load_source_account(ISSUER_PUBLIC_KEY)
                     tx_builder = (
                         TransactionBuilder(
                             source_account=issuer_account,
@@ -553,4 +503,6 @@ else:
                     transaction.sign(ISSUER_KEY)
                     submit_signed_transaction(transaction.to_xdr())
                 except Exception as e:
-                    st.error(f"Error sending demo {SPORE_ASSET_CODE}: {e}")
\ No newline at end of file
+                    st.error(f"Error sending demo {SPORE_ASSET_CODE}: {e}")
+
+bridge() # The Freighter wallet component; keep it after every button that queues a request
@@ -3,13 +3,18 @@ import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.governor import LOW, priority
+from core.horizon import FRIENDBOT_URL, get_server
+from core.memory import session_budget
+from core.styles import inject_css
 import time
 import random
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- 1. Configuration ---
-HORIZON_URL = "https://horizon-testnet.stellar.org"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
-SERVER = Server(HORIZON_URL)
+SERVER = get_server()
 
 # --- 2. Custom CSS for Minimalist/Swiss-Design ---
 CUSTOM_CSS = """
@@ -137,7 +142,7 @@ CUSTOM_CSS = """
     }
 </style>
 """
-st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+inject_css(CUSTOM_CSS)
 
 # --- 3. Freighter Integration HTML/JS ---
 # This JS snippet handles Freighter connection and transaction signing.
@@ -258,14 +263,15 @@ def clear_messages():
 
 def get_account_balances(public_key):
     try:
-        account = SERVER.load_account(public_key)
+        with priority(LOW):
+            account = SERVER.load_account(public_key)
         balances = {balance.asset_code if balance.asset_type != 'native' else 'XLM': float(balance.balance)
                     for balance in account.balances}
         st.session_state.account_balances = balances
         return balances
     except NotFoundError:
         st.error(f"Account {public_key} not found on Testnet. Please fund it (e.g., using "
-                 f"[Friendbot](https://friendbot.stellar.org/?addr={public_key}))")
+                 f"[Friendbot]({FRIENDBOT_URL}/?addr={public_key}))")
         st.session_state.account_balances = {}
         return {}
     except Exception as e:
@@ -571,7 +577,7 @@ with st.sidebar:
         if st.button(f"Trust {WIND_ASSET.code} Asset (if needed)", key="trust_wind"):
             handle_trust_wind_asset()
         if st.session_state.account_balances.get("XLM", 0) < 1.5:
-             st.info(f"Fund your account via Friendbot: `https://friendbot.stellar.org/?addr={st.session_state.freighter_pk}`")
+             st.info(f"Fund your account via Friendbot: `{FRIENDBOT_URL}/?addr={st.session_state.freighter_pk}`")
         if WIND_ASSET.code in st.session_state.account_balances:
             amount_to_obtain = st.number_input("Amount of WIND to Obtain 💨", min_value=1, value=10, step=1)
             if st.button(f"Obtain {amount_to_obtain} {WIND_ASSET.code} (from Issuer)", key="obtain_wind"):
@@ -588,7 +594,7 @@ with st.sidebar:
     st.subheader("Issuer Account ⚙️")
     st.markdown(f"**Public Key:** `{ISSUER_PUBLIC_KEY[:10]}...`")
     if st.session_state.is_demo_issuer:
-        st.markdown(f"[Fund Issuer (Friendbot)](https://friendbot.stellar.org/?addr={ISSUER_PUBLIC_KEY})")
+        st.markdown(f"[Fund Issuer (Friendbot)]({FRIENDBOT_URL}/?addr={ISSUER_PUBLIC_KEY})")
     
     issuer_balances = get_account_balances(ISSUER_PUBLIC_KEY)
     st.markdown(f"**XLM Balance:** {issuer_balances.get('XLM', 0):,.2f} XLM")
@@ -3,27 +3,23 @@ import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.demo import lease_demo_secret
+from core.horizon import friendbot_url, get_server
+from core.memory import session_budget
 import requests 
 
-# FIXED: Removed markdown formatting from the URL string
-HORIZON_URL = "[https://horizon-testnet.stellar.org](https://horizon-testnet.stellar.org)"
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
-server = Server(HORIZON_URL)
+server = get_server()
 
-if "demo_key" not in st.session_state: st.session_state.demo_key = Keypair.random().secret
+if "demo_key" not in st.session_state: st.session_state.demo_key = lease_demo_secret() # Pre-funded, from the demo account pool
 ISSUER_KEYPAIR = Keypair.from_secret(st.session_state.demo_key)
 ISSUER_PUBLIC_KEY = ISSUER_KEYPAIR.public_key
 
 LUMINA_DUST_ASSET = Asset("LUMINA", ISSUER_PUBLIC_KEY)
 if 'public_key' not in st.session_state: st.session_state.public_key = None
 
-def setup_issuer_account():
-    try:
-        server.load_account(ISSUER_PUBLIC_KEY)
-    except NotFoundError:
-        requests.get(f"[https://friendbot.stellar.org/?addr=](https://friendbot.stellar.org/?addr=){ISSUER_PUBLIC_KEY}") 
-        st.success("Sanctuary core funded via Friendbot!")
-
 st.title("The Whispering Wisp Sanctuary 🌬️")
 components.html("""
 <script src="[https://unpkg.com/@stellar/freighter-api@latest/build/index.js](https://unpkg.com/@stellar/freighter-api@latest/build/index.js)"></script>
@@ -45,7 +41,6 @@ if not st.session_state.public_key:
 else:
     st.success(f"Connected: {st.session_state.public_key}")
     if st.button("Fund Me"):
-        requests.get(f"[https://friendbot.stellar.org/?addr=](https://friendbot.stellar.org/?addr=){st.session_state.public_key}")
+        requests.get(friendbot_url(st.session_state.public_key))
         st.success("Funded!")
 
-setup_issuer_account()
@@ -3,14 +3,22 @@ import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.fees import base_fee
+from core.horizon import friendbot_url, get_server
+from core.memory import session_budget
+from core.sequences import load_source_account
+from core.styles import inject_css
+from core.submission import submit_once as submit_to_horizon
+from core.templates import template
 import json
 import time
 import base64
 import requests
 
-HORIZON_URL = "https://horizon-testnet.stellar.org"
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
-SERVER = Server(HORIZON_URL)
+SERVER = get_server()
 
 WHIM_ASSET_CODE = "WHIM"
 SPONSORSHIP_COST_XLM = "1" 
@@ -32,7 +40,7 @@ NURSERY_ISSUER_PUBLIC_KEY = nursery_issuer_key.public_key
 WHIM_ASSET = Asset(WHIM_ASSET_CODE, NURSERY_ISSUER_PUBLIC_KEY)
 
 def inject_custom_css():
-    st.markdown(
+    inject_css(
         """
         <style>
             @import url('https://fonts.googleapis.com/css2?family=IBM+Plex+Sans:wght@300;400;500;600&display=swap');
@@ -41,7 +49,7 @@ def inject_custom_css():
             .stButton>button { background-color: #007bff; color: white; border-radius: 5px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
             .stMetric { background-color: white; padding: 15px; border-radius: 8px; border: 1px solid #e0e0e0; }
         </style>
-        """, unsafe_allow_html=True
+        """
     )
 inject_custom_css()
 
@@ -101,32 +109,31 @@ def check_account_status(public_key):
 
 def fund_account(public_key):
     # FIXED: Use requests for friendbot
-    requests.get(f"https://friendbot.stellar.org/?addr={public_key}")
+    requests.get(friendbot_url(public_key))
     st.success(f"Account {public_key} funded by Friendbot.")
 
 def build_sponsor_seed_tx(source_pk):
     try:
-        source_account = SERVER.load_account(source_pk)
-        tx_builder = TransactionBuilder(source_account=source_account, network_passphrase=NETWORK_PASSPHRASE, base_fee=100)
-        tx_builder.add_operation(stellar_sdk.Payment(destination=NURSERY_ISSUER_PUBLIC_KEY, asset=Asset.native(), amount=SPONSORSHIP_COST_XLM))
-        tx_builder.add_operation(stellar_sdk.ChangeTrust(asset=WHIM_ASSET, limit="1000000000"))
-        return tx_builder.build().to_xdr()
+        source_account = load_source_account(source_pk, reserve=False) # Signed through a redirect: a cancel never comes back
+        sponsor_seed = template(("sponsor_seed", NURSERY_ISSUER_PUBLIC_KEY), lambda: [
+            stellar_sdk.Payment(destination=NURSERY_ISSUER_PUBLIC_KEY, asset=Asset.native(), amount=SPONSORSHIP_COST_XLM),
+            stellar_sdk.ChangeTrust(asset=WHIM_ASSET, limit="1000000000"),
+        ], timeout=None)
+        return sponsor_seed.build(source_account, base_fee=base_fee()).to_xdr()
     except: return None
 
 def build_evolve_seed_tx(source_pk, evolution_choice):
     try:
-        source_account = SERVER.load_account(source_pk)
-        tx_builder = TransactionBuilder(source_account=source_account, network_passphrase=NETWORK_PASSPHRASE, base_fee=100)
+        source_account = load_source_account(source_pk, reserve=False) # Signed through a redirect: a cancel never comes back
         new_home_domain = f"whimseed-{evolution_choice.lower().replace(' ', '-')}.whim"
-        tx_builder.add_operation(stellar_sdk.SetOptions(home_domain=new_home_domain))
-        return tx_builder.build().to_xdr()
+        evolve_seed = template(("evolve_seed", new_home_domain), lambda: [stellar_sdk.SetOptions(home_domain=new_home_domain)], timeout=None)
+        return evolve_seed.build(source_account, base_fee=base_fee()).to_xdr()
     except: return None
 
 # FIXED: transaction_xdr_or_or_object typo changed to transaction_xdr_or_object
 def submit_transaction(transaction_xdr_or_object):
     try:
-        tx_to_submit = stellar_sdk.TransactionBuilder.from_xdr(transaction_xdr_or_object, NETWORK_PASSPHRASE)
-        response = SERVER.submit_transaction(tx_to_submit)
+        response = submit_to_horizon(transaction_xdr_or_object)
         st.success(f"Transaction successful! Hash: {response['hash']}")
         return True
     except Exception as e:
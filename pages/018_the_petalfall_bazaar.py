@@ -1,6 +1,12 @@
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.batching import payout_async, payout_result, watch_payout
+from core.submission import PENDING, SUCCESS
+from core.demo import lease_demo_secret
+from core.horizon import friendbot_url, get_server
+from core.memory import session_budget
+from core.styles import inject_css
 import streamlit as st
 import streamlit.components.v1 as components
 import json
@@ -10,25 +16,16 @@ import string
 import base64
 import requests
 
-HORIZON_URL = "https://horizon-testnet.stellar.org"
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 MIN_BASE_RESERVE = 0.5 
-server = Server(HORIZON_URL)
+server = get_server()
 
-if "demo_issuer_key_secret" not in st.session_state: st.session_state.demo_issuer_key_secret = Keypair.random().secret
+if "demo_issuer_key_secret" not in st.session_state: st.session_state.demo_issuer_key_secret = lease_demo_secret() # Pre-funded, from the demo account pool
 ISSUER_KEY = Keypair.from_secret(st.session_state.demo_issuer_key_secret)
 ISSUER_PUBLIC_KEY = ISSUER_KEY.public_key
 
-if "issuer_account_checked" not in st.session_state: st.session_state.issuer_account_checked = False
-if not st.session_state.issuer_account_checked:
-    try:
-        server.load_account(ISSUER_PUBLIC_KEY)
-        st.session_state.issuer_account_checked = True
-    except NotFoundError:
-        # FIXED: Use requests for Friendbot
-        requests.get(f"https://friendbot.stellar.org/?addr={ISSUER_PUBLIC_KEY}")
-        st.session_state.issuer_account_checked = True
-
 POLLEN_ASSET_CODE = "PETALFALL"
 POLLEN_ASSET = Asset(POLLEN_ASSET_CODE, ISSUER_PUBLIC_KEY)
 
@@ -36,7 +33,7 @@ if "freighter_connected" not in st.session_state: st.session_state.freighter_con
 if "freighter_public_key" not in st.session_state: st.session_state.freighter_public_key = None
 if "xdr_to_sign" not in st.session_state: st.session_state.xdr_to_sign = None
 
-st.markdown("""
+inject_css("""
     <style>
         :root { --primary-color: #5C8374; --secondary-color: #9EC8B9; --background-color: #F8F4E1; }
         body { background-color: var(--background-color); color: #333333; }
@@ -45,7 +42,7 @@ st.markdown("""
         .stButton>button { background-color: var(--secondary-color); border-radius: 8px; }
         .stMetric { background-color: #EAF1EB; padding: 1rem; border-radius: 12px; }
     </style>
-""", unsafe_allow_html=True)
+""")
 
 st.sidebar.markdown("## The Petalfall Bazaar 🌸")
 st.sidebar.info("A seasonal marketplace where digital 'pollen' are exchanged.")
@@ -90,7 +87,7 @@ else:
     except:
         st.warning("Account not funded.")
         if st.button("Fund Garden"):
-            requests.get(f"https://friendbot.stellar.org/?addr={st.session_state.freighter_public_key}")
+            requests.get(friendbot_url(st.session_state.freighter_public_key))
             st.rerun()
 
     st.header("2. Acquire Petalfall Pollen 🌼")
@@ -99,3 +96,18 @@ else:
         tx = TransactionBuilder(acc, NETWORK_PASSPHRASE).add_operation(stellar_sdk.ChangeTrust(asset=POLLEN_ASSET, limit="1000")).build()
         # In full version this triggers JS sign script
         st.info("Trustline prepared.")
+    if st.button(f"Gather 10 {POLLEN_ASSET_CODE} 🐝"):
+        # Issuer-signed; batched with other gardeners' payouts. The outcome shows up on a later rerun
+        st.session_state.pollen_ticket = payout_async(ISSUER_KEY, stellar_sdk.Payment(destination=st.session_state.freighter_public_key, asset=POLLEN_ASSET, amount="10"))
+    if st.session_state.get("pollen_ticket"):
+        outcome = payout_result(st.session_state.pollen_ticket)
+        if outcome is not None and outcome["status"] == PENDING:
+            watch_payout(st.session_state.pollen_ticket, message="🐝 Gathering pollen...")
+        else:
+            st.session_state.pollen_ticket = None
+            if outcome is not None and outcome["status"] == SUCCESS:
+                st.success(f"Pollen gathered! Hash: {outcome['hash']}")
+            elif outcome is not None and outcome["code"]:
+                st.error(f"Could not gather pollen ({outcome['code']}). Establish the trustline first.")
+            else:
+                st.error(f"The pollen payout did not go through: {outcome['error'] if outcome else 'the result was lost'}. Please try again.")
@@ -1,30 +1,35 @@
 import streamlit as st
-import streamlit.components.v1 as components
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.demo import lease_demo_secret
+from core.horizon import friendbot_url, get_server
+from core.memory import session_budget
+from core.styles import inject_css
+from core.wallet import CONNECT, bridge, connect, sign, wallet_result
 import requests
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- CONFIGURATION ---
-HORIZON_URL = "[https://horizon-testnet.stellar.org](https://horizon-testnet.stellar.org)"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE # FIXED: Typo fixed here
 SPONSORSHIP_AMOUNT_XLM = "1"  
 PRESERVATION_THRESHOLD = 3   
 
 if "demo_issuer_key_secret" not in st.session_state:
-    st.session_state.demo_issuer_key_secret = Keypair.random().secret
+    st.session_state.demo_issuer_key_secret = lease_demo_secret() # Pre-funded, from the demo account pool
 ISSUER_KEY_SECRET = st.session_state.demo_issuer_key_secret
 ISSUER_KEYPAIR = Keypair.from_secret(ISSUER_KEY_SECRET)
 st.session_state.is_demo_mode = True
 
-server = Server(HORIZON_URL)
+server = get_server()
 
 if 'freighter_public_key' not in st.session_state: st.session_state.freighter_public_key = None
 if 'is_connected' not in st.session_state: st.session_state.is_connected = False
 if 'tx_hash' not in st.session_state: st.session_state.tx_hash = None
 
 # --- Custom Swiss Design CSS ---
-st.markdown(
+inject_css(
     """
     <style>
     @import url('[https://fonts.googleapis.com/css2?family=IBM+Plex+Sans:wght@300;400;500;600&display=swap](https://fonts.googleapis.com/css2?family=IBM+Plex+Sans:wght@300;400;500;600&display=swap)');
@@ -36,52 +41,25 @@ st.markdown(
     .stButton > button:hover { background-color: #d9d9d9; }
     .stMetric { background-color: #ffffff; border: 1px solid #e0e0e0; border-radius: 8px; padding: 1em; box-shadow: 0 2px 4px rgba(0,0,0,0.05); }
     </style>
-    """,
-    unsafe_allow_html=True
+    """
 )
 
-# --- Freighter Logic via Query Params ---
-def build_freighter_js(action, xdr=None):
-    if action == "connect":
-        return """
-        <script src="[https://unpkg.com/@stellar/freighter-api@1.2.0/build/freighter.min.js](https://unpkg.com/@stellar/freighter-api@1.2.0/build/freighter.min.js)"></script>
-        <script>
-            async function connect() {
-                const pk = await window.freighterApi.getPublicKey();
-                window.location.search = `?f_action=connect&fpk=${pk}`;
-            }
-            connect();
-        </script>
-        """
-    elif action == "sign":
-        return f"""
-        <script src="[https://unpkg.com/@stellar/freighter-api@1.2.0/build/freighter.min.js](https://unpkg.com/@stellar/freighter-api@1.2.0/build/freighter.min.js)"></script>
-        <script>
-            async function signTx() {{
-                const signed = await window.freighterApi.signTransaction("{xdr}", {{ network: "TESTNET" }});
-                window.location.search = `?f_action=sign&signed_xdr=${{encodeURIComponent(signed)}}`;
-            }}
-            signTx();
-        </script>
-        """
-
-# Process incoming params
-if "f_action" in st.query_params:
-    action = st.query_params["f_action"]
-    if action == "connect" and "fpk" in st.query_params:
-        st.session_state.freighter_public_key = st.query_params["fpk"]
-        st.session_state.is_connected = True
-    elif action == "sign" and "signed_xdr" in st.query_params:
-        signed_xdr = st.query_params["signed_xdr"]
-        try:
-            res = server.submit_transaction(signed_xdr)
-            st.session_state.tx_hash = res['hash']
-            st.success(f"Echo Sponsored! Tx Hash: `{res['hash']}`")
-            st.balloons()
-        except Exception as e:
-            st.error(f"Transaction failed: {e}")
-    st.query_params.clear()
-    st.rerun()
+# --- Freighter Results (from the wallet bridge at the end of the page) ---
+wallet = wallet_result()
+if wallet is not None and "error" in wallet:
+    st.error(f"Freighter: {wallet['error']}")
+elif wallet is not None and wallet["action"] == CONNECT:
+    st.session_state.freighter_public_key = wallet["public_key"]
+    st.session_state.is_connected = True
+elif wallet is not None:
+    signed_xdr = wallet["signed_xdr"]
+    try:
+        res = server.submit_transaction(signed_xdr)
+        st.session_state.tx_hash = res['hash']
+        st.success(f"Echo Sponsored! Tx Hash: `{res['hash']}`")
+        st.balloons()
+    except Exception as e:
+        st.error(f"Transaction failed: {e}")
 
 # --- Sidebar UI ---
 with st.sidebar:
@@ -97,17 +75,11 @@ with st.sidebar:
     else:
         st.warning("Freighter Not Connected.")
         if st.button("Connect Freighter 🚀"):
-            components.html(build_freighter_js("connect"), height=0, width=0)
+            connect()
 
     st.markdown("---")
     st.subheader("Issuer Status (Demo)")
-    if "demo_issuer_funded" not in st.session_state:
-        try:
-            requests.get(f"[https://friendbot.stellar.org/?addr=](https://friendbot.stellar.org/?addr=){ISSUER_KEYPAIR.public_key}")
-            st.session_state.demo_issuer_funded = True
-            st.success("Demo Issuer Funded!")
-        except Exception as e:
-            st.error("Failed to fund demo issuer.")
+    st.caption(f"Demo Issuer `{ISSUER_KEYPAIR.public_key[:8]}...` comes pre-funded from the demo account pool.")
 
 # --- Main UI ---
 st.title("🧬 Ephemeral Echoes")
@@ -137,7 +109,7 @@ if st.session_state.is_connected:
                     .add_text_memo(user_message)
                     .build()
                 )
-                components.html(build_freighter_js("sign", transaction.to_xdr()), height=0, width=0)
+                sign(transaction.to_xdr(), network_passphrase=NETWORK_PASSPHRASE)
                 st.info("Awaiting signature in Freighter...")
             except Exception as e:
                 st.error("Account not found. Please fund it first.")
@@ -180,3 +152,5 @@ else:
                 count = len(set(sponsorships))
                 st.markdown(f"**\"{memo}\"** – Sponsored **{count}** times ({PRESERVATION_THRESHOLD - count} more needed)")
                 st.progress(min(100, int((count / PRESERVATION_THRESHOLD) * 100)))
+
+bridge()
@@ -1,23 +1,37 @@
 import streamlit as st
-import streamlit.components.v1 as components
 
 import stellar_sdk
 from stellar_sdk import Server, Keypair, TransactionBuilder, Network, Asset
 from stellar_sdk.exceptions import BadRequestError, NotFoundError
+from core.demo import lease_demo_secret
+from core.fees import base_fee
+from core.flows import FlowPlan
+from core.horizon import get_server
+from core.memory import session_budget
+from core.metrics import render_debug_panel
+from core.balances import balance_metrics
+from core.batching import payout_async, payout_result, watch_payout
+from core.sections import static_section
+from core.sequences import load_source_account
+from core.styles import inject_css
+from core.submission import PENDING
+from core.wallet import bridge
+from core.wallet_flow import CONNECTED, FAILED, SUBMITTING, SUCCESS, WalletFlow
 
 import json
 import asyncio
 import random
 import time
 
+session_budget() # Before anything reads st.session_state (see core.memory)
+
 # --- Global Configuration ---
-HORIZON_URL = "https://horizon-testnet.stellar.org/"
 NETWORK_PASSPHRASE = Network.TESTNET_NETWORK_PASSPHRASE
 SWIRL_ASSET_CODE = "SWIRL"
 COSMIC_ASSET_CODE = "COSMIC"
 
 # --- Custom CSS for Playful/Gamified Style ---
-st.markdown(
+inject_css(
     """
     <style>
     @import url('https://fonts.googleapis.com/css2?family=Pacifico&family=Orbitron&display=swap');
@@ -147,57 +161,19 @@ st.markdown(
         color: var(--accent-color-1);
     }
     </style>
-    """,
-    unsafe_allow_html=True
+    """
 )
 
-# --- Freighter Integration (JS component) ---
-FREIGHTER_JS = """
-<script src="https://unpkg.com/@stellar/freighter-api@latest/dist/freighter-api.js"></script>
-<script>
-    window.stellarFreighter = {
-        async getPublicKey() {
-            try {
-                const publicKey = await StellarFreighterApi.getPublicKey();
-                return { success: true, publicKey: publicKey };
-            } catch (error) {
-                return { success: false, error: error.message };
-            }
-        },
-        async signTransaction(xdr, networkPassphrase) {
-            try {
-                const signedXdr = await StellarFreighterApi.signTransaction(xdr, { network: networkPassphrase });
-                return { success: true, signedXdr: signedXdr };
-            } catch (error) {
-                return { success: false, error: error.message };
-            }
-        },
-        async isConnected() {
-            const isConnected = await StellarFreighterApi.isConnected();
-            return { success: true, isConnected: isConnected };
-        },
-        async getNetwork() {
-            try {
-                const network = await StellarFreighterApi.getNetwork();
-                return { success: true, network: network };
-            } catch (error) {
-                return { success: false, error: error.message };
-            }
-        }
-    };
-</script>
-"""
-components.html(FREIGHTER_JS, height=0, width=0)
-
 # --- Stellar Server & Issuer Setup ---
-server = Server(HORIZON_URL)
+server = get_server()
+flow = WalletFlow(network_passphrase=NETWORK_PASSPHRASE) # Freighter connect → sign → submit
 
 # Initialize session state for issuer key and counter
 if "ISSUER_KEY" in st.secrets:
     ISSUER_KEYPAIR = Keypair.from_secret(st.secrets["ISSUER_KEY"])
 else:
     if "demo_key" not in st.session_state:
-        st.session_state.demo_key = Keypair.random().secret
+        st.session_state.demo_key = lease_demo_secret() # Pre-funded, from the demo account pool
     ISSUER_KEYPAIR = Keypair.from_secret(st.session_state.demo_key)
     st.sidebar.warning("Using Ephemeral Demo Keys for Asset Issuer ⚠️")
     st.sidebar.caption(f"Demo Issuer Public Key: `{ISSUER_KEYPAIR.public_key[:8]}...`")
@@ -209,41 +185,13 @@ COSMIC_ASSET = Asset(COSMIC_ASSET_CODE, ISSUER_ACCOUNT_ID)
 # --- Helper Functions ---
 @st.cache_resource
 def get_server_instance():
-    return Server(HORIZON_URL)
+    return get_server()
 
 def get_freighter_public_key():
-    return components.html(
-        f"""
-        <script>
-            window.stellarFreighter.getPublicKey().then(result => {{
-                if (result.success) {{
-                    window.parent.postMessage({{"type": "freighter_pk", "publicKey": result.publicKey}}, "*");
-                }} else {{
-                    window.parent.postMessage({{"type": "freighter_error", "error": result.error}}, "*");
-                }}
-            }});
-        </script>
-        """,
-        height=0, width=0,
-        key="get_pk_script"
-    )
-
-def sign_and_submit_with_freighter(xdr_b64):
-    return components.html(
-        f"""
-        <script>
-            window.stellarFreighter.signTransaction('{xdr_b64}', '{NETWORK_PASSPHRASE}').then(result => {{
-                if (result.success) {{
-                    window.parent.postMessage({{"type": "freighter_signed_xdr", "signedXdr": result.signedXdr}}, "*");
-                }} else {{
-                    window.parent.postMessage({{"type": "freighter_error", "error": result.error}}, "*");
-                }}
-            }});
-        </script>
-        """,
-        height=0, width=0,
-        key=f"sign_tx_{time.time()}" # Unique key for each call
-    )
+    flow.connect() # Answered by the wallet bridge at the end of the page
+
+def sign_and_submit_with_freighter(xdr_b64, **context):
+    flow.sign(xdr_b64, **context) # Submitted by the wallet flow once signed; context comes back in the event
 
 def load_account_data(public_key):
     try:
@@ -268,23 +216,19 @@ def get_asset_balance(account_balances, asset_code, issuer_id=None):
     return 0.0
 
 def listen_for_freighter_response():
-    query_params = st.query_params
-    if "freighter_pk" in query_params:
-        pk = query_params["freighter_pk"]
-        st.session_state.public_key = pk
+    """Moves the wallet flow forward; returns the step that finished on this run, if any."""
+    event = flow.advance()
+    if event is None:
+        return None
+    if event["state"] == CONNECTED:
+        st.session_state.public_key = event["public_key"]
         st.session_state.freighter_connected = True
-        del st.query_params["freighter_pk"] # Clear it to avoid re-processing
-        st.rerun()
-    elif "freighter_error" in query_params:
-        error_msg = query_params["freighter_error"]
-        st.error(f"Freighter Error: {error_msg}")
-        del st.query_params["freighter_error"]
-        st.rerun()
-    elif "freighter_signed_xdr" in query_params:
-        signed_xdr = query_params["freighter_signed_xdr"]
-        st.session_state.signed_xdr_to_submit = signed_xdr
-        del st.query_params["freighter_signed_xdr"]
-        st.rerun()
+    elif event["state"] == FAILED and not event.get("tickets"):
+        st.error(f"Freighter Error: {event['error']}")
+    elif event["state"] == SUCCESS and event.get("swirl_id"):
+        # Only a Swirl whose traits made it on-chain uses up its number
+        st.session_state.swirl_id_counter = max(st.session_state.swirl_id_counter, event["swirl_id"])
+    return event
 
 def generate_swirl_traits():
     colors = ["Crimson", "Azure", "Emerald", "Golden", "Amethyst", "Sapphire", "Ruby"]
@@ -304,19 +248,28 @@ def generate_swirl_traits():
         "rarity": rarity
     }
 
+def encode_swirl_traits(traits):
+    """Traits as a ManageData value: 'Amethyst|Cosmic Dust Trail|Faintly Pulsing|Legendary' is the longest, at 52 of 64 bytes."""
+    return "|".join(traits[field] for field in ("color", "pattern", "shimmer", "rarity")).encode('utf-8')
+
 # --- Session State Initialization ---
 if "freighter_connected" not in st.session_state:
     st.session_state.freighter_connected = False
 if "public_key" not in st.session_state:
     st.session_state.public_key = ""
-if "signed_xdr_to_submit" not in st.session_state:
-    st.session_state.signed_xdr_to_submit = None
 if "swirl_id_counter" not in st.session_state:
     st.session_state.swirl_id_counter = 0
 
+# Listen for Freighter responses (before the sidebar shows the connection status)
+flow_event = listen_for_freighter_response()
+
 # --- Sidebar ---
-st.sidebar.info("🌌 Stardust Swirl Emporium 🌠\n\n**Concept:** Cultivate unique 'Stardust Swirl' tokens, trade them in a vibrant marketplace, or purchase rare cosmic essences instantly!")
-st.sidebar.caption("✨ **Visual Style:** Playful & Gamified")
+@static_section # Same for every visitor: rendered once, replayed after that (see core.sections)
+def concept_blurb():
+    st.sidebar.info("🌌 Stardust Swirl Emporium 🌠\n\n**Concept:** Cultivate unique 'Stardust Swirl' tokens, trade them in a vibrant marketplace, or purchase rare cosmic essences instantly!")
+    st.sidebar.caption("✨ **Visual Style:** Playful & Gamified")
+
+concept_blurb()
 st.sidebar.markdown("---")
 st.sidebar.header("Connection Status")
 
@@ -329,14 +282,12 @@ else:
         get_freighter_public_key()
         st.toast("Connecting to Freighter...", icon="⏳")
 
-# Listen for Freighter responses
-listen_for_freighter_response()
-
 # --- Main App ---
 st.title("🌌 Stardust Swirl Emporium 🌠")
 
 if not st.session_state.freighter_connected:
     st.info("Please connect your Freighter wallet to begin your cosmic adventure! ✨")
+    bridge()
     st.stop()
 
 # Load user account data
@@ -344,15 +295,13 @@ user_account = load_account_data(st.session_state.public_key)
 if user_account is None:
     st.stop()
 
-# Display User Account Balances
+# Display User Account Balances (refreshes itself without rerunning the page)
 st.subheader("Your Cosmic Wallet 🪐")
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.metric(label="XLM Balance", value=f"{get_asset_balance(user_account.balances, 'XLM'):.2f} XLM 🚀")
-with col2:
-    st.metric(label=f"{SWIRL_ASSET_CODE} Balance", value=f"{get_asset_balance(user_account.balances, SWIRL_ASSET_CODE, ISSUER_ACCOUNT_ID):.2f} SWIRL ✨")
-with col3:
-    st.metric(label=f"{COSMIC_ASSET_CODE} Balance", value=f"{get_asset_balance(user_account.balances, COSMIC_ASSET_CODE, ISSUER_ACCOUNT_ID):.2f} COSMIC 🌟")
+balance_metrics(st.session_state.public_key, [
+    ("XLM Balance", "XLM", "{:.2f} XLM 🚀"),
+    (f"{SWIRL_ASSET_CODE} Balance", SWIRL_ASSET, "{:.2f} SWIRL ✨"),
+    (f"{COSMIC_ASSET_CODE} Balance", COSMIC_ASSET, "{:.2f} COSMIC 🌟"),
+])
 
 # Check if issuer account is funded (only for demo mode)
 if "demo_key" in st.session_state:
@@ -367,24 +316,14 @@ if "demo_key" in st.session_state:
         st.error(f"Error checking demo issuer account: {e}")
         st.stop()
 
-# --- Handle signed_xdr_to_submit ---
-if st.session_state.signed_xdr_to_submit:
-    st.subheader("Submitting Transaction... 🚀")
-    signed_xdr = st.session_state.signed_xdr_to_submit
-    try:
-        with st.spinner("Broadcasting transaction to Stellar Network..."):
-            response = server.submit_transaction(signed_xdr)
-            st.success(f"Transaction successful! 🎉 [View on StellarExpert](https://testnet.stellarexpert.io/tx/{response['hash']})")
-            st.balloons()
-            st.session_state.signed_xdr_to_submit = None # Clear after submission
-            st.rerun() # Refresh account data
-    except BadRequestError as e:
-        st.error(f"Transaction failed: {e.extras.get('result_codes', {}).get('transaction', 'Unknown error')}")
-        st.exception(e)
-        st.session_state.signed_xdr_to_submit = None
-    except Exception as e:
-        st.error(f"An unexpected error occurred during transaction submission: {e}")
-        st.session_state.signed_xdr_to_submit = None
+# --- Transaction progress (only this region reruns while the ledger closes) ---
+flow.progress(messages={SUBMITTING: "Broadcasting transaction to Stellar Network..."})
+if flow_event is not None and flow_event["state"] == SUCCESS:
+    st.success(f"Transaction successful! 🎉 [View on StellarExpert](https://testnet.stellarexpert.io/tx/{flow_event['hash']})")
+    st.balloons()
+elif flow_event is not None and flow_event["state"] == FAILED and flow_event.get("tickets"):
+    error = flow_event["error"]
+    st.error(f"Transaction failed: {error.get('transaction', error) if isinstance(error, dict) else error}")
 
 
 # --- 1. Cultivate Stardust Swirls (ChangeTrust + ManageData) ---
@@ -395,20 +334,22 @@ with st.expander("✨ Cultivate Your Own Stardust Swirls ✨", expanded=True):
 
     if not has_swirl_trustline:
         st.warning(f"You don't have a trustline for {SWIRL_ASSET_CODE}. Establish one to start cultivating!")
-        if st.button("🌌 Establish SWIRL Trustline", key="create_trustline_swirl"):
+        st.caption("One signature: trust SWIRL, receive your first Swirl from the Emporium and record its traits.")
+        if st.button("🌌 Establish SWIRL Trustline & Claim a Swirl", key="create_trustline_swirl"):
             try:
-                source_account = server.load_account(st.session_state.public_key)
-                transaction = TransactionBuilder(
-                    source_account=source_account,
-                    network_passphrase=NETWORK_PASSPHRASE,
-                    base_fee=100
-                ).append_change_trust_op(
-                    asset=SWIRL_ASSET,
-                    limit="100000000000" # High limit for demo
-                ).set_timeout(30).build()
-                transaction_xdr = transaction.to_xdr()
-                sign_and_submit_with_freighter(transaction_xdr)
-                st.info("Awaiting Freighter signature for ChangeTrust operation...")
+                traits = generate_swirl_traits()
+                swirl_id = st.session_state.swirl_id_counter + 1
+                swirl_data_key = f"SWIRL_ID_{swirl_id}_CosmicSwirl-{swirl_id}"
+                plan = FlowPlan(st.session_state.public_key, NETWORK_PASSPHRASE)
+                plan.trust(SWIRL_ASSET, "100000000000") # High limit for demo
+                plan.add(
+                    stellar_sdk.Payment(destination=st.session_state.public_key, asset=SWIRL_ASSET, amount="1"),
+                    "Receive 1 SWIRL",
+                    signer=ISSUER_KEYPAIR, # Issuer co-signs its payment
+                )
+                plan.add(stellar_sdk.ManageData(data_name=swirl_data_key, data_value=encode_swirl_traits(traits)), "Record Swirl traits")
+                sign_and_submit_with_freighter(plan.to_xdr(), swirl_id=swirl_id)
+                st.info(f"Awaiting Freighter signature for: {', '.join(plan.labels)}...")
             except Exception as e:
                 st.error(f"Error preparing ChangeTrust transaction: {e}")
     else:
@@ -418,25 +359,23 @@ with st.expander("✨ Cultivate Your Own Stardust Swirls ✨", expanded=True):
         st.subheader("Receive a Stardust Swirl")
         st.markdown("Once you have a trustline, you can receive a *sample* Stardust Swirl from the Emporium!")
         if st.button("🌠 Receive a Stardust Swirl (1 SWIRL)", key="receive_swirl"):
-            try:
-                source_account = server.load_account(ISSUER_ACCOUNT_ID) # Issuer is sending
-                transaction = TransactionBuilder(
-                    source_account=source_account,
-                    network_passphrase=NETWORK_PASSPHRASE,
-                    base_fee=100
-                ).append_payment_op(
-                    destination=st.session_state.public_key,
-                    asset=SWIRL_ASSET,
-                    amount="1"
-                ).set_timeout(30).build()
-                transaction.sign(ISSUER_KEYPAIR) # Issuer signs directly
-                
-                with st.spinner("Sending Stardust Swirl..."):
-                    response = server.submit_transaction(transaction.to_xdr())
-                    st.success(f"You've received a Stardust Swirl! ✨ [Tx](https://testnet.stellarexpert.io/tx/{response['hash']})")
-                    st.rerun()
-            except Exception as e:
-                st.error(f"Error sending Stardust Swirl: {e}")
+            payment = stellar_sdk.Payment(
+                destination=st.session_state.public_key,
+                asset=SWIRL_ASSET,
+                amount="1"
+            )
+            # Issuer signs directly; batched with other sessions' payouts. The outcome shows up on a later rerun
+            st.session_state.swirl_payout_ticket = payout_async(ISSUER_KEYPAIR, payment)
+        if st.session_state.get("swirl_payout_ticket"):
+            outcome = payout_result(st.session_state.swirl_payout_ticket)
+            if outcome is not None and outcome["status"] == PENDING:
+                watch_payout(st.session_state.swirl_payout_ticket, message="Sending Stardust Swirl...")
+            else:
+                st.session_state.swirl_payout_ticket = None
+                if outcome is not None and outcome["status"] == SUCCESS:
+                    st.success(f"You've received a Stardust Swirl! ✨ [Tx](https://testnet.stellarexpert.io/tx/{outcome['hash']})")
+                else:
+                    st.error(f"Error sending Stardust Swirl: {outcome['code'] or outcome['error'] if outcome else 'the result was lost'}")
 
         st.markdown("---")
         st.subheader("Record Your Swirl's Unique Traits")
@@ -450,9 +389,10 @@ with st.expander("✨ Cultivate Your Own Stardust Swirls ✨", expanded=True):
 
             if st.button("💾 Record Swirl Traits (ManageData)", key="record_swirl_data"):
                 try:
-                    source_account = server.load_account(st.session_state.public_key)
-                    swirl_data_key = f"SWIRL_ID_{st.session_state.swirl_id_counter + 1}_{trait_name}"
-                    swirl_data_value = json.dumps(traits)
+                    source_account = load_source_account(st.session_state.public_key)
+                    swirl_id = st.session_state.swirl_id_counter + 1
+                    swirl_data_key = f"SWIRL_ID_{swirl_id}_{trait_name}"
+                    swirl_data_value = encode_swirl_traits(traits)
 
                     if len(swirl_data_key) > 64:
                         st.error("Trait Name is too long. Please keep it under 64 characters combined with 'SWIRL_ID_X_'.")
@@ -462,14 +402,13 @@ with st.expander("✨ Cultivate Your Own Stardust Swirls ✨", expanded=True):
                         transaction = TransactionBuilder(
                             source_account=source_account,
                             network_passphrase=NETWORK_PASSPHRASE,
-                            base_fee=100
+                            base_fee=base_fee()
                         ).append_manage_data_op(
                             data_name=swirl_data_key,
-                            data_value=swirl_data_value.encode('utf-8')
+                            data_value=swirl_data_value
                         ).set_timeout(30).build()
                         transaction_xdr = transaction.to_xdr()
-                        sign_and_submit_with_freighter(transaction_xdr)
-                        st.session_state.swirl_id_counter += 1
+                        sign_and_submit_with_freighter(transaction_xdr, swirl_id=swirl_id)
                         st.info("Awaiting Freighter signature for ManageData operation...")
                 except Exception as e:
                     st.error(f"Error preparing ManageData transaction: {e}")
@@ -494,11 +433,11 @@ with st.expander("🛒 Stardust Swirl Marketplace 💫"):
                 st.error(f"You only have {get_asset_balance(user_account.balances, SWIRL_ASSET_CODE, ISSUER_ACCOUNT_ID):.2f} {SWIRL_ASSET_CODE} to sell.")
             else:
                 try:
-                    source_account = server.load_account(st.session_state.public_key)
+                    source_account = load_source_account(st.session_state.public_key)
                     transaction = TransactionBuilder(
                         source_account=source_account,
                         network_passphrase=NETWORK_PASSPHRASE,
-                        base_fee=100
+                        base_fee=base_fee()
                     ).append_create_passive_sell_offer_op(
                         selling=SWIRL_ASSET,
                         buying=Asset.native(),
@@ -526,7 +465,7 @@ with st.expander("🛒 Stardust Swirl Marketplace 💫"):
                 st.error(f"You only have {get_asset_balance(user_account.balances, 'XLM'):.2f} XLM. You need {total_xlm_cost:.2f} XLM for this offer.")
             else:
                 try:
-                    source_account = server.load_account(st.session_state.public_key)
+                    source_account = load_source_account(st.session_state.public_key)
                     
                     # Ensure trustline for SWIRL exists before creating buy offer
                     if not has_swirl_trustline:
@@ -536,7 +475,7 @@ with st.expander("🛒 Stardust Swirl Marketplace 💫"):
                     transaction = TransactionBuilder(
                         source_account=source_account,
                         network_passphrase=NETWORK_PASSPHRASE,
-                        base_fee=100
+                        base_fee=base_fee()
                     ).append_manage_buy_offer_op(
                         selling=Asset.native(), # Selling XLM
                         buying=SWIRL_ASSET,    # Buying SWIRL
@@ -562,11 +501,11 @@ with st.expander("🌟 Cosmic Essence Emporium 🌟"):
         st.warning(f"You don't have a trustline for {COSMIC_ASSET_CODE}. Establish one to receive Cosmic Essence!")
         if st.button("✨ Establish COSMIC Trustline", key="create_trustline_cosmic"):
             try:
-                source_account = server.load_account(st.session_state.public_key)
+                source_account = load_source_account(st.session_state.public_key)
                 transaction = TransactionBuilder(
                     source_account=source_account,
                     network_passphrase=NETWORK_PASSPHRASE,
-                    base_fee=100
+                    base_fee=base_fee()
                 ).append_change_trust_op(
                     asset=COSMIC_ASSET,
                     limit="100000000000" # High limit for demo
@@ -596,7 +535,7 @@ with st.expander("🌟 Cosmic Essence Emporium 🌟"):
                 st.error(f"You only have {get_asset_balance(user_account.balances, 'XLM'):.2f} XLM. You need at least {max_xlm_to_spend:.2f} XLM for this purchase.")
             else:
                 try:
-                    source_account = server.load_account(st.session_state.public_key)
+                    source_account = load_source_account(st.session_state.public_key)
                     # For PathPaymentStrictReceive, the issuer (seller) needs to provide the path
                     # For simplicity, we assume the user directly pays XLM to the issuer, and the issuer sends COSMIC.
                     # This means the destination is the user, and the sender is the user. The issuer is effectively a middleman
@@ -606,7 +545,7 @@ with st.expander("🌟 Cosmic Essence Emporium 🌟"):
                     transaction = TransactionBuilder(
                         source_account=source_account,
                         network_passphrase=NETWORK_PASSPHRASE,
-                        base_fee=100
+                        base_fee=base_fee()
                     ).append_path_payment_strict_receive_op(
                         send_asset=Asset.native(), # User sends XLM
                         send_max=str(max_xlm_to_spend),
@@ -631,4 +570,8 @@ with st.expander("🌟 Cosmic Essence Emporium 🌟"):
                     st.error(f"Error preparing PathPaymentStrictReceive transaction: {e}")
 
 st.markdown("---")
-st.caption("Powered by Stellar & Streamlit ✨")
\ No newline at end of file
+st.caption("Powered by Stellar & Streamlit ✨")
+
+render_debug_panel()
+
+bridge() # The Freighter wallet component; after every button that queues a request